@@ -0,0 +1,84 @@
+"""Benchmark : latence de POST /customers/login selon la taille de la base clients
+
+Mesure la requête de connexion complète (index email), et à titre de comparaison le seul
+coût de l'ancien parcours linéaire de customers_db.
+
+    PYTHONPATH=. python benchmarks/customer_login.py --sizes 10000 100000 1000000
+"""
+import argparse
+import hashlib
+import logging
+import os
+import random
+import secrets
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "customers_service"))
+os.environ.setdefault("AUTH_TOKEN_SECRET", secrets.token_hex(32))
+
+import app as customers
+
+logging.disable(logging.INFO)
+
+PASSWORD_HASH = hashlib.sha256(b"password123").hexdigest()
+
+
+def populate(size):
+    customers.state.customers_db.clear()
+    customers.state.email_index.clear()
+    for i in range(size):
+        customers.state.add({
+            "id": str(i),
+            "email": f"user{i}@example.com",
+            "first_name": "Test",
+            "last_name": "User",
+            "password_hash": PASSWORD_HASH,
+            "created_at": "2024-01-01T00:00:00Z"
+        })
+
+
+def linear_scan(email):
+    """Recherche d'avant l'index, pour comparaison"""
+    for customer in customers.state.customers_db.values():
+        if customer["email"] == email and customer["password_hash"] == PASSWORD_HASH:
+            return customer
+    return None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(args):
+    client = customers.app.test_client()
+    print(f"{'clients':>9} {'index p50 µs':>13} {'index p99 µs':>13} {'scan p50 µs':>12}")
+    for size in args.sizes:
+        populate(size)
+        rng = random.Random(size)
+        latencies = []
+        for _ in range(args.logins):
+            email = f"user{rng.randrange(size)}@example.com"
+            start = time.perf_counter()
+            response = client.post('/customers/login', json={"email": email, "password": "password123"})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        scans = []
+        for _ in range(args.scans):
+            email = f"user{rng.randrange(size)}@example.com"
+            start = time.perf_counter()
+            linear_scan(email)
+            scans.append(time.perf_counter() - start)
+        print(f"{size:>9} {percentile(latencies, 50) * 1e6:>13.1f} {percentile(latencies, 99) * 1e6:>13.1f} "
+              f"{percentile(scans, 50) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--scans", type=int, default=20, help="recherches linéaires mesurées (lentes)")
+    main(parser.parse_args())
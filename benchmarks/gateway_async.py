@@ -0,0 +1,148 @@
+"""Benchmark : gateway Flask (synchrone) vs gateway asyncio face à un upstream lent
+
+Lance un faux products-service qui répond après --upstream-delay secondes, puis les deux
+gateways dans des processus séparés, et mesure débit et latences à concurrence croissante.
+Cache de réponses et contrôle d'admission sont désactivés, et chaque requête vise un produit
+différent (pas de fusion des GET identiques) : chaque requête traverse le proxy jusqu'à
+l'upstream. Le benchmark échoue (code de sortie 1) si une requête est en erreur.
+
+    pip install -r gateway/requirements.txt
+    python benchmarks/gateway_async.py --concurrency 10 100 500 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GATEWAY_DIR = os.path.join(ROOT, "gateway")
+
+UPSTREAM_PORT = 9101
+FLASK_PORT = 9180
+ASYNC_PORT = 9181
+
+
+async def start_fake_upstream(delay):
+    async def product(request):
+        await asyncio.sleep(delay)
+        return web.json_response({"id": request.match_info["product_id"], "name": "Laptop", "price": 999.99})
+
+    app = web.Application()
+    app.router.add_get("/products/{product_id}", product)
+    app.router.add_get("/health", lambda request: web.json_response({"status": "healthy"}))
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", UPSTREAM_PORT, backlog=4096).start()
+    return runner
+
+
+def start_gateway(mode, port):
+    env = dict(os.environ)
+    env["GATEWAY_SERVICES"] = json.dumps({"products": [f"http://127.0.0.1:{UPSTREAM_PORT}"]})
+    env["GATEWAY_MODE"] = mode
+    env["GATEWAY_CACHE"] = "0"
+    env["ADMISSION_ENABLED"] = "0"
+    env.setdefault("AUTH_TOKEN_SECRET", secrets.token_hex(32))
+    env["PYTHONPATH"] = ROOT
+    if mode == "async":
+        code = f"from async_app import run; run(host='127.0.0.1', port={port})"
+    else:
+        code = f"from app import create_app; create_app().run(host='127.0.0.1', port={port}, threaded=True)"
+    return subprocess.Popen([sys.executable, "-c", code], cwd=GATEWAY_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(session, port):
+    for _ in range(100):
+        try:
+            async with session.get(f"http://127.0.0.1:{port}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Gateway sur le port {port} injoignable")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_level(port, concurrency, total):
+    """Envoie `total` requêtes en gardant `concurrency` requêtes en vol"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def worker():
+            nonlocal errors
+            for i in remaining:
+                start = time.perf_counter()
+                try:
+                    async with session.get(f"http://127.0.0.1:{port}/api/v1/products/{i + 1}") as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "throughput": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors
+    }
+
+
+async def main(args):
+    """Renvoie le nombre de requêtes en erreur, tous paliers et modes confondus"""
+    errors = 0
+    upstream = await start_fake_upstream(args.upstream_delay)
+    gateways = {"flask": (start_gateway("flask", FLASK_PORT), FLASK_PORT),
+                "async": (start_gateway("async", ASYNC_PORT), ASYNC_PORT)}
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _, port in gateways.values():
+                await wait_ready(session, port)
+
+        print(f"Upstream delay: {args.upstream_delay * 1000:.0f} ms")
+        print(f"{'mode':<6} {'conc':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency * 4)
+            for mode, (_, port) in gateways.items():
+                result = await run_level(port, concurrency, total)
+                errors += result["errors"]
+                print(f"{mode:<6} {concurrency:>6} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['errors']:>7}")
+    finally:
+        for process, _ in gateways.values():
+            process.terminate()
+            process.wait()
+        await upstream.cleanup()
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--requests", type=int, default=2000, help="requêtes minimum par palier")
+    parser.add_argument("--upstream-delay", type=float, default=0.2, help="latence simulée de l'upstream (s)")
+    errors = asyncio.run(main(parser.parse_args()))
+    if errors:
+        print(f"ÉCHEC : {errors} requêtes en erreur, les mesures ne sont pas comparables")
+        sys.exit(1)
@@ -0,0 +1,113 @@
+"""Benchmark : surcoût par requête des logs, écriture synchrone vs tampon + échantillonnage
+
+Application Flask minimale qui, comme la gateway, écrit deux messages INFO par requête
+(middleware + handler), servie par le client de test. Les logs vont dans un fichier
+temporaire. Variantes :
+  - off       : niveau WARNING, les messages INFO sont ignorés ;
+  - sync      : basicConfig d'origine, f-string formatée et écrite sur le thread de la requête ;
+  - buffer     : common.logs, tout est écrit par le thread d'écriture ;
+  - buffer 10% : common.logs avec LOG_SAMPLE_RATE=0.1.
+Le temps mesuré inclut l'attente de la vidange du tampon, pour ne pas cacher le travail
+reporté sur le thread d'écriture.
+
+    PYTHONPATH=. python benchmarks/logging_overhead.py --requests 20000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify, request
+
+from common import logs
+from common.tracing import trace_flask
+
+logger = logging.getLogger("bench")
+
+
+def make_app(eager):
+    app = Flask(f"bench_{eager}")
+    trace_flask(app, "bench")
+
+    if eager:
+        @app.before_request
+        def log_request():
+            logger.info(f"Gateway: {request.method} {request.path} de {request.remote_addr}")
+    else:
+        @app.before_request
+        def log_request():
+            logger.info("Gateway: %s %s de %s", request.method, request.path, request.remote_addr)
+
+    @app.route('/products/<product_id>', methods=['GET'])
+    def get_product(product_id):
+        if eager:
+            logger.info(f"Récupération produit {product_id}")
+        else:
+            logger.info("Récupération produit %s", product_id)
+        return jsonify({"id": product_id})
+
+    return app
+
+
+def configure(variant, stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if variant in ("off", "sync"):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.WARNING if variant == "off" else logging.INFO)
+        # Les loggers restent des SampledLogger après une variante échantillonnée
+        logs._sample_rate = 1.0
+        return None
+    return logs.setup_logging("bench", level="INFO", sample_rate=0.1 if variant == "buffer 10%" else 1.0,
+                              stream=stream)
+
+
+def time_requests(app, n, handler):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/products/1')
+    if handler is not None:
+        while handler.buffer:
+            time.sleep(0.001)
+    start = time.perf_counter()
+    for i in range(n):
+        client.get(f'/products/{i % 100}')
+    request_time = time.perf_counter() - start
+    if handler is not None:
+        while handler.buffer:
+            time.sleep(0.001)
+    return request_time / n, (time.perf_counter() - start) / n
+
+
+def main(args):
+    variants = ("off", "sync", "buffer", "buffer 10%")
+    apps = {True: make_app(True), False: make_app(False)}
+    results = {variant: [] for variant in variants}
+    with tempfile.TemporaryFile("w") as stream:
+        # Mesures alternées pour que les variations de charge de la machine touchent toutes les variantes
+        for _ in range(args.rounds):
+            for variant in variants:
+                handler = configure(variant, stream)
+                results[variant].append(time_requests(apps[variant == "sync"], args.requests, handler))
+        logs.setup_logging("bench", level="WARNING")
+
+    baseline = min(request_time for request_time, _ in results["off"])
+    print(f"{'variante':<11} {'µs/requête':>11} {'surcoût':>9} {'avec vidange':>13}")
+    for variant in variants:
+        request_time, drained = min(results[variant])
+        print(f"{variant:<11} {request_time * 1e6:>11.1f} {(request_time - baseline) * 1e6:>9.1f} "
+              f"{drained * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+"""Benchmark : surcoût par requête de l'instrumentation Prometheus commune
+
+Compare une application Flask minimale avec et sans instrument_flask, via le client de test
+(pas de réseau : seul le coût de traitement de la requête est mesuré).
+
+    PYTHONPATH=. python benchmarks/metrics_overhead.py --requests 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from common.metrics import instrument_flask, observe_request
+
+
+def make_app(instrumented):
+    app = Flask(f"bench_{instrumented}")
+    if instrumented:
+        instrument_flask(app, "bench")
+
+    @app.route('/products/<product_id>', methods=['GET'])
+    def get_product(product_id):
+        return jsonify({"id": product_id})
+
+    return app
+
+
+def time_requests(app, n):
+    client = app.test_client()
+    for _ in range(200):
+        client.get('/products/1')
+    start = time.perf_counter()
+    for i in range(n):
+        client.get(f'/products/{i % 100}')
+    return (time.perf_counter() - start) / n
+
+
+def main(args):
+    apps = {False: make_app(False), True: make_app(True)}
+    results = {False: [], True: []}
+    # Mesures alternées pour que les variations de charge de la machine touchent les deux variantes
+    for _ in range(args.rounds):
+        for instrumented, app in apps.items():
+            results[instrumented].append(time_requests(app, args.requests))
+    baseline, instrumented = min(results[False]), min(results[True])
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        observe_request("bench", "GET", "/products/<product_id>", 200, 0.001)
+    record_only = (time.perf_counter() - start) / args.requests
+
+    print(f"Sans instrumentation : {baseline * 1e6:8.1f} µs/requête")
+    print(f"Avec instrumentation : {instrumented * 1e6:8.1f} µs/requête")
+    print(f"Surcoût              : {(instrumented - baseline) * 1e6:8.1f} µs/requête "
+          f"({(instrumented / baseline - 1) * 100:.1f} %)")
+    print(f"dont enregistrement  : {record_only * 1e6:8.1f} µs/requête")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+"""Benchmark : débit du moteur de réservation selon le nombre de threads
+
+Compare les verrous par bande (--stripes) à un verrou global (1 bande). Chaque opération
+réserve 1 à 3 produits au hasard puis libère la réservation.
+
+Avec --data-dir, chaque modification est journalisée dans un vrai journal common.storage sous
+ce répertoire, comme dans stock-service : écriture sans attente sous le verrou du produit, puis
+une attente du fsync par opération, hors verrous. Sans --data-dir, --work-us simule le travail
+fait sous le verrou pour chaque produit modifié.
+
+    python benchmarks/stock_contention.py --threads 1 2 4 8 16 --data-dir /tmp/stock-bench
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "stock_service"))
+
+from common.storage import Store
+from reservations import ReservationEngine
+
+
+def run(stripes, threads, ops_per_thread, products, work_us, data_dir=None):
+    stock_db = {str(i): {"product_id": str(i), "quantity": 10 ** 9, "reserved": 0} for i in range(products)}
+    store = None
+    if data_dir:
+        directory = os.path.join(data_dir, f"stripes-{stripes}-threads-{threads}")
+        shutil.rmtree(directory, ignore_errors=True)
+        store = Store(directory, "stock", stock_db)
+        engine = ReservationEngine(stock_db, stripes=stripes,
+                                   on_change=lambda product_id: store.put(product_id, stock_db[product_id],
+                                                                          wait=False),
+                                   on_commit=store.sync)
+    else:
+        on_change = (lambda product_id: time.sleep(work_us / 1e6)) if work_us else None
+        engine = ReservationEngine(stock_db, stripes=stripes, on_change=on_change)
+    product_ids = list(stock_db)
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            quantities = {product_id: 1 for product_id in rng.sample(product_ids, rng.randint(1, 3))}
+            engine.release_hold(engine.reserve(quantities).id)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert all(stock["reserved"] == 0 for stock in stock_db.values())
+    if store is not None:
+        print(f"  {stripes} bande(s), {threads} threads : {store.stats()['fsyncs_total']} fsync pour "
+              f"{store.stats()['records_total']} écritures")
+    return threads * ops_per_thread / elapsed
+
+
+def main(args):
+    work = f"journal sous {args.data_dir}" if args.data_dir else f"travail sous verrou : {args.work_us} µs"
+    print(f"{args.products} produits, {args.ops} opérations/thread, {work}")
+    rows = []
+    for threads in args.threads:
+        global_lock = run(1, threads, args.ops, args.products, args.work_us, args.data_dir)
+        striped = run(args.stripes, threads, args.ops, args.products, args.work_us, args.data_dir)
+        rows.append((threads, global_lock, striped))
+    print(f"{'threads':>7} {'global ops/s':>13} {'bandes ops/s':>13} {'gain':>6}")
+    for threads, global_lock, striped in rows:
+        print(f"{threads:>7} {global_lock:>13.0f} {striped:>13.0f} {striped / global_lock:>5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--ops", type=int, default=2000, help="opérations par thread")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--work-us", type=int, default=50)
+    parser.add_argument("--data-dir", help="journaliser dans un vrai journal sous ce répertoire")
+    main(parser.parse_args())
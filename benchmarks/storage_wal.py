@@ -0,0 +1,88 @@
+"""Benchmark : débit d'écriture du stockage durable (group commit) et temps de reprise
+
+Écriture : N threads font des put() synchronisés (fsync) ; le group commit regroupe les
+écrivains concurrents dans un même fsync, le débit doit donc croître avec le nombre de threads.
+Reprise : temps de rechargement selon la taille du journal, sans instantané (rejeu de tout
+le journal) puis après compaction (instantané d'une ligne par clé).
+
+    python benchmarks/storage_wal.py --threads 1 4 16 64 --records 10000 100000 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.storage import Store
+
+
+def write_throughput(directory, threads, puts_per_thread, keys):
+    store = Store(directory, "bench", segment_bytes=1 << 40)
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_id):
+        barrier.wait()
+        for i in range(puts_per_thread):
+            key = f"{(worker_id * puts_per_thread + i) % keys}"
+            store.put(key, {"product_id": key, "quantity": i, "reserved": worker_id})
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return threads * puts_per_thread / elapsed, store.records_total / max(1, store.fsyncs_total)
+
+
+def recovery_time(directory, records, keys):
+    store = Store(directory, "bench", fsync=False, segment_bytes=1 << 40)
+    for i in range(records):
+        key = f"{i % keys}"
+        store.put(key, {"product_id": key, "quantity": i, "reserved": 0}, wait=False)
+    store.sync()
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    start = time.perf_counter()
+    Store(directory, "bench")
+    replay = time.perf_counter() - start
+
+    store.snapshot()
+    start = time.perf_counter()
+    Store(directory, "bench")
+    compacted = time.perf_counter() - start
+    return size, replay, compacted
+
+
+def main(args):
+    root = tempfile.mkdtemp(prefix="storage-bench-", dir=args.dir)
+    try:
+        print(f"Écriture : {args.puts} put()/thread synchronisés, {args.keys} clés")
+        print(f"{'threads':>7} {'put/s':>10} {'put/fsync':>10}")
+        for threads in args.threads:
+            rate, batch = write_throughput(tempfile.mkdtemp(dir=root), threads, args.puts, args.keys)
+            print(f"{threads:>7} {rate:>10.0f} {batch:>10.1f}")
+
+        print(f"\nReprise : {args.keys} clés")
+        print(f"{'records':>9} {'journal Mo':>11} {'rejeu s':>9} {'instantané s':>13}")
+        for records in args.records:
+            size, replay, compacted = recovery_time(tempfile.mkdtemp(dir=root), records, args.keys)
+            print(f"{records:>9} {size / 1e6:>11.1f} {replay:>9.3f} {compacted:>13.3f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--puts", type=int, default=500, help="put() par thread")
+    parser.add_argument("--records", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--dir", default=None, help="répertoire des fichiers (par défaut : temporaire)")
+    main(parser.parse_args())
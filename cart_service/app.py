@@ -1,83 +1,137 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import itertools
 import logging
 import requests
 
+from common.logs import setup_logging
+from common.metrics import instrument_flask, stats_lines, upstream_request
+from common.stateserver import shared_state
+from common.tracing import trace_flask
+from prices import PriceCache
+
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "cart", extra=lambda: stats_lines("cart_price_cache", [({}, price_cache.stats())]) +
+                 state.metrics())
+trace_flask(app, "cart")
 
-logging.basicConfig(level=logging.INFO)
+setup_logging("cart")
 logger = logging.getLogger(__name__)
 
-# Base de données simulée pour les paniers
-carts_db = {}
+# Paniers et vue du stock : objet local, ou processus partagé par les workers gunicorn
+state = shared_state("state:CartState")
 
 # URLs des services (à adapter selon votre configuration)
-PRODUCTS_SERVICE_URL = "http://products-service:5001"
-STOCK_SERVICE_URL = "http://stock-service:5002"
+PRODUCTS_SERVICE_URLS = [
+    "http://products-service-1:5001",
+    "http://products-service-2:5001"
+]
+
+# Durée de validité (secondes) d'un prix en cache et taille maximum d'une lecture groupée
+PRICE_TTL = 30.0
+PRICE_BATCH_SIZE = 200
+
+http = requests.Session()
+
+# Instance products essayée en premier, à tour de rôle d'une lecture à l'autre
+next_instance = itertools.count()
+
+def fetch_prices(product_ids):
+    """Lecture groupée des prix ; en cas d'échec, l'instance products suivante est essayée"""
+    prices = {}
+    for start in range(0, len(product_ids), PRICE_BATCH_SIZE):
+        ids = ",".join(product_ids[start:start + PRICE_BATCH_SIZE])
+        first = next(next_instance) % len(PRODUCTS_SERVICE_URLS)
+        instances = PRODUCTS_SERVICE_URLS[first:] + PRODUCTS_SERVICE_URLS[:first]
+        for attempt, base_url in enumerate(instances, 1):
+            try:
+                response = upstream_request("cart", "products", "GET", f"{base_url}/products",
+                                            session=http, params={"ids": ids}, timeout=2)
+                response.raise_for_status()
+                break
+            except requests.RequestException:
+                if attempt == len(PRODUCTS_SERVICE_URLS):
+                    raise
+        prices.update((product["id"], product["price"]) for product in response.json()["products"])
+    return prices
+
+price_cache = PriceCache(fetch_prices, ttl=PRICE_TTL)
+
+def apply_prices(cart):
+    """Renseigne le prix unitaire de chaque ligne et le total ; None si un prix est inconnu"""
+    prices = price_cache.get_many([item["product_id"] for item in cart["items"]])
+    for item in cart["items"]:
+        item["unit_price"] = prices[item["product_id"]]
+    if all(item["unit_price"] is not None for item in cart["items"]):
+        cart["total"] = round(sum(item["unit_price"] * item["quantity"] for item in cart["items"]), 2)
+    else:
+        cart["total"] = None
+    return cart
 
 @app.route('/cart/<customer_id>', methods=['GET'])
 def get_cart(customer_id):
-    logger.info(f"Récupération panier pour client {customer_id}")
-    cart = carts_db.get(customer_id, {"items": [], "total": 0})
-    return jsonify(cart)
+    logger.info("Récupération panier pour client %s", customer_id)
+    return jsonify(apply_prices(state.get(customer_id)))
+
+def parse_items(items):
+    """Agrège une liste [{product_id, quantity}] en {product_id: quantité totale}"""
+    if not isinstance(items, list) or not items:
+        return None
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("product_id") is None:
+            return None
+        product_id = str(item["product_id"])
+        quantity = item.get("quantity", 1)
+        # bool est un int en Python : {"quantity": true} ne doit pas ajouter une unité
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+            return None
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+def add_items(customer_id, quantities):
+    """Ajoute toutes les lignes ou aucune, vérifiées contre la vue locale du stock"""
+    cart, rejected = state.add_items(customer_id, quantities)
+    if rejected is not None:
+        product_id, error = rejected
+        return {"error": error, "product_id": product_id}, 400
+    
+    # Recalculer le total : un seul appel groupé au catalogue pour les prix absents du cache
+    apply_prices(cart)
+    return cart, 200
 
 @app.route('/cart/<customer_id>/add', methods=['POST'])
 def add_to_cart(customer_id):
     data = request.get_json()
-    product_id = data.get("product_id")
-    quantity = data.get("quantity", 1)
-    
-    # Vérifier la disponibilité du produit
-    try:
-        stock_response = requests.get(f"{STOCK_SERVICE_URL}/stock/{product_id}")
-        if stock_response.status_code != 200:
-            return jsonify({"error": "Product not available"}), 400
-            
-        stock_data = stock_response.json()
-        if stock_data["quantity"] - stock_data["reserved"] < quantity:
-            return jsonify({"error": "Insufficient stock"}), 400
-    except:
-        logger.warning("Impossible de vérifier le stock")
-    
-    # Ajouter au panier
-    if customer_id not in carts_db:
-        carts_db[customer_id] = {"items": [], "total": 0}
-    
-    cart = carts_db[customer_id]
-    
-    # Chercher si le produit existe déjà dans le panier
-    for item in cart["items"]:
-        if item["product_id"] == product_id:
-            item["quantity"] += quantity
-            break
-    else:
-        cart["items"].append({
-            "product_id": product_id,
-            "quantity": quantity
-        })
+    quantities = parse_items([data])
+    if quantities is None:
+        return jsonify({"error": "Invalid item"}), 400
     
-    # Recalculer le total (simplifié)
-    cart["total"] = len(cart["items"])
+    body, status = add_items(customer_id, quantities)
+    if status == 200:
+        logger.info("Ajout au panier %s: produit %s, quantité %s",
+                    customer_id, data['product_id'], data.get('quantity', 1))
+    return jsonify(body), status
+
+@app.route('/cart/<customer_id>/items', methods=['POST'])
+def add_items_to_cart(customer_id):
+    """Ajout groupé : {"items": [{product_id, quantity}, ...]}, tout ou rien"""
+    quantities = parse_items((request.get_json() or {}).get("items"))
+    if quantities is None:
+        return jsonify({"error": "Invalid items"}), 400
     
-    logger.info(f"Ajout au panier {customer_id}: produit {product_id}, quantité {quantity}")
-    return jsonify(cart)
+    body, status = add_items(customer_id, quantities)
+    if status == 200:
+        logger.info("Ajout groupé au panier %s: %s produits", customer_id, len(quantities))
+    return jsonify(body), status
 
 @app.route('/cart/<customer_id>/clear', methods=['DELETE'])
 def clear_cart(customer_id):
-    if customer_id in carts_db:
-        carts_db[customer_id] = {"items": [], "total": 0}
-    logger.info(f"Panier vidé pour client {customer_id}")
+    state.clear(customer_id)
+    logger.info("Panier vidé pour client %s", customer_id)
     return jsonify({"success": True})
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "service": "cart"})
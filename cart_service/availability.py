@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StockView:
+    """Vue locale des disponibilités du stock, tenue à jour par interrogation courte
+
+    `fetch(epoch, since)` renvoie la réponse de GET /stock/changes : seuls les produits modifiés
+    depuis la dernière version reçue transitent. Les ajouts au panier sont vérifiés contre
+    cette vue, sans appel au stock ; la vérification qui fait foi a lieu à la réservation.
+    Si la vue n'a pas pu être rafraîchie depuis `max_staleness` secondes, elle ne bloque
+    plus les ajouts plutôt que de refuser sur des données périmées.
+    """
+
+    def __init__(self, fetch, interval=1.0, max_staleness=10.0):
+        self.fetch = fetch
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.available = {}
+        self.epoch = None
+        self.version = 0
+        self.synced_at = None
+        self.refresh_errors = 0
+        self.unchecked_total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stock-view", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Rafraîchissement de la vue du stock en échec (%s)", e)
+            if self._stop.wait(self.interval):
+                return
+
+    def refresh(self):
+        changes = self.fetch(self.epoch, self.version)
+        updates = {item["product_id"]: item["available"] for item in changes["items"]}
+        if changes["full"]:
+            # Remplacement atomique : les lecteurs voient l'ancienne ou la nouvelle vue
+            self.available = updates
+        else:
+            self.available.update(updates)
+        self.epoch = changes["epoch"]
+        self.version = changes["version"]
+        self.synced_at = time.monotonic()
+
+    def is_fresh(self):
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def check(self, quantities):
+        """Renvoie (product_id, erreur) pour la première ligne refusée, ou None"""
+        if not self.is_fresh():
+            self.unchecked_total += 1
+            return None
+        available = self.available
+        for product_id, quantity in quantities.items():
+            if product_id not in available:
+                return product_id, "Product not available"
+            if available[product_id] < quantity:
+                return product_id, "Insufficient stock"
+        return None
+
+    def stats(self):
+        return {
+            "products": len(self.available),
+            "version": self.version,
+            "age_seconds": round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else -1,
+            "refresh_errors_total": self.refresh_errors,
+            "unchecked_adds_total": self.unchecked_total
+        }
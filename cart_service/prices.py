@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCache:
+    """Cache des prix du catalogue avec TTL, rempli par lectures groupées
+
+    `fetch(product_ids)` renvoie {product_id: prix} pour les produits connus du catalogue.
+    Tous les prix manquants ou expirés d'une requête sont chargés en un seul appel ; les
+    produits inconnus sont mémorisés avec un prix None pour ne pas être redemandés à chaque
+    lecture. Si le catalogue ne répond pas, les prix expirés restent servis.
+    """
+
+    def __init__(self, fetch, ttl=30.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._prices = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+
+    def get_many(self, product_ids):
+        """Renvoie {product_id: prix ou None}"""
+        now = time.monotonic()
+        with self._lock:
+            entries = {product_id: self._prices.get(product_id) for product_id in product_ids}
+            stale = [product_id for product_id, entry in entries.items() if entry is None or entry[1] <= now]
+            self.hits += len(entries) - len(stale)
+            self.misses += len(stale)
+
+        if stale:
+            try:
+                fetched = self.fetch(stale)
+            except Exception as e:
+                self.fetch_errors += 1
+                logger.warning("Prix indisponibles, valeurs expirées conservées (%s)", e)
+            else:
+                expires_at = time.monotonic() + self.ttl
+                with self._lock:
+                    for product_id in stale:
+                        entries[product_id] = self._prices[product_id] = (fetched.get(product_id), expires_at)
+
+        return {product_id: entry[0] if entry is not None else None for product_id, entry in entries.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._prices),
+                "hits_total": self.hits,
+                "misses_total": self.misses,
+                "fetch_errors_total": self.fetch_errors
+            }
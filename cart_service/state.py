@@ -0,0 +1,82 @@
+import copy
+import threading
+
+import requests
+
+from common.metrics import stats_lines, upstream_request
+from common.storage import open_store, prometheus_lines as storage_metrics
+from availability import StockView
+
+STOCK_SERVICE_URL = "http://stock-service:5002"
+
+# Intervalle (secondes) d'interrogation du flux de changements du stock
+STOCK_POLL_INTERVAL = 1.0
+
+
+class CartState:
+    """État du service cart : paniers et vue locale du stock
+
+    Partagé par tous les workers via common.stateserver : la vérification contre la vue du
+    stock et la modification du panier se font sous le même verrou, dans un seul processus.
+    """
+
+    def __init__(self):
+        # Base de données simulée pour les paniers, rechargée depuis le journal au démarrage
+        self.carts_db = {}
+        self.carts_store = open_store("carts", self.carts_db)
+        self.carts_lock = threading.Lock()
+        self.http = requests.Session()
+        self.stock_view = StockView(self._fetch_stock_changes, interval=STOCK_POLL_INTERVAL)
+        self.stock_view.start()
+
+    def _fetch_stock_changes(self, epoch, since):
+        params = {"since": since}
+        if epoch is not None:
+            params["epoch"] = epoch
+        response = upstream_request("cart", "stock", "GET", f"{STOCK_SERVICE_URL}/stock/changes",
+                                    session=self.http, params=params, timeout=2)
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, customer_id):
+        with self.carts_lock:
+            cart = self.carts_db.get(customer_id)
+            return copy.deepcopy(cart) if cart is not None else {"items": [], "total": 0}
+
+    def add_items(self, customer_id, quantities):
+        """Ajoute toutes les lignes ou aucune ; renvoie (panier, None) ou (None, (product_id, erreur))"""
+        with self.carts_lock:
+            current = self.carts_db.get(customer_id)
+            lines = {item["product_id"]: item["quantity"] for item in current["items"]} if current else {}
+            # Vérifier la quantité qu'aurait chaque ligne du panier après l'ajout ; un refus ne crée pas le panier
+            rejected = self.stock_view.check({
+                product_id: quantity + lines.get(product_id, 0) for product_id, quantity in quantities.items()
+            })
+            if rejected is not None:
+                return None, rejected
+
+            # Le panier est remplacé par une copie modifiée, jamais modifié en place : la valeur
+            # journalisée sous le verrou est exactement celle qui est enregistrée
+            cart = copy.deepcopy(current) if current is not None else {"items": [], "total": 0}
+            items = {item["product_id"]: item for item in cart["items"]}
+            for product_id, quantity in quantities.items():
+                if product_id in items:
+                    items[product_id]["quantity"] += quantity
+                else:
+                    cart["items"].append({"product_id": product_id, "quantity": quantity})
+            self.carts_store.put(customer_id, cart, wait=False)
+            result = copy.deepcopy(cart)
+        # Écriture sur disque attendue hors verrou : les ajouts concurrents partagent le même fsync
+        self.carts_store.sync()
+        return result, None
+
+    def clear(self, customer_id):
+        with self.carts_lock:
+            if customer_id not in self.carts_db:
+                return
+            self.carts_store.put(customer_id, {"items": [], "total": 0}, wait=False)
+        self.carts_store.sync()
+
+    def metrics(self):
+        return stats_lines("cart_stock_view", [({}, self.stock_view.stats())]) + \
+            storage_metrics(self.carts_store)
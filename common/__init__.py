@@ -0,0 +1 @@
+"""Modules partagés par la gateway et les services (copiés dans chaque image Docker)"""
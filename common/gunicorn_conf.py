@@ -0,0 +1,64 @@
+"""Configuration gunicorn commune aux services (mode production multi-workers)
+
+    gunicorn -c common/gunicorn_conf.py app:app
+
+PORT : port d'écoute ; WEB_CONCURRENCY : nombre de workers (par défaut, un par cœur) ;
+GUNICORN_THREADS : threads par worker. Les logs par requête sont échantillonnés à 10 %
+(LOG_SAMPLE_RATE, voir common/logs.py). Si STATE_FACTORY est défini (ex. « state:StockState »),
+le maître démarre le processus d'état partagé avant de lancer les workers (voir stateserver.py).
+Les métriques Prometheus des workers sont agrégées via PROMETHEUS_MULTIPROC_DIR.
+"""
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+
+# Lu par common.logs au chargement de l'application dans chaque worker
+os.environ.setdefault("LOG_SAMPLE_RATE", "0.1")
+# Requêtes traitées en parallèle par un worker : lu par le contrôle d'admission de la gateway
+if worker_class == "gthread":
+    os.environ["SERVER_THREADS"] = str(threads)
+
+_state_manager = None
+
+
+def on_starting(server):
+    # Répertoire des métriques vidé à chaque démarrage : les fichiers d'anciens workers fausseraient les sommes
+    metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                                        os.path.join(tempfile.gettempdir(), "prometheus-multiproc"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+    factory = os.environ.get("STATE_FACTORY")
+    if factory:
+        global _state_manager
+        from common.stateserver import start_state_server
+
+        address = os.path.join(tempfile.gettempdir(), f"state-{os.getpid()}.sock")
+        authkey = secrets.token_bytes(32)
+        _state_manager = start_state_server(factory, address, authkey)
+        # Hérités par les workers, qui se connectent au processus d'état au chargement de l'application
+        os.environ["STATE_SOCKET"] = address
+        os.environ["STATE_AUTHKEY"] = authkey.hex()
+        server.log.info(f"Processus d'état {factory} démarré sur {address}")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _state_manager is not None:
+        _state_manager.shutdown()
@@ -0,0 +1,189 @@
+"""Configuration des logs commune aux services : écriture hors du chemin des requêtes
+
+    from common.logs import setup_logging
+    setup_logging("orders")
+    logger.info("Commande créée: %s", order_id)
+
+Le thread de la requête ne fait que déposer l'enregistrement dans un tampon ; un thread
+d'écriture le vide toutes les LOG_FLUSH_INTERVAL secondes, formate chaque message en une
+ligne JSON compacte (service, niveau, message, request_id) et écrit le lot sur stderr en une
+fois. Les messages sont formatés par ce thread : passer les valeurs en arguments (%s), pas
+en f-string, et uniquement des valeurs qui ne changeront plus.
+
+Les messages INFO/DEBUG émis pendant une requête sont échantillonnés (LOG_SAMPLE_RATE) :
+la décision dépend du X-Request-Id, donc une requête gardée l'est dans tous les services,
+avec tous ses messages. Les requêtes tracées (common.tracing), les warnings et les erreurs,
+et les messages hors requête (démarrage, tâches de fond) sont toujours écrits.
+"""
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from json.encoder import encode_basestring
+
+from common import tracing
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+LOG_BUFFER_SIZE = int(os.environ.get("LOG_BUFFER_SIZE", "20000"))
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "0.05"))
+
+_writer = None
+_sample_rate = LOG_SAMPLE_RATE
+
+
+def request_sampled(context, rate):
+    """Décision stable pour une requête : même X-Request-Id, même décision dans chaque service"""
+    if rate >= 1 or context.sampled:
+        return True
+    try:
+        return int(context.request_id[:8], 16) < rate * 0x100000000
+    except ValueError:
+        return hash(context.request_id) % 10000 < rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON compacte par message
+
+    La ligne est assemblée à la main (seules les chaînes variables passent par l'encodeur
+    JSON) : un json.dumps du dict coûte plusieurs fois le formatage texte de basicConfig.
+    """
+
+    def __init__(self, service):
+        super().__init__()
+        self._prefix = f',"service":{encode_basestring(service)},"logger":'
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record):
+        second = int(record.created)
+        if second != self._second:
+            self._second, self._second_text = second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        line = (f'{{"ts":"{self._second_text}.{int(record.msecs):03d}Z","level":"{record.levelname}"'
+                f'{self._prefix}{encode_basestring(record.name)},"msg":{encode_basestring(record.getMessage())}')
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            line += f',"request_id":{encode_basestring(request_id)}'
+        if record.exc_info:
+            line += f',"exc":{encode_basestring(self.formatException(record.exc_info))}'
+        return line + "}"
+
+
+class SampledLogger(logging.Logger):
+    """Logger qui écarte les messages INFO/DEBUG des requêtes non échantillonnées
+
+    La décision est prise dans isEnabledFor, avant la création de l'enregistrement (l'essentiel
+    du coût d'un message) : un message écarté coûte autant qu'un message sous le niveau.
+    """
+
+    def isEnabledFor(self, level):
+        if level < logging.WARNING and _sample_rate < 1:
+            context = tracing.current()
+            if context is not None and not request_sampled(context, _sample_rate):
+                return False
+        return super().isEnabledFor(level)
+
+
+class BufferedHandler(logging.Handler):
+    """Dépose les enregistrements dans un tampon borné, sans verrou ni formatage
+
+    Le thread d'écriture n'est pas réveillé à chaque message (pas d'aller-retour du GIL entre
+    les threads) : il vide le tampon à intervalle fixe. Tampon plein : les messages INFO/DEBUG
+    sont perdus (et comptés), les warnings et erreurs sont toujours gardés.
+    """
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE):
+        super().__init__()
+        self.capacity = capacity
+        self.buffer = deque()
+        self.dropped = 0
+
+    def handle(self, record):
+        if record.levelno < logging.WARNING and len(self.buffer) >= self.capacity:
+            self.dropped += 1
+            return False
+        context = tracing.current()
+        if context is not None:
+            # Lu ici : le thread d'écriture n'a pas le contexte de la requête
+            record.request_id = context.request_id
+        self.buffer.append(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+    def stats(self):
+        return {"dropped": self.dropped, "buffered": len(self.buffer)}
+
+
+class LogWriter:
+    """Thread d'écriture : vide le tampon à intervalle fixe, une écriture et un flush par lot"""
+
+    def __init__(self, handler, formatter, stream, interval=LOG_FLUSH_INTERVAL):
+        self.handler = handler
+        self.formatter = formatter
+        self.stream = stream
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Écrit ce qui reste dans le tampon puis arrête le thread"""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def flush(self):
+        buffer = self.handler.buffer
+        lines = []
+        while buffer:
+            record = buffer.popleft()
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                # Message mal formé (arguments incompatibles, __str__ qui échoue) : signalé sur
+                # stderr comme le fait logging, sans arrêter le thread ni perdre le reste du lot
+                self.handler.handleError(record)
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+        self.flush()
+
+
+def setup_logging(service, level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE, stream=None):
+    """Remplace les handlers du logger racine par le tampon et démarre le thread d'écriture"""
+    global _writer, _sample_rate
+    _sample_rate = sample_rate
+    # Loggers déjà créés (modules importés avant) et à venir
+    logging.setLoggerClass(SampledLogger)
+    for existing in logging.Logger.manager.loggerDict.values():
+        if type(existing) is logging.Logger:
+            existing.__class__ = SampledLogger
+    if _writer is not None:
+        _writer.stop()
+    else:
+        # Vider le tampon à l'arrêt du processus
+        atexit.register(lambda: _writer.stop())
+
+    handler = BufferedHandler()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _writer = LogWriter(handler, JsonFormatter(service), stream or sys.stderr)
+    _writer.start()
+    return handler
@@ -0,0 +1,184 @@
+"""Instrumentation Prometheus commune à la gateway et aux services
+
+    from common.metrics import instrument_flask
+    instrument_flask(app, "products")
+
+Compatible avec le service multi-workers : si PROMETHEUS_MULTIPROC_DIR est défini avant le
+démarrage, chaque worker écrit ses valeurs dans ce répertoire et /metrics les agrège.
+"""
+import os
+import time
+from urllib.parse import urlsplit
+
+from common import tracing
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter("http_requests_total", "Requêtes HTTP traitées",
+                   ["service", "method", "route", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "Durée de traitement des requêtes HTTP",
+                    ["service", "method", "route"], buckets=BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requêtes HTTP en cours de traitement",
+                  ["service"], multiprocess_mode="livesum")
+UPSTREAM_LATENCY = Histogram("upstream_request_duration_seconds", "Durée des appels vers un autre service",
+                             ["service", "target", "instance", "outcome"], buckets=BUCKETS)
+
+# Les enfants labellisés sont mis en cache : .labels() coûte plus cher qu'une recherche de dict
+_children = {}
+
+
+def _child(metric, *labels):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_request(service, method, route, status, duration):
+    _child(REQUESTS, service, method, route, str(status)).inc()
+    _child(LATENCY, service, method, route).observe(duration)
+
+
+def observe_upstream(service, target, instance, duration, outcome):
+    """Enregistre un appel sortant ; outcome : classe du statut (2xx, 4xx, 5xx) ou « error »"""
+    _child(UPSTREAM_LATENCY, service, target, instance, outcome).observe(duration)
+
+
+def status_outcome(status_code):
+    return f"{status_code // 100}xx"
+
+
+def upstream_request(service, target, method, url, session=None, **kwargs):
+    """Équivalent instrumenté de requests.request pour les appels entre services
+
+    Propage l'identifiant de requête et la trace en cours (voir common.tracing).
+    """
+    import requests
+
+    parts = urlsplit(url)
+    instance = f"{parts.scheme}://{parts.netloc}"
+    with tracing.span(f"{target} {method} {parts.path}", instance=instance) as span:
+        kwargs["headers"] = dict(kwargs.get("headers") or {}, **tracing.outgoing_headers())
+        start = time.perf_counter()
+        try:
+            response = (session or requests).request(method, url, **kwargs)
+        except Exception:
+            observe_upstream(service, target, instance, time.perf_counter() - start, "error")
+            raise
+        observe_upstream(service, target, instance, time.perf_counter() - start,
+                         status_outcome(response.status_code))
+        span.set("status", response.status_code)
+        return response
+
+
+def metrics_payload(extra=None):
+    """Corps et Content-Type de la réponse /metrics"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    body = generate_latest(registry)
+    if extra is not None:
+        body += extra().encode()
+    return body, CONTENT_TYPE_LATEST
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def stats_lines(prefix, series):
+    """Expose des valeurs internes (dicts renvoyés par stats()) au format texte Prometheus
+
+    `series` : liste de (labels, stats). Chaque clé devient la métrique <prefix>_<clé>, de type
+    counter si elle se termine par _total, gauge sinon (booléens exportés en 0/1).
+    Ces valeurs sont propres au processus qui les tient. En mode multi-workers
+    (PROMETHEUS_MULTIPROC_DIR), chaque série porte donc le label `worker` (pid) : un scrape
+    tombe sur un worker au hasard, les valeurs s'agrègent côté Prometheus, par exemple
+    sum without (worker) (rate(gateway_cache_hits_total[1m])).
+    """
+    worker = str(os.getpid()) if os.environ.get("PROMETHEUS_MULTIPROC_DIR") else None
+    families = {}
+    for labels, stats in series:
+        if worker is not None:
+            labels = dict(labels, worker=worker)
+        label_text = ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+        for key, value in stats.items():
+            families.setdefault(key, []).append((label_text, int(value) if isinstance(value, bool) else value))
+    lines = []
+    for key, samples in families.items():
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {key.replace('_', ' ')} ({prefix}, valeur par processus)")
+        lines.append(f"# TYPE {name} {'counter' if key.endswith('_total') else 'gauge'}")
+        lines.extend(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+                     for label_text, value in samples)
+    return "".join(line + "\n" for line in lines)
+
+
+def instrument_flask(app, service, extra=None):
+    """Ajoute compteurs, histogrammes et jauge en vol à toutes les routes, et expose /metrics
+
+    `extra` : fonction optionnelle renvoyant des lignes au format texte Prometheus à ajouter.
+    """
+    from flask import g, request
+
+    in_flight = _child(IN_FLIGHT, service)
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        in_flight.inc()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(service, request.method, route, response.status_code,
+                            time.perf_counter() - start)
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        in_flight.dec()
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            # Exception non gérée : after_request n'a pas été appelé
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(service, request.method, route, 500, time.perf_counter() - start)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body, content_type = metrics_payload(extra)
+        return body, 200, {'Content-Type': content_type}
+
+
+def aiohttp_middleware(service):
+    """Middleware aiohttp équivalent à instrument_flask"""
+    from aiohttp import web
+
+    in_flight = _child(IN_FLIGHT, service)
+
+    @web.middleware
+    async def middleware(request, handler):
+        start = time.perf_counter()
+        in_flight.inc()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            in_flight.dec()
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else "unmatched"
+            observe_request(service, request.method, route, status, time.perf_counter() - start)
+
+    return middleware
@@ -0,0 +1,81 @@
+"""État partagé entre les workers gunicorn d'un service
+
+    # state.py du service
+    class StockState: ...
+
+    # app.py
+    state = shared_state("state:StockState")
+
+L'objet qui possède l'état (stock et réservations, paniers, commandes...) vit dans un seul
+processus, démarré par le maître gunicorn avant les workers (voir gunicorn_conf.py). Les
+workers l'appellent par un proxy sur un socket Unix (multiprocessing.managers) : chaque
+méthode s'exécute dans le processus d'état, avec ses propres verrous, et les invariants
+(stock jamais négatif, email unique...) tiennent quel que soit le worker qui reçoit la
+requête. Les arguments et résultats sont copiés (pickle) : les méthodes exposées prennent et
+renvoient des valeurs simples, jamais des objets à modifier en place.
+
+Sans STATE_SOCKET (python app.py), shared_state() instancie simplement l'objet localement.
+Chaque appel de méthode est un span de la trace en cours (common.tracing).
+"""
+import importlib
+import os
+from multiprocessing.managers import BaseManager
+
+from common import tracing
+
+_instance = None
+
+
+class _StateManager(BaseManager):
+    pass
+
+
+def _load(factory):
+    module_name, _, attribute = factory.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _create_state(factory):
+    global _instance
+    _instance = _load(factory)()
+
+
+def _get_state():
+    return _instance
+
+
+_StateManager.register("state", callable=_get_state)
+
+
+def start_state_server(factory, address, authkey):
+    """Démarre le processus d'état (à appeler avant de lancer les workers) ; renvoie le manager"""
+    manager = _StateManager(address=address, authkey=authkey)
+    manager.start(initializer=_create_state, initargs=(factory,))
+    return manager
+
+
+class _TracedState:
+    """Enveloppe de l'état : chaque appel de méthode devient un span « state.<méthode> »"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with tracing.span(f"state.{name}"):
+                return attribute(*args, **kwargs)
+        return call
+
+
+def shared_state(factory):
+    """Proxy vers l'état du processus dédié si STATE_SOCKET est défini, sinon instance locale"""
+    address = os.environ.get("STATE_SOCKET")
+    if not address:
+        return _TracedState(_load(factory)())
+    manager = _StateManager(address=address, authkey=bytes.fromhex(os.environ["STATE_AUTHKEY"]))
+    manager.connect()
+    return _TracedState(manager.state())
@@ -0,0 +1,307 @@
+"""Stockage durable des services : dictionnaire en mémoire + journal d'écriture anticipée (WAL)
+
+    from common.storage import open_store
+    orders_store = open_store("orders", orders_db)
+    ...
+    orders_db[order_id]["status"] = "cancelled"
+    orders_store.put(order_id, orders_db[order_id])
+
+Le dictionnaire reste la copie de travail, lue sans détour. Chaque put() ajoute la valeur
+complète de la clé au journal et ne rend la main qu'une fois l'écriture sur disque
+(fsync) : le rejeu est donc idempotent, la dernière écriture l'emporte. Les écrivains
+concurrents partagent les fsync (group commit) : le premier arrivé écrit et synchronise
+tout ce qui attend dans le tampon, les autres attendent son résultat.
+
+Le journal est découpé en segments ; quand un segment dépasse `segment_bytes`, un thread de
+fond écrit un instantané compacté (une ligne par clé) puis supprime les segments qu'il
+couvre. Au démarrage : chargement du dernier instantané, puis rejeu des segments suivants ;
+un enregistrement final incomplet (arrêt pendant une écriture) est ignoré et tronqué.
+
+Sans DATA_DIR, open_store() renvoie un stockage purement en mémoire (même interface).
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+from common.metrics import stats_lines
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get("DATA_DIR")
+
+SEGMENT_BYTES = 4 * 1024 * 1024
+
+
+class StorageError(Exception):
+    pass
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line):
+    """Enregistrement d'une ligne « crc json », ou None si elle est incomplète ou corrompue"""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class Store:
+    """Dictionnaire durable : `data` en mémoire, modifications journalisées par put()/delete()"""
+
+    def __init__(self, directory, name, data=None, fsync=True, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.name = name
+        self.data = data if data is not None else {}
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._appended = 0
+        self._durable = 0
+        self._flushing = False
+        self._error = None
+        self._file = None
+        self._segment = 0
+        self._segment_size = 0
+        self._compact_requested = threading.Event()
+        # Un instantané à la fois : le thread de compaction et un appel direct écriraient le même fichier
+        self._snapshot_lock = threading.Lock()
+        self.records_total = 0
+        self.fsyncs_total = 0
+        self.snapshots_total = 0
+        self.recovered_records = 0
+        self.recovery_seconds = 0.0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._recover()
+            self._compactor = threading.Thread(target=self._run_compactor, name=f"{name}-compactor",
+                                               daemon=True)
+            self._compactor.start()
+
+    # --- Écritures ---
+
+    def put(self, key, value, wait=True):
+        """Enregistre la valeur complète de `key` ; wait=False laisse la synchronisation à sync()"""
+        self.data[key] = value
+        self._append({"k": key, "v": value}, wait)
+
+    def delete(self, key, wait=True):
+        self.data.pop(key, None)
+        self._append({"k": key, "d": 1}, wait)
+
+    def sync(self):
+        """Attend que tout ce qui a été écrit jusqu'ici soit sur disque"""
+        if self.directory is not None:
+            with self._cond:
+                target = self._appended
+                self._wait_durable(target)
+
+    def _append(self, record, wait):
+        if self.directory is None:
+            return
+        line = _encode(record)
+        with self._cond:
+            self._buffer.append(line)
+            self._appended += 1
+            if wait:
+                self._wait_durable(self._appended)
+
+    def _wait_durable(self, seq):
+        """Appelé sous self._cond ; le premier écrivain sans flush en cours devient meneur"""
+        while self._durable < seq:
+            if self._error is not None:
+                raise StorageError(f"Journal {self.name} indisponible: {self._error}")
+            if self._flushing:
+                self._cond.wait()
+                continue
+            self._flushing = True
+            batch, upto, file = self._buffer, self._appended, self._file
+            self._buffer = []
+            # Écriture et fsync hors verrou : les écrivains suivants remplissent le prochain lot
+            self._cond.release()
+            try:
+                data = b"".join(batch)
+                file.write(data)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            except OSError as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self._cond.acquire()
+                self._flushing = False
+            if error is not None:
+                self._error = error
+                self._cond.notify_all()
+                raise StorageError(f"Écriture du journal {self.name} en échec: {error}")
+            self._durable = upto
+            self.records_total += len(batch)
+            self.fsyncs_total += 1
+            self._segment_size += len(data)
+            if self._segment_size >= self.segment_bytes:
+                self._rotate()
+            self._cond.notify_all()
+
+    def _rotate(self, request_snapshot=True):
+        """Ouvre le segment suivant (sous self._cond, hors flush) et demande un instantané des précédents"""
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._segment_size = 0
+        if request_snapshot:
+            self._compact_requested.set()
+
+    # --- Instantanés et compaction ---
+
+    def _run_compactor(self):
+        while True:
+            self._compact_requested.wait()
+            self._compact_requested.clear()
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception("Instantané %s en échec", self.name)
+
+    def snapshot(self):
+        """Écrit l'état courant et supprime les segments qu'il couvre
+
+        L'instantané couvre tous les segments antérieurs au segment courant. Il peut contenir
+        des modifications plus récentes : le put() qui suit chaque modification est dans le
+        segment courant ou un suivant, et son rejeu redonne la même valeur.
+        """
+        with self._snapshot_lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        with self._cond:
+            # Les enregistrements suivants partent dans un nouveau segment, non couvert
+            while self._flushing:
+                self._cond.wait()
+            if self._segment_size > 0:
+                self._rotate(request_snapshot=False)
+            covered = self._segment
+        path = self._snapshot_path(covered)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for key, value in list(self.data.items()):
+                f.write(self._encode_stable(key, value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+        for kind, number, old_path in self._files():
+            if number < covered:
+                os.remove(old_path)
+        self.snapshots_total += 1
+        logger.info("Instantané %s écrit (segment %s, %s clés)", self.name, covered, len(self.data))
+
+    @staticmethod
+    def _encode_stable(key, value):
+        # La valeur peut être modifiée en place pendant la sérialisation : on réessaie
+        for _ in range(10):
+            try:
+                return _encode({"k": key, "v": value})
+            except RuntimeError:
+                continue
+        raise StorageError(f"Valeur {key} modifiée en continu pendant l'instantané")
+
+    # --- Reprise au démarrage ---
+
+    def _recover(self):
+        start = time.perf_counter()
+        files = self._files()
+        snapshots = [(number, path) for kind, number, path in files if kind == "snapshot"]
+        first_segment = 0
+        if snapshots:
+            first_segment, path = max(snapshots)
+            with open(path, "rb") as f:
+                for line in f:
+                    self._replay(_decode(line))
+        segments = sorted((number, path) for kind, number, path in files
+                          if kind == "wal" and number >= first_segment)
+        for number, path in segments:
+            valid_bytes = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    record = _decode(line)
+                    if record is None:
+                        break
+                    self._replay(record)
+                    valid_bytes += len(line)
+            if valid_bytes < os.path.getsize(path):
+                logger.warning("Journal %s: fin incomplète ignorée dans %s", self.name, path)
+                os.truncate(path, valid_bytes)
+
+        self._segment = segments[-1][0] if segments else first_segment
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._segment_size = self._file.tell()
+        self.recovery_seconds = time.perf_counter() - start
+        logger.info("Stockage %s rechargé: %s clés, %s enregistrements en %.3fs",
+                    self.name, len(self.data), self.recovered_records, self.recovery_seconds)
+        if len(segments) > 1:
+            self._compact_requested.set()
+
+    def _replay(self, record):
+        if record is None:
+            return
+        if "d" in record:
+            self.data.pop(record["k"], None)
+        else:
+            self.data[record["k"]] = record["v"]
+        self.recovered_records += 1
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{self.name}.wal.{number:08d}")
+
+    def _snapshot_path(self, number):
+        return os.path.join(self.directory, f"{self.name}.snapshot.{number:08d}")
+
+    def _files(self):
+        pattern = re.compile(rf"^{re.escape(self.name)}\.(wal|snapshot)\.(\d+)$")
+        files = []
+        for filename in os.listdir(self.directory):
+            match = pattern.match(filename)
+            if match:
+                files.append((match.group(1), int(match.group(2)), os.path.join(self.directory, filename)))
+        return files
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def stats(self):
+        return {
+            "records_total": self.records_total,
+            "fsyncs_total": self.fsyncs_total,
+            "snapshots_total": self.snapshots_total,
+            "segment": self._segment,
+            "segment_bytes": self._segment_size,
+            "recovery_seconds": round(self.recovery_seconds, 6)
+        }
+
+
+def open_store(name, data, directory=DATA_DIR, **kwargs):
+    """Stockage durable de `data` sous DATA_DIR, ou en mémoire seulement si DATA_DIR n'est pas défini"""
+    return Store(directory, name, data, **kwargs)
+
+
+def prometheus_lines(*stores):
+    return stats_lines("storage", [({"store": store.name}, store.stats()) for store in stores])
@@ -0,0 +1,57 @@
+"""Jetons de session signés (HMAC-SHA256) émis par customers-service et vérifiés par la gateway
+
+Format : base64url(charge JSON) "." base64url(signature). La charge contient l'id client
+(`sub`) et l'échéance (`exp`, timestamp Unix). Le secret est partagé via AUTH_TOKEN_SECRET,
+obligatoire : sans lui, les services qui émettent ou vérifient des jetons refusent de démarrer.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+
+
+def _load_secret():
+    # Pas de valeur par défaut : un secret connu permettrait à quiconque de forger des jetons
+    secret = os.environ.get("AUTH_TOKEN_SECRET")
+    if not secret:
+        raise RuntimeError("AUTH_TOKEN_SECRET n'est pas défini : générer un secret, par exemple "
+                           "`export AUTH_TOKEN_SECRET=$(openssl rand -hex 32)`")
+    return secret.encode()
+
+
+TOKEN_SECRET = _load_secret()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload, secret):
+    return hmac.new(secret, payload.encode(), hashlib.sha256).digest()
+
+
+def issue_token(customer_id, ttl, secret=TOKEN_SECRET):
+    payload = _b64encode(json.dumps({"sub": customer_id, "exp": int(time.time() + ttl)},
+                                    separators=(",", ":")).encode())
+    return f"{payload}.{_b64encode(_sign(payload, secret))}"
+
+
+def verify_token(token, secret=TOKEN_SECRET):
+    """Charge du jeton ({"sub", "exp"}) si la signature est valide et le jeton non expiré, sinon None"""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload, secret)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) <= time.time():
+        return None
+    return claims
@@ -0,0 +1,310 @@
+"""Traçage des requêtes entre la gateway et les services : latence de chaque saut
+
+    from common.tracing import trace_flask
+    trace_flask(app, "orders")
+
+    with tracing.span("catalog.query", category=category):
+        ...
+
+Chaque requête porte un identifiant (X-Request-Id, renvoyé au client et transmis aux services
+appelés). Une fraction TRACE_SAMPLE_RATE des requêtes qui arrivent sans contexte (à la
+gateway) est tracée ; la décision voyage dans l'en-tête traceparent (format W3C), si bien
+qu'un service trace exactement ce que son appelant a échantillonné. Chaque service garde ses
+segments de trace récents et les plus lents sur /debug/traces (par worker en mode gunicorn) ;
+le même trace_id permet de recoller les segments de la gateway et des services
+(/debug/traces?trace_id=...).
+
+Hors échantillon, un span ne coûte qu'une lecture de contextvar.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+
+REQUEST_ID_HEADER = "X-Request-Id"
+TRACEPARENT_HEADER = "traceparent"
+
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+KEEP_RECENT = int(os.environ.get("TRACE_KEEP_RECENT", "200"))
+KEEP_SLOWEST = int(os.environ.get("TRACE_KEEP_SLOWEST", "50"))
+
+# Requête en cours et span actif (parent des spans suivants) : suivis par thread et par tâche asyncio
+_context = contextvars.ContextVar("trace_context", default=None)
+_active_span = contextvars.ContextVar("trace_active_span", default=None)
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_id, échantillonné) d'un en-tête traceparent, ou None s'il est invalide"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    parent_id = parts[2] if parts[2] != "0" * 16 else None
+    return parts[1], parent_id, bool(flags & 1)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "duration", "attrs", "_t0")
+
+    def __init__(self, name, parent_id, attrs):
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+        self._t0 = time.perf_counter()
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._t0
+
+    def to_dict(self, origin):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attrs": self.attrs
+        }
+
+
+class _NoopSpan:
+    """Span des requêtes non échantillonnées : ne mesure rien"""
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, span):
+        self._span = span
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active_span.set(self._span.span_id)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._span.set("error", exc_type.__name__)
+        self._span.finish()
+        _active_span.reset(self._token)
+        return False
+
+
+class TraceContext:
+    """Requête en cours dans ce service ; ses spans forment le segment local de la trace"""
+    __slots__ = ("request_id", "trace_id", "sampled", "spans", "root")
+
+    def __init__(self, request_id, trace_id, sampled):
+        self.request_id = request_id
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.root = None
+
+    def to_dict(self, service):
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "request_id": self.request_id,
+            "service": service,
+            "name": self.root.name,
+            "start": origin,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            # Les spans des tâches de fond peuvent s'ajouter après la fin de la requête
+            "spans": [span.to_dict(origin) for span in list(self.spans)]
+        }
+
+
+class TraceStore:
+    """Derniers segments terminés et segments les plus lents, bornés en nombre"""
+
+    def __init__(self, keep_recent=KEEP_RECENT, keep_slowest=KEEP_SLOWEST):
+        self.keep_slowest = keep_slowest
+        self._recent = deque(maxlen=keep_recent)
+        self._slowest = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def add(self, trace):
+        item = (trace.root.duration, next(self._seq), trace)
+        with self._lock:
+            self.recorded += 1
+            self._recent.append(trace)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, item)
+            elif self.keep_slowest and item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def query(self, order="recent", trace_id=None, limit=20):
+        with self._lock:
+            if order == "slowest":
+                traces = [trace for _, _, trace in sorted(self._slowest, reverse=True)]
+            else:
+                traces = list(reversed(self._recent))
+        if trace_id:
+            traces = [trace for trace in traces if trace.trace_id == trace_id]
+        return traces[:limit]
+
+
+store = TraceStore()
+
+
+def begin(headers, name):
+    """Ouvre le contexte de la requête entrante ; à refermer avec end()"""
+    parent = parse_traceparent(headers.get(TRACEPARENT_HEADER))
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = _new_id(16), None
+        sampled = SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+    context = TraceContext(headers.get(REQUEST_ID_HEADER) or trace_id, trace_id, sampled)
+    _context.set(context)
+    if sampled:
+        context.root = Span(name, parent_id, {})
+        context.spans.append(context.root)
+        _active_span.set(context.root.span_id)
+    else:
+        _active_span.set(None)
+    return context
+
+
+def end(context, status):
+    """Referme la requête et conserve son segment s'il est échantillonné"""
+    if context.root is not None and context.root.duration is None:
+        context.root.set("status", status)
+        context.root.finish()
+        store.add(context)
+    _context.set(None)
+    _active_span.set(None)
+
+
+def span(name, **attrs):
+    """Span enfant du span actif : `with span("stock.reserve") as s: ... s.set("status", 200)`"""
+    context = _context.get()
+    if context is None or not context.sampled:
+        return _NOOP
+    new_span = Span(name, _active_span.get(), attrs)
+    context.spans.append(new_span)
+    return _ActiveSpan(new_span)
+
+
+def current():
+    """Contexte de la requête en cours (None hors requête)"""
+    return _context.get()
+
+
+def current_request_id():
+    context = _context.get()
+    return context.request_id if context is not None else None
+
+
+def outgoing_headers():
+    """En-têtes à ajouter aux appels sortants pour propager la requête et le span actif"""
+    context = _context.get()
+    if context is None:
+        return {}
+    parent_id = _active_span.get() or "0" * 16
+    return {
+        REQUEST_ID_HEADER: context.request_id,
+        TRACEPARENT_HEADER: f"00-{context.trace_id}-{parent_id}-{'01' if context.sampled else '00'}"
+    }
+
+
+def debug_payload(service, args):
+    """Corps de /debug/traces : ?order=recent|slowest, ?trace_id=..., ?limit=N"""
+    try:
+        limit = max(1, min(int(args.get("limit", 20)), 200))
+    except ValueError:
+        limit = 20
+    traces = store.query(args.get("order", "recent"), args.get("trace_id"), limit)
+    return {
+        "service": service,
+        "pid": os.getpid(),
+        "sample_rate": SAMPLE_RATE,
+        "recorded": store.recorded,
+        "traces": [trace.to_dict(service) for trace in traces]
+    }
+
+
+def trace_flask(app, service):
+    """Ouvre un contexte de trace par requête, renvoie X-Request-Id et expose /debug/traces"""
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _begin_trace():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g._trace = begin(request.headers, f"{service} {request.method} {rule}")
+
+    @app.after_request
+    def _end_trace(response):
+        context = g.pop("_trace", None)
+        if context is not None:
+            response.headers[REQUEST_ID_HEADER] = context.request_id
+            end(context, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _abort_trace(exc):
+        context = g.pop("_trace", None)
+        if context is not None:
+            # Exception non gérée : after_request n'a pas été appelé
+            end(context, 500)
+
+    @app.route('/debug/traces', methods=['GET'])
+    def debug_traces():
+        return jsonify(debug_payload(service, request.args))
+
+
+def aiohttp_middleware(service):
+    """Middleware aiohttp équivalent à trace_flask (la route /debug/traces est à ajouter à part)"""
+    from aiohttp import web
+
+    @web.middleware
+    async def middleware(request, handler):
+        resource = request.match_info.route.resource
+        rule = resource.canonical if resource is not None else request.path
+        context = begin(request.headers, f"{service} {request.method} {rule}")
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            response.headers[REQUEST_ID_HEADER] = context.request_id
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            end(context, status)
+
+    return middleware
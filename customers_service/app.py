@@ -3,45 +3,97 @@ from flask_cors import CORS
 import logging
 import uuid
 import hashlib
+import json
+
+from common.logs import setup_logging
+from common.metrics import instrument_flask
+from common.stateserver import shared_state
+from common.tokens import issue_token
+from common.tracing import trace_flask
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "customers", extra=lambda: state.metrics())
+trace_flask(app, "customers")
 
-logging.basicConfig(level=logging.INFO)
+setup_logging("customers")
 logger = logging.getLogger(__name__)
 
-# Base de données simulée pour les clients
-customers_db = {}
+# Clients et index des emails : objet local, ou processus partagé par les workers gunicorn
+state = shared_state("state:CustomersState")
 
-@app.route('/customers', methods=['POST'])
-def create_customer():
-    data = request.get_json()
-    customer_id = str(uuid.uuid4())
+# Taille des lots envoyés au processus d'état pendant un import en masse
+IMPORT_CHUNK_SIZE = 500
+
+# Durée de validité (secondes) des jetons de session émis à la connexion
+TOKEN_TTL = 3600
+
+def build_customer(data):
+    """Construit la fiche client à partir des données reçues ; None si l'email manque"""
+    email = data.get("email")
+    if not isinstance(email, str) or not email.strip():
+        return None
     
     # Hash du mot de passe (simplification)
     password_hash = hashlib.sha256(data.get("password", "").encode()).hexdigest()
     
-    customer = {
-        "id": customer_id,
-        "email": data.get("email"),
+    return {
+        "id": str(uuid.uuid4()),
+        "email": email,
         "first_name": data.get("first_name"),
         "last_name": data.get("last_name"),
         "password_hash": password_hash,
         "created_at": "2024-01-01T00:00:00Z"
     }
+
+@app.route('/customers', methods=['POST'])
+def create_customer():
+    data = request.get_json()
+    customer = build_customer(data)
+    if customer is None:
+        return jsonify({"error": "Email is required"}), 400
+    if not state.add(customer):
+        return jsonify({"error": "Email already registered"}), 409
     
-    customers_db[customer_id] = customer
-    logger.info(f"Client créé: {customer_id}")
+    logger.info("Client créé: %s", customer['id'])
     
     # Retourner sans le mot de passe
     response = customer.copy()
     del response["password_hash"]
     return jsonify(response), 201
 
+@app.route('/customers/batch', methods=['POST'])
+def create_customers_batch():
+    """Import en masse : un client JSON par ligne (NDJSON), lu au fil de l'eau sans charger tout le corps"""
+    created = duplicates = invalid = 0
+    chunk = []
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            customer = build_customer(json.loads(line))
+        except (ValueError, AttributeError):
+            customer = None
+        if customer is None:
+            invalid += 1
+            continue
+        chunk.append(customer)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            chunk_created, chunk_duplicates = state.add_many(chunk)
+            created, duplicates = created + chunk_created, duplicates + chunk_duplicates
+            chunk = []
+    if chunk:
+        chunk_created, chunk_duplicates = state.add_many(chunk)
+        created, duplicates = created + chunk_created, duplicates + chunk_duplicates
+    
+    logger.info("Import clients: %s créés, %s doublons, %s invalides", created, duplicates, invalid)
+    return jsonify({"created": created, "duplicates": duplicates, "invalid": invalid}), 201
+
 @app.route('/customers/<customer_id>', methods=['GET'])
 def get_customer(customer_id):
-    logger.info(f"Récupération client {customer_id}")
-    customer = customers_db.get(customer_id)
+    logger.info("Récupération client %s", customer_id)
+    customer = state.get(customer_id)
     if customer:
         response = customer.copy()
         del response["password_hash"]
@@ -55,19 +107,16 @@ def login():
     password = data.get("password")
     password_hash = hashlib.sha256(password.encode()).hexdigest()
     
-    for customer in customers_db.values():
-        if customer["email"] == email and customer["password_hash"] == password_hash:
-            response = customer.copy()
-            del response["password_hash"]
-            logger.info(f"Connexion réussie pour {email}")
-            return jsonify({"success": True, "customer": response})
+    customer = state.find_by_email(email) if isinstance(email, str) else None
+    if customer and customer["password_hash"] == password_hash:
+        response = customer.copy()
+        del response["password_hash"]
+        logger.info("Connexion réussie pour %s", email)
+        return jsonify({"success": True, "customer": response,
+                        "token": issue_token(customer["id"], TOKEN_TTL), "expires_in": TOKEN_TTL})
     
     return jsonify({"error": "Invalid credentials"}), 401
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "service": "customers"})
@@ -0,0 +1,53 @@
+import threading
+
+from common.storage import open_store, prometheus_lines as storage_metrics
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+class CustomersState:
+    """État du service customers : fiches clients et index des emails
+
+    Partagé par tous les workers via common.stateserver : l'unicité des emails est vérifiée
+    dans un seul processus, quel que soit le worker qui reçoit la création.
+    """
+
+    def __init__(self):
+        # Base de données simulée pour les clients, rechargée depuis le journal au démarrage
+        self.customers_db = {}
+        self.customers_store = open_store("customers", self.customers_db)
+
+        # Index email normalisé -> id client, pour la connexion et l'unicité des emails
+        self.email_index = {normalize_email(customer["email"]): customer_id
+                            for customer_id, customer in self.customers_db.items()}
+        self.customers_lock = threading.Lock()
+
+    def add(self, customer, wait=True):
+        """Enregistre le client s'il n'existe pas déjà un compte avec le même email"""
+        key = normalize_email(customer["email"])
+        with self.customers_lock:
+            if key in self.email_index:
+                return False
+            self.email_index[key] = customer["id"]
+            self.customers_db[customer["id"]] = customer
+        # Journalisation hors verrou : les créations concurrentes partagent le même fsync
+        self.customers_store.put(customer["id"], customer, wait=wait)
+        return True
+
+    def add_many(self, customers):
+        """Import d'un lot : un seul fsync ; renvoie (créés, doublons)"""
+        created = sum(1 for customer in customers if self.add(customer, wait=False))
+        self.customers_store.sync()
+        return created, len(customers) - created
+
+    def get(self, customer_id):
+        customer = self.customers_db.get(customer_id)
+        return dict(customer) if customer is not None else None
+
+    def find_by_email(self, email):
+        return self.get(self.email_index.get(normalize_email(email)))
+
+    def metrics(self):
+        return storage_metrics(self.customers_store)
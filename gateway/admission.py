@@ -0,0 +1,216 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from common.metrics import stats_lines
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` requêtes par seconde en régime établi, rafales jusqu'à `burst`"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """0 si un jeton est pris, sinon le délai (secondes) avant le prochain jeton"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Un seau à jetons par clé (client ou service), clés gardées en LRU bornée"""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, key):
+        """0 si la requête passe, sinon le délai conseillé (secondes) avant de réessayer"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_keys:
+                    # Un seau oublié repart plein : sans effet pour un client inactif depuis longtemps
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+            return wait
+
+
+class AdaptiveLimit:
+    """Limite de concurrence d'un service upstream, ajustée selon la latence observée
+
+    Référence : la latence minimum, mesurée à faible concurrence (au plus la moitié de la
+    limite en vol, donc sans file d'attente) et renouvelée toutes les `window` secondes.
+    Quand la latence récente dépasse `tolerance` fois la référence, le service met les
+    requêtes en file : la limite baisse en proportion. Sinon elle monte d'environ √limite,
+    tant que la concurrence réelle l'atteint. Timeouts et erreurs 5xx la réduisent
+    directement de `backoff`.
+    """
+
+    def __init__(self, initial, min_limit, max_limit, tolerance=1.5, smoothing=0.2, backoff=0.9, window=10.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.window = window
+        self.in_flight = 0
+        self.recent_rtt = None
+        self.min_rtt = None
+        self._window_min = None
+        self._window_start = time.monotonic()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, share=1.0):
+        """Prend une place si la concurrence reste sous `share` × limite (part de la priorité)"""
+        with self._lock:
+            if self.in_flight >= max(1.0, self.limit * share):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, success):
+        now = time.monotonic()
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if not success:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                return
+            if self.min_rtt is None:
+                self.recent_rtt = self.min_rtt = latency
+            self.recent_rtt += 0.1 * (latency - self.recent_rtt)
+            self.min_rtt = min(self.min_rtt, latency)
+            if in_flight * 2 <= max(self.limit, 2 * self.min_limit):
+                self._window_min = latency if self._window_min is None else min(self._window_min, latency)
+            if now - self._window_start >= self.window:
+                # Nouvelle référence : le service a pu devenir durablement plus lent (ou plus rapide)
+                if self._window_min is not None:
+                    self.min_rtt = self._window_min
+                self._window_min = None
+                self._window_start = now
+
+            gradient = max(0.5, min(1.0, self.tolerance * self.min_rtt / self.recent_rtt))
+            target = self.limit * gradient + math.sqrt(self.limit)
+            if target > self.limit and in_flight * 2 < self.limit:
+                # Limite peu sollicitée : rien ne prouve que le service supporterait davantage
+                return
+            limit = self.limit + self.smoothing * (target - self.limit)
+            self.limit = min(self.max_limit, max(self.min_limit, limit))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "latency_recent_seconds": round(self.recent_rtt or 0.0, 6),
+                "latency_min_seconds": round(self.min_rtt or 0.0, 6),
+                "rejected_total": self.rejected
+            }
+
+
+class AdmissionController:
+    """Contrôle d'admission de la gateway, avant tout appel upstream
+
+    - débit par client (id du jeton, sinon adresse IP) et par service : 429 au-delà ;
+    - concurrence par service (AdaptiveLimit) et pour toute la gateway : 503 au-delà.
+    Une priorité par route réserve une part des places aux requêtes bon marché : les
+    requêtes « low » (écritures coûteuses) n'occupent au plus que PRIORITY_SHARES["low"] de
+    chaque limite, si bien qu'un service lent n'immobilise pas tous les threads et que le
+    catalogue reste servi. Les refus sont immédiats et portent un Retry-After.
+    """
+
+    def __init__(self, priorities, shares, client_rate, client_burst, service_rates, concurrency_limits,
+                 min_limit, max_in_flight, max_clients=100000):
+        # priorities : liste de (méthode, motif du chemin, priorité) ; "normal" par défaut
+        self.priorities = [(method, re.compile(pattern), priority) for method, pattern, priority in priorities]
+        self.shares = shares
+        self.client_limiter = RateLimiter(client_rate, client_burst, max_clients) if client_rate else None
+        self.service_limiters = {service_name: RateLimiter(rate, burst)
+                                 for service_name, (rate, burst) in service_rates.items()}
+        self.limits = {service_name: AdaptiveLimit(initial, min_limit, max_limit)
+                       for service_name, (initial, max_limit) in concurrency_limits.items()}
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.overloaded = 0
+        self._lock = threading.Lock()
+
+    def priority_for(self, method, path):
+        for route_method, pattern, priority in self.priorities:
+            if method == route_method and pattern.match(path):
+                return priority
+        return "normal"
+
+    def check_rate(self, client, service_name):
+        """0 si la requête respecte les débits, sinon le délai (secondes) à annoncer en Retry-After"""
+        if self.client_limiter:
+            wait = self.client_limiter.take(client)
+            if wait:
+                return wait
+        limiter = self.service_limiters.get(service_name)
+        return limiter.take(service_name) if limiter else 0.0
+
+    def acquire(self, service_name, priority):
+        """Vrai si la requête peut partir vers le service ; à libérer avec release()"""
+        share = self.shares.get(priority, 1.0)
+        with self._lock:
+            if self.in_flight >= max(1.0, self.max_in_flight * share):
+                self.overloaded += 1
+                return False
+            self.in_flight += 1
+        limit = self.limits.get(service_name)
+        if limit is not None and not limit.try_acquire(share):
+            with self._lock:
+                self.in_flight -= 1
+            return False
+        return True
+
+    def release(self, service_name, latency, success):
+        with self._lock:
+            self.in_flight -= 1
+        limit = self.limits.get(service_name)
+        if limit is not None:
+            limit.release(latency, success)
+
+    def stats(self):
+        with self._lock:
+            gateway = {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                       "overloaded_total": self.overloaded}
+        return {
+            "gateway": gateway,
+            "client_rate_limited_total": self.client_limiter.limited if self.client_limiter else 0,
+            "services": {service_name: dict(limit.stats(),
+                                            rate_limited_total=self.service_limiters[service_name].limited
+                                            if service_name in self.service_limiters else 0)
+                         for service_name, limit in self.limits.items()}
+        }
+
+    def prometheus_lines(self):
+        stats = self.stats()
+        gateway = dict(stats["gateway"], client_rate_limited_total=stats["client_rate_limited_total"])
+        return stats_lines("gateway_admission", [({}, gateway)] + [
+            ({"service": service_name}, values) for service_name, values in stats["services"].items()
+        ])
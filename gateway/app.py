@@ -1,172 +1,310 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import requests
 import logging
+import math
+import re
 import time
-import random
+
+from common import tracing
+from common.logs import setup_logging
+from common.metrics import instrument_flask, observe_upstream, status_outcome
+from admission import AdmissionController
+from auth import CUSTOMER_ID_HEADER, TokenVerifier, bearer_token
+from balancer import LoadBalancer
+from cache import CacheEntry, ResponseCache, etag_matches
+from capture import TrafficCapture
+from config import (SERVICES, POOL_SIZES, LB_STRATEGIES, CACHE_ROUTES, CACHE_MAX_BYTES,
+                    HEALTH_INTERVAL, HEALTH_TIMEOUT, UPSTREAM_TIMEOUT, ROUTE_DEADLINES,
+                    STREAMED_ROUTES, FORWARDED_HEADERS, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT,
+                    MAX_RETRIES, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, AUTH_CACHE_SIZE,
+                    AUTH_REQUIRED_SERVICES, GATEWAY_MODE, CAPTURE_DIR, CAPTURE_SAMPLE_RATE,
+                    CAPTURE_MAX_BYTES, CAPTURE_BACKUPS, ADMISSION_PRIORITIES, PRIORITY_SHARES,
+                    ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST, SERVICE_RATE_LIMITS, CONCURRENCY_LIMITS,
+                    CONCURRENCY_MIN_LIMIT, ADMISSION_ENABLED, ADMISSION_MAX_INFLIGHT)
+from health import HealthProber
+from pools import UpstreamPools, filter_headers
+import resilience
+from resilience import CircuitBreaker, RetryBudget, DEADLINE_HEADER
+from singleflight import SingleFlight
 
 app = Flask(__name__)
 CORS(app)
 
-logging.basicConfig(level=logging.INFO)
+setup_logging("gateway")
 logger = logging.getLogger(__name__)
 
-# Configuration des services avec load balancing
-SERVICES = {
-    "products": [
-        "http://products-service-1:5001",
-        "http://products-service-2:5001"
-    ],
-    "stock": ["http://stock-service:5002"],
-    "customers": ["http://customers-service:5003"],
-    "cart": ["http://cart-service:5004"],
-    "orders": ["http://order-service:5005"]
-}
-
-# Compteur pour round-robin
-service_counters = {service: 0 for service in SERVICES}
-
-def get_service_url(service_name):
-    """Sélectionne une URL de service avec load balancing round-robin"""
-    if service_name not in SERVICES:
-        return None
-    
-    urls = SERVICES[service_name]
-    if len(urls) == 1:
-        return urls[0]
-    
-    # Round-robin
-    counter = service_counters[service_name]
-    url = urls[counter % len(urls)]
-    service_counters[service_name] = (counter + 1) % len(urls)
-    
-    logger.info(f"Load balancing {service_name}: utilisation de {url}")
+upstream_pools = UpstreamPools(SERVICES, POOL_SIZES)
+
+load_balancer = LoadBalancer(SERVICES, LB_STRATEGIES)
+
+health_prober = HealthProber(SERVICES, HEALTH_INTERVAL, HEALTH_TIMEOUT, on_change=load_balancer.set_healthy)
+
+response_cache = ResponseCache(CACHE_ROUTES, CACHE_MAX_BYTES)
+
+single_flight = SingleFlight()
+
+circuit_breakers = {url: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+                    for urls in SERVICES.values() for url in urls}
+retry_budgets = {service_name: RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND)
+                 for service_name in SERVICES}
+
+token_verifier = TokenVerifier(AUTH_CACHE_SIZE)
+
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(ADMISSION_PRIORITIES, PRIORITY_SHARES, ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST,
+                                    SERVICE_RATE_LIMITS, CONCURRENCY_LIMITS, CONCURRENCY_MIN_LIMIT, ADMISSION_MAX_INFLIGHT)
+
+traffic_capture = None
+if CAPTURE_DIR:
+    traffic_capture = TrafficCapture(CAPTURE_DIR, CAPTURE_SAMPLE_RATE, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS)
+
+WRITE_METHODS = ("POST", "PUT", "DELETE")
+
+STREAMED = [(method, re.compile(pattern), deadline) for method, pattern, deadline in STREAMED_ROUTES]
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def gateway_metrics():
+    """État interne de la gateway, ajouté à la sortie de /metrics"""
+    body = upstream_pools.prometheus_lines()
+    body += load_balancer.prometheus_lines()
+    body += response_cache.prometheus_lines()
+    body += single_flight.prometheus_lines()
+    body += resilience.prometheus_lines(circuit_breakers, retry_budgets)
+    body += token_verifier.prometheus_lines()
+    if admission:
+        body += admission.prometheus_lines()
+    if traffic_capture:
+        body += traffic_capture.prometheus_lines()
+    return body
+
+instrument_flask(app, "gateway", extra=gateway_metrics)
+tracing.trace_flask(app, "gateway")
+
+def get_service_url(service_name, exclude=()):
+    """Sélectionne une instance du service selon la stratégie configurée ; à libérer avec release()"""
+    url = load_balancer.acquire(service_name, exclude)
+    if url and len(SERVICES[service_name]) > 1:
+        logger.debug("Load balancing %s: utilisation de %s", service_name, url)
     return url
 
 @app.before_request
 def log_request():
     """Middleware de logging"""
-    logger.info(f"Gateway: {request.method} {request.path} de {request.remote_addr}")
+    logger.info("Gateway: %s %s de %s", request.method, request.path, request.remote_addr)
 
-@app.route('/api/v1/products', methods=['GET', 'POST'])
-@app.route('/api/v1/products/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
-def proxy_products(path=None):
-    service_url = get_service_url("products")
-    if not service_url:
-        return jsonify({"error": "Service unavailable"}), 503
+def streamed_deadline(method, path):
+    """Échéance propre d'une route relayée en flux (voir STREAMED_ROUTES), None pour les autres"""
+    for route_method, pattern, deadline in STREAMED:
+        if method == route_method and pattern.match(path):
+            return deadline
+    return None
+
+def body_chunks(stream):
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def forward_request(service_name, path):
+    """Relaie la requête vers une instance du service, sans décoder ni réencoder le corps
     
-    url = f"{service_url}/products"
-    if path:
-        url += f"/{path}"
+    Les instances au disjoncteur ouvert sont évitées sans appel réseau ; les GET en échec sont
+    retentés sur une autre instance tant que l'échéance et le budget de retries le permettent.
+    """
+    stream_deadline = streamed_deadline(request.method, request.path)
+    deadline = time.monotonic() + (stream_deadline or ROUTE_DEADLINES.get(service_name, UPSTREAM_TIMEOUT))
+    idempotent = request.method == "GET"
+    retry_budgets[service_name].deposit()
     
+    headers = {}
+    if request.content_type:
+        headers["Content-Type"] = request.content_type
+    if g.get("customer_id"):
+        headers[CUSTOMER_ID_HEADER] = g.customer_id
+    for name in FORWARDED_HEADERS:
+        if name in request.headers:
+            headers[name] = request.headers[name]
+    # Import en masse : relayé en transfert chunked à mesure que le client l'envoie
+    body = body_chunks(request.stream) if stream_deadline else request.get_data()
+    
+    tried = []
+    result = (jsonify({"error": "Service unavailable"}), 503)
+    while True:
+        service_url = get_service_url(service_name, exclude=tried)
+        if not service_url:
+            return result
+        tried.append(service_url)
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            load_balancer.cancel(service_url)
+            return jsonify({"error": "Gateway timeout"}), 504
+        
+        breaker = circuit_breakers[service_url]
+        if not breaker.allow():
+            # Aucune requête n'est partie : essayer une autre instance est sûr, quelle que soit la méthode
+            load_balancer.cancel(service_url)
+            result = (jsonify({"error": "Service temporarily unavailable"}), 503)
+            continue
+        
+        url = f"{service_url}/{service_name}"
+        if path:
+            url += f"/{path}"
+        headers[DEADLINE_HEADER] = str(int(remaining * 1000))
+        
+        # Un span par tentative : les retries vers une autre instance apparaissent dans la trace
+        with tracing.span(f"proxy {service_name}", instance=service_url, attempt=len(tried)) as attempt:
+            headers.update(tracing.outgoing_headers())
+            start = time.monotonic()
+            success = False
+            try:
+                response = upstream_pools.get(service_url).request(
+                    method=request.method,
+                    url=url,
+                    data=body,
+                    headers=headers,
+                    params=request.args,
+                    timeout=remaining
+                )
+                success = response.status_code < 500
+                outcome = status_outcome(response.status_code)
+                result = Response(response.content, status=response.status_code,
+                                  headers=filter_headers(response.headers))
+            except requests.Timeout:
+                logger.error("Timeout proxy %s (%s)", service_name, service_url)
+                outcome = "timeout"
+                result = (jsonify({"error": "Gateway timeout"}), 504)
+            except Exception as e:
+                logger.error("Erreur proxy %s: %s", service_name, e)
+                outcome = "error"
+                result = (jsonify({"error": "Service temporarily unavailable"}), 503)
+            finally:
+                elapsed = time.monotonic() - start
+                load_balancer.release(service_url, elapsed, success)
+                breaker.record(success)
+            attempt.set("outcome", outcome)
+        observe_upstream("gateway", service_name, service_url, elapsed, outcome)
+        
+        if success or not idempotent or len(tried) > MAX_RETRIES or len(tried) >= len(SERVICES[service_name]):
+            return result
+        if deadline <= time.monotonic() or not retry_budgets[service_name].try_withdraw():
+            return result
+
+def rejected_response(status, error, retry_after):
+    """Refus immédiat du contrôle d'admission, avec le délai conseillé avant de réessayer"""
+    response = jsonify({"error": error})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def admitted_forward(service_name, path):
+    """Relaie la requête si la concurrence du service et de la gateway le permet, sinon 503"""
+    if admission is None:
+        return app.make_response(forward_request(service_name, path))
+    if not admission.acquire(service_name, admission.priority_for(request.method, request.path)):
+        return rejected_response(503, "Service overloaded", 1)
+    start = time.monotonic()
+    success = False
     try:
-        response = requests.request(
-            method=request.method,
-            url=url,
-            json=request.get_json() if request.is_json else None,
-            params=request.args,
-            timeout=30
-        )
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        logger.error(f"Erreur proxy products: {e}")
-        return jsonify({"error": "Service temporarily unavailable"}), 503
+        response = app.make_response(forward_request(service_name, path))
+        success = response.status_code < 500
+        return response
+    finally:
+        admission.release(service_name, time.monotonic() - start, success)
+
+def cached_response(entry, cache_status):
+    """Sert une entrée du cache, ou un 304 si le client possède déjà cette version"""
+    if etag_matches(request.headers.get("If-None-Match"), entry.etag):
+        response_cache.count_not_modified()
+        return Response(status=304, headers={"ETag": entry.etag, "X-Cache": cache_status})
+    headers = entry.headers + [("ETag", entry.etag), ("X-Cache", cache_status)]
+    return Response(entry.body, status=entry.status, headers=headers)
+
+def authenticate(service_name):
+    """Vérifie le jeton de session éventuel ; renvoie une réponse d'erreur si la requête est refusée"""
+    token = bearer_token(request.headers.get("Authorization"))
+    if token:
+        g.customer_id = token_verifier.customer_id(token)
+        if g.customer_id is None:
+            return jsonify({"error": "Invalid or expired token"}), 401
+    elif service_name in AUTH_REQUIRED_SERVICES:
+        return jsonify({"error": "Authentication required"}), 401
+    return None
+
+def proxy_request(service_name, path):
+    """Relaie la requête ; les requêtes échantillonnées sont capturées avec leur statut et leur durée"""
+    if not (traffic_capture and traffic_capture.sampled()):
+        return relay_request(service_name, path)
+    
+    start = time.monotonic()
+    response = app.make_response(relay_request(service_name, path))
+    traffic_capture.record(service_name, request.method, request.path, request.query_string.decode(),
+                           request.headers, request.get_data(), response.status_code, time.monotonic() - start)
+    return response
+
+def relay_request(service_name, path):
+    """Relaie la requête en passant par le contrôle d'admission, le cache et la fusion des GET identiques"""
+    denied = authenticate(service_name)
+    if denied:
+        return denied
+    
+    retry_after = admission and admission.check_rate(g.get("customer_id") or request.remote_addr, service_name)
+    if retry_after:
+        return rejected_response(429, "Too many requests", retry_after)
+    
+    if request.method != "GET":
+        response = admitted_forward(service_name, path)
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            response_cache.invalidate_prefix(f"/api/v1/{service_name}")
+        return response
+    
+    cache_ttl = response_cache.ttl_for(request.path)
+    if cache_ttl:
+        entry = response_cache.get(request.full_path)
+        if entry:
+            return cached_response(entry, "HIT")
+    
+    def fetch():
+        response = admitted_forward(service_name, path)
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() != "content-length"]
+        if cache_ttl and response.status_code == 200:
+            return response_cache.put(request.full_path, response.get_data(), 200, headers, cache_ttl)
+        return response.get_data(), response.status_code, headers
+    
+    # Un seul appel upstream pour toutes les requêtes identiques en vol ; le résultat est partagé
+    result = single_flight.do(f"{service_name} {g.get('customer_id')} {request.full_path}", fetch)
+    if isinstance(result, CacheEntry):
+        return cached_response(result, "MISS")
+    body, status, headers = result
+    return Response(body, status=status, headers=headers)
+
+@app.route('/api/v1/products', methods=['GET', 'POST'])
+@app.route('/api/v1/products/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+def proxy_products(path=None):
+    return proxy_request("products", path)
 
 @app.route('/api/v1/stock', methods=['GET', 'POST'])
 @app.route('/api/v1/stock/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_stock(path=None):
-    service_url = get_service_url("stock")
-    if not service_url:
-        return jsonify({"error": "Service unavailable"}), 503
-    
-    url = f"{service_url}/stock"
-    if path:
-        url += f"/{path}"
-    
-    try:
-        response = requests.request(
-            method=request.method,
-            url=url,
-            json=request.get_json() if request.is_json else None,
-            params=request.args,
-            timeout=30
-        )
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        logger.error(f"Erreur proxy stock: {e}")
-        return jsonify({"error": "Service temporarily unavailable"}), 503
+    return proxy_request("stock", path)
 
 @app.route('/api/v1/customers', methods=['GET', 'POST'])
 @app.route('/api/v1/customers/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_customers(path=None):
-    service_url = get_service_url("customers")
-    if not service_url:
-        return jsonify({"error": "Service unavailable"}), 503
-    
-    url = f"{service_url}/customers"
-    if path:
-        url += f"/{path}"
-    
-    try:
-        response = requests.request(
-            method=request.method,
-            url=url,
-            json=request.get_json() if request.is_json else None,
-            params=request.args,
-            timeout=30
-        )
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        logger.error(f"Erreur proxy customers: {e}")
-        return jsonify({"error": "Service temporarily unavailable"}), 503
+    return proxy_request("customers", path)
 
 @app.route('/api/v1/cart', methods=['GET', 'POST'])
 @app.route('/api/v1/cart/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_cart(path=None):
-    service_url = get_service_url("cart")
-    if not service_url:
-        return jsonify({"error": "Service unavailable"}), 503
-    
-    url = f"{service_url}/cart"
-    if path:
-        url += f"/{path}"
-    
-    try:
-        response = requests.request(
-            method=request.method,
-            url=url,
-            json=request.get_json() if request.is_json else None,
-            params=request.args,
-            timeout=30
-        )
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        logger.error(f"Erreur proxy cart: {e}")
-        return jsonify({"error": "Service temporarily unavailable"}), 503
+    return proxy_request("cart", path)
 
 @app.route('/api/v1/orders', methods=['GET', 'POST'])
 @app.route('/api/v1/orders/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_orders(path=None):
-    service_url = get_service_url("orders")
-    if not service_url:
-        return jsonify({"error": "Service unavailable"}), 503
-    
-    url = f"{service_url}/orders"
-    if path:
-        url += f"/{path}"
-    
-    try:
-        response = requests.request(
-            method=request.method,
-            url=url,
-            json=request.get_json() if request.is_json else None,
-            params=request.args,
-            timeout=30
-        )
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        logger.error(f"Erreur proxy orders: {e}")
-        return jsonify({"error": "Service temporarily unavailable"}), 503
+    return proxy_request("orders", path)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -176,30 +314,24 @@ def health_check():
         "timestamp": time.time()
     })
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
 @app.route('/api/v1/health', methods=['GET'])
 def health_check_all():
-    """Vérifie l'état de tous les services"""
-    status = {"gateway": "healthy", "services": {}}
-    
-    for service_name, urls in SERVICES.items():
-        service_status = []
-        for url in urls:
-            try:
-                response = requests.get(f"{url}/health", timeout=5)
-                if response.status_code == 200:
-                    service_status.append("healthy")
-                else:
-                    service_status.append("unhealthy")
-            except:
-                service_status.append("unreachable")
-        
-        status["services"][service_name] = service_status
-    
-    return jsonify(status)
+    """État de tous les services, tel que relevé par la sonde en tâche de fond"""
+    return jsonify(health_prober.snapshot())
+
+def create_app():
+    """Point d'entrée du mode Flask (gunicorn `app:create_app()`) : démarre la sonde et la capture
+
+    L'import du module ne démarre aucun thread : en mode async, async_app démarre les siens.
+    """
+    health_prober.start()
+    if traffic_capture:
+        traffic_capture.start()
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    if GATEWAY_MODE == "async":
+        from async_app import run
+        run(host='0.0.0.0', port=8080)
+    else:
+        create_app().run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""Moteur de proxy asyncio pour la gateway (GATEWAY_MODE=async)
+
+Sert les mêmes routes /api/v1/<service> que app.py, avec la même table SERVICES,
+depuis une seule boucle d'événements : un appel upstream lent n'occupe plus un thread.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+
+import aiohttp
+from aiohttp import web
+
+from common import tracing
+from common.logs import setup_logging
+from common.metrics import aiohttp_middleware, metrics_payload, observe_upstream, status_outcome
+from admission import AdmissionController
+from auth import CUSTOMER_ID_HEADER, TokenVerifier, bearer_token
+from balancer import LoadBalancer
+from cache import CacheEntry, ResponseCache, etag_matches
+from capture import TrafficCapture
+from config import (SERVICES, LB_STRATEGIES, CACHE_ROUTES, CACHE_MAX_BYTES,
+                    HEALTH_INTERVAL, HEALTH_TIMEOUT, UPSTREAM_TIMEOUT, ROUTE_DEADLINES,
+                    STREAMED_ROUTES, FORWARDED_HEADERS, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT,
+                    MAX_RETRIES, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, AUTH_CACHE_SIZE,
+                    AUTH_REQUIRED_SERVICES, ASYNC_UPSTREAM_LIMIT, CAPTURE_DIR, CAPTURE_SAMPLE_RATE,
+                    CAPTURE_MAX_BYTES, CAPTURE_BACKUPS, ADMISSION_PRIORITIES, PRIORITY_SHARES,
+                    ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST, SERVICE_RATE_LIMITS, CONCURRENCY_LIMITS,
+                    CONCURRENCY_MIN_LIMIT, ADMISSION_ENABLED, ASYNC_ADMISSION_MAX_INFLIGHT)
+from health import HealthProber
+from pools import HOP_BY_HOP_HEADERS
+import resilience
+from resilience import CircuitBreaker, RetryBudget, DEADLINE_HEADER
+from singleflight import AsyncSingleFlight
+
+setup_logging("gateway")
+logger = logging.getLogger(__name__)
+
+PROXY_METHODS = ("GET", "POST", "PUT", "DELETE")
+
+load_balancer = LoadBalancer(SERVICES, LB_STRATEGIES)
+
+# La sonde tourne dans ses propres threads, hors de la boucle d'événements
+health_prober = HealthProber(SERVICES, HEALTH_INTERVAL, HEALTH_TIMEOUT, on_change=load_balancer.set_healthy)
+
+response_cache = ResponseCache(CACHE_ROUTES, CACHE_MAX_BYTES)
+
+single_flight = AsyncSingleFlight()
+
+circuit_breakers = {url: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+                    for urls in SERVICES.values() for url in urls}
+retry_budgets = {service_name: RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND)
+                 for service_name in SERVICES}
+
+token_verifier = TokenVerifier(AUTH_CACHE_SIZE)
+
+# Pas de threads à protéger : la limite globale borne seulement le travail en cours dans la boucle
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(ADMISSION_PRIORITIES, PRIORITY_SHARES, ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST,
+                                    SERVICE_RATE_LIMITS, CONCURRENCY_LIMITS, CONCURRENCY_MIN_LIMIT,
+                                    ASYNC_ADMISSION_MAX_INFLIGHT)
+
+# L'écriture se fait dans un thread : la boucle d'événements ne fait que déposer dans une file
+traffic_capture = TrafficCapture(CAPTURE_DIR, CAPTURE_SAMPLE_RATE, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS) \
+    if CAPTURE_DIR else None
+
+WRITE_METHODS = ("POST", "PUT", "DELETE")
+
+STREAMED = [(method, re.compile(pattern), deadline) for method, pattern, deadline in STREAMED_ROUTES]
+
+
+def streamed_deadline(method, path):
+    """Échéance propre d'une route relayée en flux (voir STREAMED_ROUTES), None pour les autres"""
+    for route_method, pattern, deadline in STREAMED:
+        if method == route_method and pattern.match(path):
+            return deadline
+    return None
+
+
+async def forward(request, service_name, path):
+    """Relaie la requête avec disjoncteurs, échéance par route et retries budgétés (voir app.py)"""
+    stream_deadline = streamed_deadline(request.method, request.path)
+    deadline = time.monotonic() + (stream_deadline or ROUTE_DEADLINES.get(service_name, UPSTREAM_TIMEOUT))
+    idempotent = request.method == "GET"
+    retry_budgets[service_name].deposit()
+
+    headers = {}
+    if request.content_type and request.can_read_body:
+        headers["Content-Type"] = request.content_type
+    if request.get("customer_id"):
+        headers[CUSTOMER_ID_HEADER] = request["customer_id"]
+    for name in FORWARDED_HEADERS:
+        if name in request.headers:
+            headers[name] = request.headers[name]
+    # Import en masse : relayé en transfert chunked à mesure que le client l'envoie
+    body = request.content if stream_deadline else (await request.read() or None)
+
+    tried = []
+    result = web.json_response({"error": "Service unavailable"}, status=503)
+    while True:
+        service_url = load_balancer.acquire(service_name, tried)
+        if not service_url:
+            return result
+        tried.append(service_url)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            load_balancer.cancel(service_url)
+            return web.json_response({"error": "Gateway timeout"}, status=504)
+
+        breaker = circuit_breakers[service_url]
+        if not breaker.allow():
+            load_balancer.cancel(service_url)
+            result = web.json_response({"error": "Service temporarily unavailable"}, status=503)
+            continue
+
+        url = f"{service_url}/{service_name}"
+        if path:
+            url += f"/{path}"
+        headers[DEADLINE_HEADER] = str(int(remaining * 1000))
+
+        session = request.app["sessions"][service_url]
+        with tracing.span(f"proxy {service_name}", instance=service_url, attempt=len(tried)) as attempt:
+            headers.update(tracing.outgoing_headers())
+            start = time.monotonic()
+            success = False
+            try:
+                async with session.request(request.method, url, data=body, headers=headers,
+                                           params=request.query,
+                                           timeout=aiohttp.ClientTimeout(total=remaining)) as response:
+                    content = await response.read()
+                    success = response.status < 500
+                    outcome = status_outcome(response.status)
+                    out_headers = {k: v for k, v in response.headers.items()
+                                   if k.lower() not in HOP_BY_HOP_HEADERS}
+                    result = web.Response(body=content, status=response.status, headers=out_headers)
+            except asyncio.TimeoutError:
+                logger.error("Timeout proxy %s (%s)", service_name, service_url)
+                outcome = "timeout"
+                result = web.json_response({"error": "Gateway timeout"}, status=504)
+            except Exception as e:
+                logger.error("Erreur proxy %s: %r", service_name, e)
+                outcome = "error"
+                result = web.json_response({"error": "Service temporarily unavailable"}, status=503)
+            finally:
+                elapsed = time.monotonic() - start
+                load_balancer.release(service_url, elapsed, success)
+                breaker.record(success)
+            attempt.set("outcome", outcome)
+        observe_upstream("gateway", service_name, service_url, elapsed, outcome)
+
+        if success or not idempotent or len(tried) > MAX_RETRIES or len(tried) >= len(SERVICES[service_name]):
+            return result
+        if deadline <= time.monotonic() or not retry_budgets[service_name].try_withdraw():
+            return result
+
+
+def rejected_response(status, error, retry_after):
+    """Refus immédiat du contrôle d'admission, avec le délai conseillé avant de réessayer"""
+    return web.json_response({"error": error}, status=status,
+                             headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+async def admitted_forward(request, service_name, path):
+    """Relaie la requête si la concurrence du service et de la gateway le permet, sinon 503"""
+    if admission is None:
+        return await forward(request, service_name, path)
+    if not admission.acquire(service_name, admission.priority_for(request.method, request.path)):
+        return rejected_response(503, "Service overloaded", 1)
+    start = time.monotonic()
+    success = False
+    try:
+        response = await forward(request, service_name, path)
+        success = response.status < 500
+        return response
+    finally:
+        admission.release(service_name, time.monotonic() - start, success)
+
+
+def cached_response(request, entry, cache_status):
+    """Sert une entrée du cache, ou un 304 si le client possède déjà cette version"""
+    if etag_matches(request.headers.get("If-None-Match"), entry.etag):
+        response_cache.count_not_modified()
+        return web.Response(status=304, headers={"ETag": entry.etag, "X-Cache": cache_status})
+    headers = dict(entry.headers)
+    headers.update({"ETag": entry.etag, "X-Cache": cache_status})
+    return web.Response(body=entry.body, status=entry.status, headers=headers)
+
+
+def authenticate(request, service_name):
+    """Vérifie le jeton de session éventuel ; renvoie une réponse d'erreur si la requête est refusée"""
+    token = bearer_token(request.headers.get("Authorization"))
+    if token:
+        request["customer_id"] = token_verifier.customer_id(token)
+        if request["customer_id"] is None:
+            return web.json_response({"error": "Invalid or expired token"}, status=401)
+    elif service_name in AUTH_REQUIRED_SERVICES:
+        return web.json_response({"error": "Authentication required"}, status=401)
+    return None
+
+
+async def proxy(request):
+    if not (traffic_capture and traffic_capture.sampled()):
+        return await relay(request)
+
+    start = time.monotonic()
+    response = await relay(request)
+    traffic_capture.record(request.match_info["service"], request.method, request.path, request.query_string,
+                           request.headers, await request.read(), response.status, time.monotonic() - start)
+    return response
+
+
+async def relay(request):
+    service_name = request.match_info["service"]
+    path = request.match_info.get("path")
+    denied = authenticate(request, service_name)
+    if denied:
+        return denied
+    retry_after = admission and admission.check_rate(request.get("customer_id") or request.remote, service_name)
+    if retry_after:
+        return rejected_response(429, "Too many requests", retry_after)
+    if request.method != "GET":
+        response = await admitted_forward(request, service_name, path)
+        if request.method in WRITE_METHODS and response.status < 400:
+            response_cache.invalidate_prefix(f"/api/v1/{service_name}")
+        return response
+
+    cache_key = request.path_qs if request.query_string else request.path + "?"
+    cache_ttl = response_cache.ttl_for(request.path)
+    if cache_ttl:
+        entry = response_cache.get(cache_key)
+        if entry:
+            return cached_response(request, entry, "HIT")
+
+    async def fetch():
+        response = await admitted_forward(request, service_name, path)
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() != "content-length"]
+        if cache_ttl and response.status == 200:
+            return response_cache.put(cache_key, response.body, 200, headers, cache_ttl)
+        return response.body, response.status, headers
+
+    # Un seul appel upstream pour toutes les requêtes identiques en vol ; le résultat est partagé
+    result = await single_flight.do(f"{service_name} {request.get('customer_id')} {cache_key}", fetch)
+    if isinstance(result, CacheEntry):
+        return cached_response(request, result, "MISS")
+    body, status, headers = result
+    return web.Response(body=body, status=status, headers=headers)
+
+
+async def health_check(request):
+    return web.json_response({
+        "status": "healthy",
+        "service": "api-gateway",
+        "mode": "async",
+        "timestamp": time.time()
+    })
+
+
+def gateway_metrics():
+    """État interne de la gateway, ajouté à la sortie de /metrics"""
+    body = load_balancer.prometheus_lines()
+    body += response_cache.prometheus_lines()
+    body += single_flight.prometheus_lines()
+    body += resilience.prometheus_lines(circuit_breakers, retry_budgets)
+    body += token_verifier.prometheus_lines()
+    if admission:
+        body += admission.prometheus_lines()
+    if traffic_capture:
+        body += traffic_capture.prometheus_lines()
+    return body
+
+
+async def metrics(request):
+    body, content_type = metrics_payload(gateway_metrics)
+    return web.Response(body=body, headers={"Content-Type": content_type})
+
+
+async def debug_traces(request):
+    return web.json_response(tracing.debug_payload("gateway", request.query))
+
+
+async def health_check_all(request):
+    """État de tous les services, tel que relevé par la sonde en tâche de fond"""
+    return web.json_response(health_prober.snapshot())
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+async def open_sessions(app):
+    # Une session (et donc un pool de connexions keep-alive) par instance upstream
+    timeout = aiohttp.ClientTimeout(total=UPSTREAM_TIMEOUT)
+    app["sessions"] = {}
+    for urls in SERVICES.values():
+        for url in urls:
+            connector = aiohttp.TCPConnector(limit=ASYNC_UPSTREAM_LIMIT)
+            app["sessions"][url] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def start_health_prober(app):
+    health_prober.start()
+
+
+async def start_traffic_capture(app):
+    if traffic_capture:
+        traffic_capture.start()
+
+
+async def stop_health_prober(app):
+    health_prober.stop()
+
+
+async def close_sessions(app):
+    for session in app["sessions"].values():
+        await session.close()
+
+
+def create_app():
+    app = web.Application(middlewares=[cors_middleware, aiohttp_middleware("gateway"),
+                                       tracing.aiohttp_middleware("gateway")])
+    app.on_startup.append(open_sessions)
+    app.on_startup.append(start_health_prober)
+    app.on_startup.append(start_traffic_capture)
+    app.on_cleanup.append(stop_health_prober)
+    app.on_cleanup.append(close_sessions)
+    app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/api/v1/health", health_check_all)
+    app.router.add_get("/debug/traces", debug_traces)
+    services = "|".join(SERVICES)
+    for method in PROXY_METHODS:
+        app.router.add_route(method, f"/api/v1/{{service:{services}}}", proxy)
+        app.router.add_route(method, f"/api/v1/{{service:{services}}}/{{path:.+}}", proxy)
+    return app
+
+
+def run(host="0.0.0.0", port=8080):
+    logger.info("Gateway en mode async sur %s:%s", host, port)
+    web.run_app(create_app(), host=host, port=port, access_log=None, backlog=4096)
+
+
+if __name__ == "__main__":
+    run()
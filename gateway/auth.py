@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+from common.metrics import stats_lines
+from common.tokens import verify_token
+
+# En-tête par lequel la gateway transmet l'identité vérifiée aux services
+CUSTOMER_ID_HEADER = "X-Customer-Id"
+
+
+class TokenVerifier:
+    """Vérifie localement les jetons de session, avec un cache LRU des jetons déjà vérifiés"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def customer_id(self, token):
+        """Id client porté par un jeton valide, sinon None"""
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(token)
+            if cached is not None and cached[1] > now:
+                self._verified.move_to_end(token)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        claims = verify_token(token)
+        with self._lock:
+            if claims is None:
+                self._verified.pop(token, None)
+                self.rejected += 1
+                return None
+            self._verified[token] = (claims["sub"], claims["exp"])
+            self._verified.move_to_end(token)
+            if len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return claims["sub"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached_tokens": len(self._verified),
+                "cache_hits_total": self.hits,
+                "cache_misses_total": self.misses,
+                "rejected_total": self.rejected
+            }
+
+    def prometheus_lines(self):
+        return stats_lines("gateway_auth", [({}, self.stats())])
+
+
+def bearer_token(authorization):
+    """Extrait le jeton d'un en-tête « Authorization: Bearer <jeton> »"""
+    if authorization and authorization[:7].lower() == "bearer ":
+        return authorization[7:].strip()
+    return None
@@ -0,0 +1,148 @@
+import math
+import random
+import threading
+import time
+
+from common.metrics import stats_lines
+
+# Après EJECT_AFTER échecs consécutifs, une instance est écartée pendant EJECT_COOLDOWN secondes
+EJECT_AFTER = 5
+EJECT_COOLDOWN = 10.0
+
+# Constante de temps (secondes) de la moyenne mobile exponentielle des latences
+EWMA_DECAY = 10.0
+
+# Latence (secondes) comptée pour un échec, pour qu'une instance qui échoue vite ne paraisse pas rapide
+FAILURE_PENALTY = 1.0
+
+
+class Instance:
+    """État observé d'une instance upstream"""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.ewma = 0.0
+        self.last_update = time.monotonic()
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        # Mis à jour par la sonde de santé en tâche de fond
+        self.healthy = True
+
+    def observe(self, latency, now):
+        # EWMA pondérée par le temps écoulé : une instance peu sollicitée « oublie » vite
+        weight = math.exp(-(now - self.last_update) / EWMA_DECAY)
+        self.ewma = self.ewma * weight + latency * (1 - weight) if self.ewma else latency
+        self.last_update = now
+
+    def cost(self, now):
+        # Sans nouvelle mesure, l'estimation s'efface : une instance lente finit par être re-sondée
+        decay = math.exp(-(now - self.last_update) / EWMA_DECAY)
+        return self.ewma * decay * (self.in_flight + 1)
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self, now):
+        return {
+            "in_flight": self.in_flight,
+            "ewma_ms": round(self.ewma * 1000, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": now < self.ejected_until,
+            "healthy": self.healthy
+        }
+
+
+def round_robin(instances, state):
+    state["counter"] = (state.get("counter", -1) + 1) % len(instances)
+    return instances[state["counter"]]
+
+
+def least_outstanding(instances, state):
+    return min(instances, key=lambda instance: instance.in_flight)
+
+
+def p2c_ewma(instances, state):
+    # Power of two choices : on tire deux instances au hasard et on garde la moins coûteuse
+    if len(instances) == 1:
+        return instances[0]
+    a, b = random.sample(instances, 2)
+    now = time.monotonic()
+    return a if a.cost(now) <= b.cost(now) else b
+
+
+STRATEGIES = {
+    "round_robin": round_robin,
+    "least_outstanding": least_outstanding,
+    "p2c_ewma": p2c_ewma
+}
+
+
+class LoadBalancer:
+    """Répartition de charge thread-safe avec suivi des requêtes en vol et éjection passive"""
+
+    def __init__(self, services, strategies, default_strategy="round_robin"):
+        self._lock = threading.Lock()
+        self.instances = {}
+        self.strategies = {}
+        self.states = {}
+        for service_name, urls in services.items():
+            self.instances[service_name] = [Instance(url) for url in urls]
+            self.strategies[service_name] = STRATEGIES[strategies.get(service_name, default_strategy)]
+            self.states[service_name] = {}
+        self.by_url = {instance.url: instance
+                       for instances in self.instances.values() for instance in instances}
+
+    def acquire(self, service_name, exclude=()):
+        """Choisit une instance hors `exclude` et la compte en vol ; None s'il n'en reste aucune"""
+        instances = self.instances.get(service_name)
+        if not instances:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            remaining = [i for i in instances if i.url not in exclude]
+            if not remaining:
+                return None
+            # Toutes écartées : mieux vaut tenter une instance que refuser d'emblée
+            candidates = [i for i in remaining if i.available(now)] or remaining
+            instance = self.strategies[service_name](candidates, self.states[service_name])
+            instance.in_flight += 1
+            return instance.url
+
+    def release(self, url, latency, success):
+        """Enregistre le résultat d'un appel commencé par acquire()"""
+        instance = self.by_url[url]
+        now = time.monotonic()
+        with self._lock:
+            instance.in_flight -= 1
+            instance.observe(latency if success else max(latency, FAILURE_PENALTY), now)
+            if success:
+                instance.consecutive_failures = 0
+            else:
+                instance.consecutive_failures += 1
+                if instance.consecutive_failures >= EJECT_AFTER:
+                    # Réintégrée après le cool-down, un seul nouvel échec suffit à l'écarter de nouveau
+                    instance.ejected_until = now + EJECT_COOLDOWN
+                    instance.consecutive_failures = EJECT_AFTER - 1
+
+    def cancel(self, url):
+        """Annule un acquire() qui n'a donné lieu à aucun appel"""
+        with self._lock:
+            self.by_url[url].in_flight -= 1
+
+    def set_healthy(self, url, healthy):
+        instance = self.by_url.get(url)
+        if instance is not None:
+            with self._lock:
+                instance.healthy = healthy
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {service_name: {i.url: i.stats(now) for i in instances}
+                    for service_name, instances in self.instances.items()}
+
+    def prometheus_lines(self):
+        return stats_lines("gateway_lb", [({"service": service_name, "upstream": url}, stats)
+                                          for service_name, instances in self.stats().items()
+                                          for url, stats in instances.items()])
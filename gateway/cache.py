@@ -0,0 +1,115 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from common.metrics import stats_lines
+
+
+def etag_matches(if_none_match, etag):
+    """Vrai si l'en-tête If-None-Match du client désigne `etag` (comparaison faible)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CacheEntry:
+    __slots__ = ("body", "status", "headers", "etag", "expires_at", "size")
+
+    def __init__(self, body, status, headers, ttl):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers)
+
+
+class ResponseCache:
+    """Cache LRU des réponses GET, borné en mémoire, avec TTL par route"""
+
+    def __init__(self, routes, max_bytes):
+        # routes : liste de (motif de chemin, TTL en secondes)
+        self.routes = [(re.compile(pattern), ttl) for pattern, ttl in routes]
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def ttl_for(self, path):
+        """TTL de la route, ou None si elle n'est pas mise en cache"""
+        for pattern, ttl in self.routes:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, status, headers, ttl):
+        entry = CacheEntry(body, status, headers, ttl)
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate_prefix(self, prefix):
+        """Supprime les entrées dont la clé commence par `prefix` (écriture sur la ressource)"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits_total": self.hits,
+                "misses_total": self.misses,
+                "evictions_total": self.evictions,
+                "expirations_total": self.expirations,
+                "invalidations_total": self.invalidations,
+                "not_modified_total": self.not_modified
+            }
+
+    def prometheus_lines(self):
+        return stats_lines("gateway_cache", [({}, self.stats())])
@@ -0,0 +1,136 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from common.metrics import stats_lines
+
+# En-têtes de requête conservés pour le rejeu (jamais Authorization : les jetons ne sont pas capturés)
+CAPTURED_HEADERS = ("Content-Type", "Idempotency-Key")
+
+# Champs JSON masqués dans les corps capturés (création de compte, connexion)
+REDACTED_FIELDS = ("password",)
+
+
+def redact(body):
+    """Masque les champs sensibles, ligne par ligne (les imports NDJSON ont un client par ligne)"""
+    lines = []
+    for line in body.split("\n"):
+        try:
+            data = json.loads(line) if line.strip() else None
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            for field in REDACTED_FIELDS:
+                if field in data:
+                    data[field] = "<redacted>"
+            line = json.dumps(data)
+        elif any(f'"{field}"' in line for field in REDACTED_FIELDS):
+            line = "<redacted>"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class TrafficCapture:
+    """Échantillonne les requêtes relayées dans des fichiers JSONL tournants, sans bloquer les requêtes
+
+    La requête ne fait que tirer au sort et déposer un dict dans une file bornée ; un thread
+    d'écriture sérialise par lots. File pleine (disque lent) : l'entrée est perdue et comptée.
+    Chaque processus écrit son propre fichier capture-<pid>.jsonl (workers gunicorn), renommé
+    en .1, .2... quand il dépasse max_bytes ; le rejeu fusionne les fichiers par horodatage.
+    """
+
+    def __init__(self, directory, sample_rate=1.0, max_bytes=64 * 1024 * 1024, backups=5,
+                 max_body=64 * 1024, queue_size=10000):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_body = max_body
+        self.path = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written_bytes = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    def start(self):
+        # Nommé au démarrage, dans le processus qui écrit (worker gunicorn)
+        self.path = os.path.join(self.directory, f"capture-{os.getpid()}.jsonl")
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        threading.Thread(target=self._run, name="traffic-capture", daemon=True).start()
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, service, method, path, query, headers, body, status, duration):
+        """Dépose la requête dans la file d'écriture (l'appelant a déjà tiré l'échantillon)"""
+        entry = {
+            "ts": time.time(),
+            "service": service,
+            "method": method,
+            "path": path + ("?" + query if query else ""),
+            "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if body:
+            if len(body) <= self.max_body:
+                entry["body"] = body.decode("utf-8", "replace")
+            else:
+                entry["body_truncated"] = len(body)
+        if "body" in entry and any(f'"{field}"' in entry["body"] for field in REDACTED_FIELDS):
+            entry["body"] = redact(entry["body"])
+        try:
+            self._queue.put_nowait(entry)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch).encode()
+            try:
+                if self._file.tell() + len(data) > self.max_bytes and self._file.tell():
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self.written_bytes += len(data)
+            except OSError:
+                self.write_errors += 1
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+        self.rotations += 1
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written_bytes": self.written_bytes,
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+            "queue_depth": self._queue.qsize()
+        }
+
+    def prometheus_lines(self):
+        return stats_lines("gateway_capture", [({}, self.stats())])
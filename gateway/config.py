@@ -0,0 +1,149 @@
+import json
+import os
+
+# Configuration des services avec load balancing
+# GATEWAY_SERVICES (JSON) permet de surcharger la table, par exemple pour les benchmarks
+SERVICES = {
+    "products": [
+        "http://products-service-1:5001",
+        "http://products-service-2:5001"
+    ],
+    "stock": ["http://stock-service:5002"],
+    "customers": ["http://customers-service:5003"],
+    "cart": ["http://cart-service:5004"],
+    "orders": ["http://order-service:5005"]
+}
+if os.environ.get("GATEWAY_SERVICES"):
+    SERVICES = json.loads(os.environ["GATEWAY_SERVICES"])
+
+# Taille du pool de connexions keep-alive pour chaque instance d'un service
+POOL_SIZES = {
+    "products": 20,
+    "stock": 20,
+    "customers": 10,
+    "cart": 10,
+    "orders": 10
+}
+
+# Stratégie de load balancing par service : round_robin, least_outstanding ou p2c_ewma
+LB_STRATEGIES = {
+    "products": "p2c_ewma",
+    "stock": "least_outstanding",
+    "customers": "least_outstanding",
+    "cart": "least_outstanding",
+    "orders": "least_outstanding"
+}
+
+# Routes GET mises en cache par la gateway : (motif du chemin, TTL en secondes)
+# Le cache est propre à chaque processus : une écriture n'invalide que le cache du worker
+# gunicorn qui l'a relayée. Les autres workers peuvent servir l'ancienne version jusqu'à
+# l'expiration du TTL ; le TTL est donc le délai maximum de visibilité d'une écriture.
+# GATEWAY_CACHE=0 désactive le cache (benchmarks du proxy lui-même)
+CACHE_ROUTES = [
+    (r"^/api/v1/products$", 10.0),
+    (r"^/api/v1/products/[^/]+$", 30.0)
+]
+if os.environ.get("GATEWAY_CACHE", "1") == "0":
+    CACHE_ROUTES = []
+
+# Mémoire maximum occupée par le cache de réponses (octets)
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Intervalle et timeout (secondes) de la sonde de santé en tâche de fond
+HEALTH_INTERVAL = 2.0
+HEALTH_TIMEOUT = 1.0
+
+# Jetons vérifiés gardés en cache par la gateway
+AUTH_CACHE_SIZE = 100000
+
+# Services dont les routes exigent un jeton de session (Authorization: Bearer)
+AUTH_REQUIRED_SERVICES = [s for s in os.environ.get("AUTH_REQUIRED_SERVICES", "").split(",") if s]
+
+# Timeout (secondes) des appels upstream pour les services sans échéance dédiée
+UPSTREAM_TIMEOUT = 30
+
+# Échéance (secondes) de bout en bout par route, retries compris ; transmise en en-tête aux services
+ROUTE_DEADLINES = {
+    "products": 2.0,
+    "stock": 2.0,
+    "customers": 5.0,
+    "cart": 5.0,
+    "orders": 10.0
+}
+
+# Routes dont le corps est relayé par blocs au fil de la lecture, sans être chargé en mémoire
+# par la gateway : (méthode, motif du chemin, échéance en secondes remplaçant celle du service)
+# Le corps n'est lu qu'une fois : comme toute écriture, ces requêtes ne sont pas retentées
+STREAMED_ROUTES = [
+    ("POST", r"^/api/v1/customers/batch$", float(os.environ.get("BATCH_IMPORT_DEADLINE", "120")))
+]
+
+# En-têtes du client transmis tels quels aux services (Idempotency-Key : un POST /orders rejoué
+# après un timeout renvoie la commande déjà créée au lieu d'en créer une seconde)
+FORWARDED_HEADERS = ["Idempotency-Key"]
+
+# Disjoncteur par instance : ouvert après N échecs consécutifs, essai half-open après le délai
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 5.0
+
+# Retries des GET idempotents vers une autre instance, bornés par un budget par service
+MAX_RETRIES = 2
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN_PER_SECOND = 1.0
+
+# Mode de service : "flask" (synchrone, par défaut) ou "async" (boucle asyncio unique)
+GATEWAY_MODE = os.environ.get("GATEWAY_MODE", "flask")
+
+# Connexions simultanées maximum par instance upstream en mode async
+ASYNC_UPSTREAM_LIMIT = int(os.environ.get("ASYNC_UPSTREAM_LIMIT", "1000"))
+
+# Capture du trafic relayé pour le rejeu (replay.py) : activée si CAPTURE_DIR est défini
+CAPTURE_DIR = os.environ.get("CAPTURE_DIR")
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", "1.0"))
+CAPTURE_MAX_BYTES = int(os.environ.get("CAPTURE_MAX_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.environ.get("CAPTURE_BACKUPS", "5"))
+
+# Contrôle d'admission (admission.py), par processus gateway (par worker en mode gunicorn)
+# ADMISSION_ENABLED=0 le désactive (benchmarks du proxy lui-même)
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") != "0"
+# Priorité par route : (méthode, motif du chemin, priorité) ; "normal" pour les autres routes
+ADMISSION_PRIORITIES = [
+    ("GET", r"^/api/v1/(products|stock)(/|$)", "high"),
+    ("POST", r"^/api/v1/orders$", "low"),
+    ("POST", r"^/api/v1/customers/(batch|login)$", "low")
+]
+# Part de chaque limite de concurrence accessible à une priorité
+PRIORITY_SHARES = {"high": 1.0, "normal": 0.8, "low": 0.5}
+
+# Débit par client (requêtes/s et rafale) ; 0 désactive la limite
+ADMISSION_CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", "200"))
+ADMISSION_CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", "400"))
+
+# Débit total par service, tous clients confondus : (requêtes/s, rafale)
+SERVICE_RATE_LIMITS = {
+    "products": (2000, 4000),
+    "stock": (1000, 2000),
+    "customers": (500, 1000),
+    "cart": (500, 1000),
+    "orders": (200, 400)
+}
+
+# Limite de concurrence adaptative par service : (valeur initiale, maximum)
+CONCURRENCY_LIMITS = {
+    "products": (40, 200),
+    "stock": (20, 100),
+    "customers": (10, 50),
+    "cart": (10, 50),
+    "orders": (10, 50)
+}
+CONCURRENCY_MIN_LIMIT = 2
+
+# Requêtes upstream simultanées maximum pour toute la gateway, selon le serveur :
+# - gunicorn gthread : les threads du worker (SERVER_THREADS, exporté par common/gunicorn_conf.py),
+#   pour qu'un service lent ne les immobilise pas tous ;
+# - serveur de développement Flask : un thread par connexion, sans plafond, d'où une limite plus large ;
+# - mode async : une seule boucle, limitée par ASYNC_ADMISSION_MAX_INFLIGHT.
+DEV_SERVER_MAX_INFLIGHT = 64
+ADMISSION_MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT",
+                                            os.environ.get("SERVER_THREADS", DEV_SERVER_MAX_INFLIGHT)))
+ASYNC_ADMISSION_MAX_INFLIGHT = int(os.environ.get("ASYNC_ADMISSION_MAX_INFLIGHT", "2000"))
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class HealthProber:
+    """Sonde en tâche de fond toutes les instances de SERVICES et garde le dernier état connu"""
+
+    def __init__(self, services, interval, timeout, on_change=None):
+        self.services = services
+        self.interval = interval
+        self.timeout = timeout
+        self.on_change = on_change
+        self.urls = [url for urls in services.values() for url in urls]
+        # Tant qu'aucune sonde n'a répondu, l'instance est considérée comme « unknown »
+        self.state = {url: {"status": "unknown", "latency_ms": None, "checked_at": None} for url in self.urls}
+        self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.urls)),
+                                            thread_name_prefix="health-probe")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.probe_all()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def probe_all(self):
+        """Sonde toutes les instances en parallèle ; la durée d'un tour est celle de la plus lente"""
+        for url, result in zip(self.urls, self._executor.map(self._probe, self.urls)):
+            previous = self.state[url]["status"]
+            # Remplacement atomique de l'entrée : les lecteurs n'ont pas besoin de verrou
+            self.state[url] = result
+            if self.on_change and result["status"] != previous:
+                self.on_change(url, result["status"] == "healthy")
+
+    def _probe(self, url):
+        start = time.monotonic()
+        try:
+            response = self.session.get(f"{url}/health", timeout=self.timeout)
+            status = "healthy" if response.status_code == 200 else "unhealthy"
+        except requests.RequestException:
+            status = "unreachable"
+        return {
+            "status": status,
+            "latency_ms": round((time.monotonic() - start) * 1000, 3),
+            "checked_at": time.time()
+        }
+
+    def snapshot(self):
+        """État agrégé au format de /api/v1/health, servi depuis la mémoire"""
+        return {
+            "gateway": "healthy",
+            "services": {service_name: [self.state[url]["status"] for url in urls]
+                         for service_name, urls in self.services.items()},
+            "instances": dict(self.state)
+        }
@@ -0,0 +1,91 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.metrics import stats_lines
+
+# En-têtes hop-by-hop (RFC 7230) à ne jamais relayer, plus ceux recalculés par le serveur
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade",
+    "content-length", "content-encoding", "host"
+}
+
+
+def filter_headers(headers):
+    """Retire les en-têtes hop-by-hop d'un ensemble d'en-têtes HTTP"""
+    return [(k, v) for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+
+
+class UpstreamPool:
+    """Pool borné de connexions keep-alive vers une instance upstream"""
+
+    def __init__(self, base_url, size):
+        self.base_url = base_url
+        self.size = size
+        self.session = requests.Session()
+        # pool_block=True : au-delà de `size` connexions, on attend au lieu d'en ouvrir d'autres
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+        self.session.mount(base_url, self.adapter)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.requests_total = 0
+        self.saturated_total = 0
+        self.errors_total = 0
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            if self.in_use >= self.size:
+                self.saturated_total += 1
+            self.in_use += 1
+            self.requests_total += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            return self.session.request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors_total += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_use -= 1
+
+    def connections_opened(self):
+        """Nombre de connexions TCP ouvertes par urllib3 depuis le démarrage"""
+        pool = self.adapter.poolmanager.connection_from_url(self.base_url)
+        return pool.num_connections
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "requests_total": self.requests_total,
+                "saturated_total": self.saturated_total,
+                "errors_total": self.errors_total,
+                "connections_opened": self.connections_opened()
+            }
+
+
+class UpstreamPools:
+    """Un pool par instance déclarée dans SERVICES"""
+
+    def __init__(self, services, pool_sizes, default_size=10):
+        self.pools = {}
+        for service_name, urls in services.items():
+            size = pool_sizes.get(service_name, default_size)
+            for url in urls:
+                self.pools[url] = UpstreamPool(url, size)
+
+    def get(self, base_url):
+        return self.pools[base_url]
+
+    def stats(self):
+        return {url: pool.stats() for url, pool in self.pools.items()}
+
+    def prometheus_lines(self):
+        """Expose les compteurs d'utilisation au format texte Prometheus"""
+        return stats_lines("gateway_upstream_pool", [({"upstream": url}, stats) for url, stats in self.stats().items()])
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from common.metrics import stats_lines
+
+# En-tête transmis aux services : temps restant (ms) avant l'échéance de la requête
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class CircuitBreaker:
+    """Disjoncteur par instance upstream : closed → open après N échecs, puis half-open pour un essai"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.rejected_total = 0
+        self.opened_total = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Vrai si un appel peut partir ; en half-open, un seul appel d'essai à la fois"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.opened_at + self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.rejected_total += 1
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.trial_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self.failures = 0
+                else:
+                    self._open()
+                return
+            if success:
+                self.failures = 0
+            else:
+                self.failures += 1
+                if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                    self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.opened_total += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": int(self.state == self.OPEN),
+                "half_open": int(self.state == self.HALF_OPEN),
+                "opened_total": self.opened_total,
+                "rejected_total": self.rejected_total
+            }
+
+
+class RetryBudget:
+    """Budget de retries : chaque requête dépose `ratio` jeton, chaque retry en consomme un
+
+    Les retries restent ainsi bornés à une fraction du trafic et ne peuvent pas amplifier une
+    surcharge ; `min_per_second` garantit quelques retries quand le trafic est faible.
+    """
+
+    def __init__(self, ratio, min_per_second, max_tokens=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.last_refill = time.monotonic()
+        self.retries_total = 0
+        self.denied_total = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_tokens, self.tokens + (now - self.last_refill) * self.min_per_second)
+            self.last_refill = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                self.retries_total += 1
+                return True
+            self.denied_total += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "retries_total": self.retries_total,
+                "retries_denied_total": self.denied_total
+            }
+
+
+def prometheus_lines(circuit_breakers, retry_budgets):
+    return stats_lines("gateway_circuit", [({"upstream": url}, breaker.stats())
+                                           for url, breaker in circuit_breakers.items()]) + \
+        stats_lines("gateway", [({"service": service_name}, budget.stats())
+                                for service_name, budget in retry_budgets.items()])
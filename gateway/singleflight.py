@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+from common.metrics import stats_lines
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Fusionne les appels identiques simultanés : un seul s'exécute, les autres attendent son résultat"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "upstream_calls_total": self.leaders,
+                "upstream_calls_saved_total": self.followers
+            }
+
+    def prometheus_lines(self):
+        return stats_lines("gateway_coalescing", [({}, self.stats())])
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Variante asyncio : les appelants en attente partagent une Future"""
+
+    def __init__(self):
+        super().__init__()
+        self._futures = {}
+
+    async def do(self, key, fn):
+        future = self._futures.get(key)
+        if future is not None:
+            self.followers += 1
+            return await asyncio.shield(future)
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Récupère l'exception pour éviter l'avertissement si personne n'attendait
+            future.exception()
+            raise
+        except BaseException:
+            # Meneur annulé : les appelants en attente sont annulés avec lui
+            future.cancel()
+            raise
+        finally:
+            del self._futures[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._futures),
+            "upstream_calls_total": self.leaders,
+            "upstream_calls_saved_total": self.followers
+        }
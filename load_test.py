@@ -1,117 +1,388 @@
-import requests
-import time
-import threading
+"""Test de charge en boucle ouverte de l'API (via la gateway ou un service direct)
+
+Chaque scénario est joué à débit d'arrivée fixe (--rate requêtes/s) pendant --duration
+secondes : les requêtes partent à l'heure prévue même si les précédentes n'ont pas répondu,
+et la latence est mesurée depuis l'heure prévue. Un serveur saturé fait donc monter les
+percentiles au lieu de ralentir silencieusement le générateur (omission coordonnée).
+
+Les latences sont enregistrées dans un histogramme à précision relative fixe (type HDR) ;
+les résultats peuvent être écrits en JSON et comparés à une référence : une régression de
+latence, de débit ou de taux d'erreur fait échouer le run (code de sortie 1).
+
+    pip install aiohttp
+    python load_test.py --rate 50 --duration 20 --output results.json
+    python load_test.py --rate 50 --duration 20 --save-baseline benchmarks/baseline.json
+    python load_test.py --rate 50 --duration 20 --baseline benchmarks/baseline.json
+
+La référence n'est pas versionnée : les latences dépendent de la machine. Elle s'enregistre
+avec --save-baseline sur la machine qui fera les comparaisons, à partir d'une version saine.
+Une référence absente, illisible ou sans aucun des scénarios joués fait échouer le run.
+"""
+import argparse
+import asyncio
+import itertools
 import json
-from concurrent.futures import ThreadPoolExecutor
+import math
+import random
+import sys
+import time
+import uuid
+
+import aiohttp
+
+
+class Histogram:
+    """Histogramme de latences (µs) à précision relative fixe, sur le principe de HdrHistogram
+
+    Les valeurs sont rangées dans des seaux dont la largeur double à chaque puissance de 2 :
+    avec 2**sub_bucket_bits sous-seaux, l'erreur relative reste sous 2**-(sub_bucket_bits-1)
+    (0,1 % par défaut) quelle que soit l'amplitude. Seuls les seaux non vides sont stockés.
+    """
+
+    def __init__(self, sub_bucket_bits=11):
+        self.sub_bucket_bits = sub_bucket_bits
+        self._half = 1 << (sub_bucket_bits - 1)
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self._sum = 0
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return shift * self._half + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return ((index - shift * self._half + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self._sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self._sum += other._sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Plus petite valeur (à la précision près) sous laquelle se trouvent p % des mesures"""
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(self.total * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self._sum / self.total if self.total else 0
 
-class LoadTester:
-    def __init__(self, base_url="http://localhost:8080"):
+    def to_dict(self):
+        return {"sub_bucket_bits": self.sub_bucket_bits, "total": self.total, "sum": self._sum,
+                "min": self.min, "max": self.max,
+                "counts": [[index, count] for index, count in sorted(self.counts.items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["sub_bucket_bits"])
+        histogram.counts = {index: count for index, count in data["counts"]}
+        histogram.total, histogram._sum = data["total"], data["sum"]
+        histogram.min, histogram.max = data["min"], data["max"]
+        return histogram
+
+
+PERCENTILES = (("p50", 50), ("p90", 90), ("p99", 99), ("p999", 99.9))
+
+
+class Client:
+    """Session HTTP partagée (keep-alive) et état créé par la préparation des scénarios"""
+
+    def __init__(self, session, base_url):
+        self.session = session
         self.base_url = base_url
-        self.results = []
-        
-    def make_request(self, endpoint, method='GET', data=None):
-        start_time = time.time()
+        self.run_id = uuid.uuid4().hex[:8]
+        self.headers = {}
+        self.email = None
+        self.password = "bench-password"
+        self.cart_id = None
+        self._ids = itertools.count()
+
+    def next_id(self, prefix):
+        return f"{prefix}-{self.run_id}-{next(self._ids)}"
+
+    async def call(self, method, path, headers=None, **kwargs):
+        """Renvoie (succès, corps) ; le corps est toujours lu pour que la connexion soit réutilisée"""
+        async with self.session.request(method, f"{self.base_url}{path}",
+                                        headers=dict(self.headers, **(headers or {})), **kwargs) as response:
+            body = await response.read()
+            return response.status < 400, body
+
+    async def setup(self):
+        """Client de test connecté (jeton pour les services authentifiés) et panier pré-rempli"""
+        self.email = f"bench-{self.run_id}@example.com"
+        await self.call("POST", "/api/v1/customers", json={
+            "email": self.email, "first_name": "Bench", "last_name": "User", "password": self.password})
+        ok, body = await self.call("POST", "/api/v1/customers/login",
+                                   json={"email": self.email, "password": self.password})
+        if not ok:
+            raise RuntimeError(f"Connexion du client de test impossible: {body[:200]!r}")
+        self.headers["Authorization"] = f"Bearer {json.loads(body)['token']}"
+        self.cart_id = self.next_id("bench-cart")
+        await self.call("POST", f"/api/v1/cart/{self.cart_id}/add", json={"product_id": "1", "quantity": 1})
+
+
+# Scénarios : une opération utilisateur par arrivée ; renvoie le succès, ou (succès, nettoyage non mesuré)
+async def products_list(client, i):
+    return (await client.call("GET", "/api/v1/products?limit=50"))[0]
+
+
+async def product_get(client, i):
+    return (await client.call("GET", f"/api/v1/products/{i % 3 + 1}"))[0]
+
+
+async def products_batch(client, i):
+    return (await client.call("GET", "/api/v1/products?ids=1,2,3"))[0]
+
+
+async def stock_get(client, i):
+    return (await client.call("GET", f"/api/v1/stock/{i % 3 + 1}"))[0]
+
+
+async def customer_create(client, i):
+    return (await client.call("POST", "/api/v1/customers", json={
+        "email": f"{client.next_id('bench')}@example.com", "first_name": "Bench", "last_name": "User",
+        "password": client.password}))[0]
+
+
+async def customer_login(client, i):
+    return (await client.call("POST", "/api/v1/customers/login",
+                              json={"email": client.email, "password": client.password}))[0]
+
+
+async def cart_get(client, i):
+    return (await client.call("GET", f"/api/v1/cart/{client.cart_id}"))[0]
+
+
+async def cart_add(client, i):
+    # Un panier neuf par ajout : la vérification de stock porte toujours sur une seule unité
+    return (await client.call("POST", f"/api/v1/cart/{client.next_id('bench-cart')}/add",
+                              json={"product_id": str(i % 3 + 1), "quantity": 1}))[0]
+
+
+async def order_create(client, i):
+    """Parcours d'achat : ajout au panier puis commande
+
+    La commande est ensuite annulée pour rendre le stock ; cette annulation n'est pas mesurée.
+    """
+    customer_id = client.next_id("bench-customer")
+    ok, _ = await client.call("POST", f"/api/v1/cart/{customer_id}/add",
+                              json={"product_id": str(i % 3 + 1), "quantity": 1})
+    if not ok:
+        return False
+    ok, body = await client.call("POST", "/api/v1/orders", json={"customer_id": customer_id},
+                                 headers={"Idempotency-Key": uuid.uuid4().hex})
+    if not ok:
+        return False
+    order_id = json.loads(body)["id"]
+    return True, lambda: client.call("PUT", f"/api/v1/orders/{order_id}/status", json={"status": "cancelled"})
+
+
+SCENARIOS = {
+    "products_list": products_list,
+    "product_get": product_get,
+    "products_batch": products_batch,
+    "stock_get": stock_get,
+    "customer_create": customer_create,
+    "customer_login": customer_login,
+    "cart_get": cart_get,
+    "cart_add": cart_add,
+    "order_create": order_create,
+}
+
+# Percentiles soumis à la comparaison avec la référence (p999 est trop bruité sur des runs courts)
+GATED_PERCENTILES = ("p50", "p90", "p99")
+
+
+async def run_phase(client, scenario, rate, duration, max_inflight, poisson=False):
+    """Joue un scénario à `rate` arrivées/s pendant `duration` s ; renvoie (histogramme, compteurs, durée)"""
+    histogram = Histogram()
+    outcome = {"ok": 0, "errors": 0, "dropped": 0}
+    inflight = set()
+    rng = random.Random()
+
+    async def fire(i, intended):
         try:
-            url = f"{self.base_url}{endpoint}"
-            if method == 'GET':
-                response = requests.get(url)
-            elif method == 'POST':
-                response = requests.post(url, json=data)
-            
-            duration = time.time() - start_time
-            self.results.append({
-                'endpoint': endpoint,
-                'method': method,
-                'status_code': response.status_code,
-                'duration': duration,
-                'success': response.status_code < 400
-            })
-            
-        except Exception as e:
-            duration = time.time() - start_time
-            self.results.append({
-                'endpoint': endpoint,
-                'method': method,
-                'status_code': 0,
-                'duration': duration,
-                'success': False,
-                'error': str(e)
-            })
-    
-    def run_load_test(self, num_requests=100, concurrent_users=10):
-        print(f"Démarrage du test de charge: {num_requests} requêtes avec {concurrent_users} utilisateurs concurrents")
-        
-        # Test scenarios
-        scenarios = [
-            ('/api/v1/products', 'GET'),
-            ('/api/v1/products/1', 'GET'),
-            ('/api/v1/stock/1', 'GET'),
-            ('/api/v1/customers', 'POST', {'email': 'test@example.com', 'first_name': 'Test', 'last_name': 'User', 'password': 'password123'}),
-        ]
-        
-        with ThreadPoolExecutor(max_workers=concurrent_users) as executor:
-            futures = []
-            
-            for i in range(num_requests):
-                scenario = scenarios[i % len(scenarios)]
-                endpoint, method = scenario[0], scenario[1]
-                data = scenario[2] if len(scenario) > 2 else None
-                
-                future = executor.submit(self.make_request, endpoint, method, data)
-                futures.append(future)
-            
-            # Attendre que tous les requests soient terminés
-            for future in futures:
-                future.result()
-        
-        self.print_results()
-    
-    def print_results(self):
-        if not self.results:
-            print("Aucun résultat à afficher")
-            return
-        
-        total_requests = len(self.results)
-        successful_requests = sum(1 for r in self.results if r['success'])
-        failed_requests = total_requests - successful_requests
-        
-        durations = [r['duration'] for r in self.results]
-        avg_duration = sum(durations) / len(durations)
-        min_duration = min(durations)
-        max_duration = max(durations)
-        
-        print(f"\n=== RÉSULTATS DU TEST DE CHARGE ===")
-        print(f"Total des requêtes: {total_requests}")
-        print(f"Requêtes réussies: {successful_requests}")
-        print(f"Requêtes échouées: {failed_requests}")
-        print(f"Taux de réussite: {(successful_requests/total_requests)*100:.2f}%")
-        print(f"Durée moyenne: {avg_duration:.3f}s")
-        print(f"Durée minimale: {min_duration:.3f}s")
-        print(f"Durée maximale: {max_duration:.3f}s")
-        
-        # Grouper par endpoint
-        endpoints = {}
-        for result in self.results:
-            endpoint = result['endpoint']
-            if endpoint not in endpoints:
-                endpoints[endpoint] = []
-            endpoints[endpoint].append(result)
-        
-        print(f"\n=== DÉTAILS PAR ENDPOINT ===")
-        for endpoint, results in endpoints.items():
-            successes = sum(1 for r in results if r['success'])
-            avg_dur = sum(r['duration'] for r in results) / len(results)
-            print(f"{endpoint}: {successes}/{len(results)} réussies, {avg_dur:.3f}s moyenne")
+            result = await scenario(client, i)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError):
+            result = False
+        # Latence depuis l'heure d'arrivée prévue, pas depuis l'envoi effectif
+        histogram.record((time.perf_counter() - intended) * 1e6)
+        ok, cleanup = result if isinstance(result, tuple) else (result, None)
+        outcome["ok" if ok else "errors"] += 1
+        if cleanup is not None:
+            try:
+                await cleanup()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+
+    start = intended = time.perf_counter()
+    end = start + duration
+    i = 0
+    while intended < end:
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(inflight) >= max_inflight:
+            # Générateur saturé : l'arrivée est perdue et comptée comme une erreur
+            outcome["dropped"] += 1
+        else:
+            task = asyncio.ensure_future(fire(i, intended))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        i += 1
+        intended += rng.expovariate(rate) if poisson else 1 / rate
+    if inflight:
+        await asyncio.wait(inflight)
+    return histogram, outcome, time.perf_counter() - start
+
+
+def summarize(histogram, outcome, elapsed, rate):
+    requests = outcome["ok"] + outcome["errors"] + outcome["dropped"]
+    summary = {
+        "target_rate": rate,
+        "requests": requests,
+        "ok": outcome["ok"],
+        "errors": outcome["errors"],
+        "dropped": outcome["dropped"],
+        "error_rate": (requests - outcome["ok"]) / requests if requests else 0,
+        "throughput": outcome["ok"] / elapsed if elapsed else 0,
+        "mean_ms": histogram.mean() / 1000,
+    }
+    for key, p in PERCENTILES:
+        summary[f"{key}_ms"] = histogram.percentile(p) / 1000
+    summary["max_ms"] = histogram.max / 1000
+    summary["histogram"] = histogram.to_dict()
+    return summary
+
+
+def compare(results, baseline, latency_tolerance, throughput_tolerance, error_tolerance, latency_floor_ms):
+    """Liste des régressions par rapport à la référence (scénarios absents de la référence ignorés)"""
+    failures = []
+    if not set(results["scenarios"]) & set(baseline["scenarios"]):
+        return ["aucun des scénarios joués n'est dans la référence : rien n'a été comparé"]
+    for name, current in results["scenarios"].items():
+        reference = baseline["scenarios"].get(name)
+        if reference is None:
+            print(f"Attention: {name} absent de la référence, non comparé")
+            continue
+        if reference["target_rate"] != current["target_rate"]:
+            print(f"Attention: {name} joué à {current['target_rate']} req/s, référence à {reference['target_rate']} req/s")
+        for key in GATED_PERCENTILES:
+            now, before = current[f"{key}_ms"], reference[f"{key}_ms"]
+            # Un écart absolu sous le plancher est du bruit, même s'il est grand en relatif
+            if now > before * (1 + latency_tolerance) and now - before > latency_floor_ms:
+                failures.append(f"{name} {key}: {now:.1f} ms > {before:.1f} ms (+{(now / before - 1) * 100:.0f}%)")
+        if current["throughput"] < reference["throughput"] * (1 - throughput_tolerance):
+            failures.append(f"{name} débit: {current['throughput']:.1f} req/s < {reference['throughput']:.1f} req/s")
+        if current["error_rate"] > reference["error_rate"] + error_tolerance:
+            failures.append(f"{name} erreurs: {current['error_rate']:.2%} > {reference['error_rate']:.2%}")
+    return failures
+
+
+def load_baseline(path):
+    """Référence à comparer ; arrête le programme (code 1) avant toute charge si elle est inutilisable"""
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"Référence introuvable: {path}\n"
+                 f"L'enregistrer d'abord, sur cette machine et à partir d'une version saine :\n"
+                 f"    python load_test.py --rate <débit> --duration <durée> --save-baseline {path}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"Référence illisible ({path}): {e}")
+    if not isinstance(baseline, dict) or not isinstance(baseline.get("scenarios"), dict):
+        sys.exit(f"Référence invalide ({path}): pas de résultats par scénario")
+    return baseline
+
+
+async def run(args):
+    connector = aiohttp.TCPConnector(limit=args.max_inflight)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    results = {
+        "meta": {"base_url": args.base_url, "rate": args.rate, "duration": args.duration,
+                 "arrivals": "poisson" if args.poisson else "uniform", "started_at": time.time()},
+        "scenarios": {},
+    }
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        client = Client(session, args.base_url)
+        await client.setup()
+
+        print(f"Boucle ouverte: {args.rate} req/s, {args.duration} s par scénario sur {args.base_url}")
+        print(f"{'scénario':<16} {'req/s':>8} {'ok':>6} {'err':>5} {'p50 ms':>8} {'p90 ms':>8} "
+              f"{'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}")
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            if args.warmup:
+                await run_phase(client, scenario, args.rate, args.warmup, args.max_inflight, args.poisson)
+            summary = summarize(*await run_phase(client, scenario, args.rate, args.duration,
+                                                 args.max_inflight, args.poisson), args.rate)
+            results["scenarios"][name] = summary
+            print(f"{name:<16} {summary['throughput']:>8.1f} {summary['ok']:>6} "
+                  f"{summary['errors'] + summary['dropped']:>5} {summary['p50_ms']:>8.1f} {summary['p90_ms']:>8.1f} "
+                  f"{summary['p99_ms']:>8.1f} {summary['p999_ms']:>8.1f} {summary['max_ms']:>8.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--rate", type=float, default=20, help="arrivées par seconde et par scénario")
+    parser.add_argument("--duration", type=float, default=30, help="durée mesurée par scénario (s)")
+    parser.add_argument("--warmup", type=float, default=2, help="chauffe non mesurée par scénario (s)")
+    parser.add_argument("--poisson", action="store_true", help="arrivées poissoniennes plutôt que régulières")
+    parser.add_argument("--max-inflight", type=int, default=500, help="requêtes en vol au-delà desquelles une arrivée est perdue")
+    parser.add_argument("--timeout", type=float, default=10, help="délai maximum d'une requête (s)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--save-baseline", help="enregistrer les résultats comme nouvelle référence")
+    parser.add_argument("--baseline", help="référence JSON à comparer ; une régression fait échouer le run")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25, help="hausse relative tolérée des percentiles")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.10, help="baisse relative tolérée du débit")
+    parser.add_argument("--error-tolerance", type=float, default=0.01, help="hausse absolue tolérée du taux d'erreur")
+    parser.add_argument("--latency-floor-ms", type=float, default=2.0, help="écart de latence ignoré sous ce seuil (ms)")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    results = asyncio.run(run(args))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        failures = compare(results, baseline, args.latency_tolerance, args.throughput_tolerance,
+                           args.error_tolerance, args.latency_floor_ms)
+        if failures:
+            print("\n=== RÉGRESSIONS ===")
+            for failure in failures:
+                print(failure)
+            sys.exit(1)
+        print("\nAucune régression par rapport à la référence")
+
 
 if __name__ == '__main__':
-    # Test direct API
-    print("Test de charge - API directe")
-    tester_direct = LoadTester("http://localhost:5001")  # Service direct
-    tester_direct.run_load_test(50, 5)
-    
-    time.sleep(2)
-    
-    # Test via API Gateway
-    print("\nTest de charge - Via API Gateway")
-    tester_gateway = LoadTester("http://localhost:8080")  # Via Gateway
-    tester_gateway.run_load_test(50, 5)
\ No newline at end of file
+    main()
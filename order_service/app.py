@@ -2,37 +2,80 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import logging
 import uuid
+from datetime import datetime, timezone
 import requests
 
+from common.logs import setup_logging
+from common.metrics import instrument_flask, upstream_request
+from common.stateserver import shared_state
+from common.tracing import trace_flask
+from orders_index import decode_cursor, encode_cursor
+from tasks import BackgroundTasks
+
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "orders", extra=lambda: state.metrics())
+trace_flask(app, "orders")
 
-logging.basicConfig(level=logging.INFO)
+setup_logging("orders")
 logger = logging.getLogger(__name__)
 
-# Base de données simulée pour les commandes
-orders_db = {}
+# Commandes, index et clés d'idempotence : objet local, ou processus partagé par les workers gunicorn
+state = shared_state("state:OrderState")
+
+# Taille de page par défaut et maximum de GET /orders
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
 # URLs des services
 CART_SERVICE_URL = "http://cart-service:5004"
 STOCK_SERVICE_URL = "http://stock-service:5002"
 
-@app.route('/orders', methods=['POST'])
-def create_order():
-    data = request.get_json()
-    customer_id = data.get("customer_id")
+# Timeout (secondes) des appels sortants quand la gateway n'a pas transmis d'échéance
+DOWNSTREAM_TIMEOUT = 10
+
+# Connexions keep-alive réutilisées pour tous les appels sortants
+http = requests.Session()
+
+background = BackgroundTasks()
+
+def downstream_timeout():
+    """Timeout des appels sortants : le temps restant annoncé par la gateway, sinon DOWNSTREAM_TIMEOUT"""
+    deadline_ms = request.headers.get("X-Request-Deadline-Ms")
+    if deadline_ms and deadline_ms.isdigit():
+        return max(0.001, int(deadline_ms) / 1000)
+    return DOWNSTREAM_TIMEOUT
+
+def release_hold(hold_id, timeout):
+    """Vrai si la réservation est libérée, ou n'existe plus (son stock a déjà été rendu)"""
+    try:
+        response = upstream_request("orders", "stock", "POST", f"{STOCK_SERVICE_URL}/stock/holds/{hold_id}/release",
+                                    session=http, timeout=timeout)
+    except requests.RequestException:
+        return False
+    return response.status_code in (200, 404)
+
+def clear_cart(customer_id):
+    response = upstream_request("orders", "cart", "DELETE", f"{CART_SERVICE_URL}/cart/{customer_id}/clear",
+                                session=http, timeout=DOWNSTREAM_TIMEOUT)
+    return response.status_code < 500
+
+def place_order(customer_id):
+    """Crée la commande ; renvoie (corps, statut HTTP)"""
+    timeout = downstream_timeout()
     
     # Récupérer le panier
     try:
-        cart_response = requests.get(f"{CART_SERVICE_URL}/cart/{customer_id}")
+        cart_response = upstream_request("orders", "cart", "GET", f"{CART_SERVICE_URL}/cart/{customer_id}",
+                                         session=http, timeout=timeout)
         if cart_response.status_code != 200:
-            return jsonify({"error": "Cart not found"}), 4002
+            return {"error": "Cart not found"}, 404
         cart = cart_response.json()
     except:
-        return jsonify({"error": "Unable to retrieve cart"}), 500
+        return {"error": "Unable to retrieve cart"}, 500
     
     if not cart["items"]:
-        return jsonify({"error": "Cart is empty"}), 400
+        return {"error": "Cart is empty"}, 400
     
     # Créer la commande
     order_id = str(uuid.uuid4())
@@ -42,53 +85,107 @@ def create_order():
         "items": cart["items"],
         "status": "pending",
         "total": cart["total"],
-        "created_at": "2024-01-01T00:00:00Z"
+        # Précision à la microseconde, format fixe : l'ordre des chaînes est l'ordre chronologique
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
     }
     
-    # Réserver le stock pour chaque produit
-    for item in cart["items"]:
-        try:
-            reserve_response = requests.post(
-                f"{STOCK_SERVICE_URL}/stock/{item['product_id']}/reserve",
-                json={"quantity": item["quantity"]}
-            )
-            if reserve_response.status_code != 200:
-                logger.warning(f"Impossible de réserver le stock pour {item['product_id']}")
-        except:
-            logger.warning(f"Erreur lors de la réservation du stock pour {item['product_id']}")
+    # Réserver le stock de tous les produits en un seul appel, tout ou rien, et déjà confirmé :
+    # une réservation en attente expirerait et son stock serait revendu alors que la commande existe.
+    # La réservation porte l'id de la commande : sans réponse du stock, elle peut quand même être libérée
+    reservation = [{"product_id": item["product_id"], "quantity": item["quantity"]} for item in cart["items"]]
+    try:
+        reserve_response = upstream_request(
+            "orders", "stock", "POST",
+            f"{STOCK_SERVICE_URL}/stock/reserve",
+            json={"items": reservation, "confirm": True, "hold_id": order_id},
+            session=http, timeout=timeout
+        )
+    except:
+        logger.warning("Erreur lors de la réservation du stock pour le client %s", customer_id)
+        if not release_hold(order_id, DOWNSTREAM_TIMEOUT):
+            logger.error("Réservation %s peut-être prise et non libérée pour le client %s", order_id, customer_id)
+        return {"error": "Unable to reserve stock"}, 503
+    if reserve_response.status_code != 200:
+        logger.warning("Réservation refusée pour le client %s (HTTP %s)", customer_id, reserve_response.status_code)
+        return reserve_response.json(), reserve_response.status_code
     
-    orders_db[order_id] = order
+    order["hold_id"] = reserve_response.json()["hold_id"]
+    state.add(order)
     
-    # Vider le panier
+    # Hors du chemin critique, avec retries : un panier non vidé ne fausse pas le stock
+    background.submit(f"clear-cart {customer_id}", clear_cart, customer_id)
+    
+    logger.info("Commande créée: %s pour client %s", order_id, customer_id)
+    return order, 201
+
+@app.route('/orders', methods=['POST'])
+def create_order():
+    data = request.get_json()
+    customer_id = data.get("customer_id")
+    
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        body, status = place_order(customer_id)
+        return jsonify(body), status
+    
+    # Une même clé rejouée (retry client après timeout) renvoie la commande déjà créée
+    key = f"{customer_id}:{key}"
+    if not state.begin_request(key):
+        result = state.wait_request(key, DOWNSTREAM_TIMEOUT * 3)
+        if result is None:
+            return jsonify({"error": "Original request failed, retry"}), 409
+        body, status = result
+        return jsonify(body), status, {"Idempotent-Replayed": "true"}
+    
+    result = None
     try:
-        requests.delete(f"{CART_SERVICE_URL}/cart/{customer_id}/clear")
-    except:
-        logger.warning("Impossible de vider le panier")
+        body, status = result = place_order(customer_id)
+    finally:
+        # Les erreurs transitoires (5xx) ne sont pas mémorisées : un nouvel essai refera la requête
+        state.finish_request(key, result if result and result[1] < 500 else None)
+    return jsonify(body), status
+
+@app.route('/orders', methods=['GET'])
+def list_orders():
+    """Liste paginée des commandes, filtrable par client et par statut"""
+    customer_id = request.args.get("customer_id")
+    status = request.args.get("status")
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.args.get("limit", DEFAULT_PAGE_SIZE))))
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
     
-    logger.info(f"Commande créée: {order_id} pour client {customer_id}")
-    return jsonify(order), 201
+    orders, next_cursor = state.query(customer_id, status, cursor, limit)
+    return jsonify({
+        "orders": orders,
+        "next_cursor": encode_cursor(next_cursor) if next_cursor is not None else None
+    })
 
 @app.route('/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
-    logger.info(f"Récupération commande {order_id}")
-    order = orders_db.get(order_id)
+    logger.info("Récupération commande %s", order_id)
+    order = state.get(order_id)
     if order:
         return jsonify(order)
     return jsonify({"error": "Order not found"}), 404
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
 @app.route('/orders/<order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     data = request.get_json()
     new_status = data.get("status")
     
-    if order_id in orders_db:
-        orders_db[order_id]["status"] = new_status
-        logger.info(f"Statut commande {order_id} mis à jour: {new_status}")
-        return jsonify(orders_db[order_id])
+    order = state.get(order_id)
+    if order is not None:
+        if new_status == "cancelled" and order["status"] != "cancelled" and order.get("hold_id"):
+            # Rendre le stock réservé par la commande, en un seul appel ; le statut ne change
+            # qu'une fois le stock rendu, pour qu'une annulation en échec puisse être retentée
+            if not release_hold(order["hold_id"], downstream_timeout()):
+                logger.warning("Impossible de libérer le stock de la commande %s", order_id)
+                return jsonify({"error": "Unable to release stock, retry"}), 503
+        order = state.set_status(order_id, new_status)
+        logger.info("Statut commande %s mis à jour: %s", order_id, new_status)
+        return jsonify(order)
     
     return jsonify({"error": "Order not found"}), 404
 
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ("done", "result", "expires_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.expires_at = None
+
+
+class IdempotencyStore:
+    """Résultats des requêtes POST indexés par clé d'idempotence, bornés en nombre et en durée
+
+    Une requête rejouée reçoit le résultat de la première ; si la première est encore en
+    cours, la seconde attend sa fin plutôt que de refaire le travail.
+    """
+
+    def __init__(self, max_entries=10000, ttl=86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def begin(self, key):
+        """Vrai si l'appelant doit exécuter la requête, faux si elle a déjà été reçue"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self.replays += 1
+                return False
+            self._entries[key] = _Entry()
+            # Les entrées les plus anciennes sortent en premier (l'ordre d'insertion suit le temps)
+            while len(self._entries) > self.max_entries:
+                oldest_key, oldest = next(iter(self._entries.items()))
+                if not oldest.done.is_set():
+                    break
+                del self._entries[oldest_key]
+            return True
+
+    def finish(self, key, result):
+        """Publie le résultat ; None (erreur transitoire) libère la clé pour un nouvel essai"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if result is None:
+                del self._entries[key]
+            else:
+                entry.expires_at = time.monotonic() + self.ttl
+        entry.result = result
+        entry.done.set()
+
+    def wait(self, key, timeout=None):
+        """Résultat de la requête d'origine ; None si elle a échoué ou n'a pas fini à temps"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry.done.wait(timeout)
+        return entry.result
@@ -0,0 +1,86 @@
+import base64
+import bisect
+import json
+import threading
+
+
+class OrderIndex:
+    """Index secondaires des commandes (par client et par statut) pour la pagination par curseur
+
+    Chaque commande est classée par sa clé (created_at, id) : la clé ne dépend que de la
+    commande, l'ordre et les curseurs restent donc les mêmes après un redémarrage. Les index
+    sont des listes triées de clés : une page commence par une recherche dichotomique sur le
+    curseur, son coût ne dépend donc pas de la profondeur de la page.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_by_order = {}
+        self._all = []
+        self._by_customer = {}
+        self._by_status = {}
+
+    def add(self, order):
+        key = (order["created_at"], order["id"])
+        with self._lock:
+            self._key_by_order[order["id"]] = key
+            # Commandes créées dans l'ordre : l'insertion se fait presque toujours en fin de liste
+            bisect.insort(self._all, key)
+            bisect.insort(self._by_customer.setdefault(order["customer_id"], []), key)
+            bisect.insort(self._by_status.setdefault(order["status"], []), key)
+
+    def update_status(self, order_id, old_status, new_status):
+        if old_status == new_status:
+            return
+        with self._lock:
+            key = self._key_by_order[order_id]
+            old = self._by_status[old_status]
+            del old[bisect.bisect_left(old, key)]
+            bisect.insort(self._by_status.setdefault(new_status, []), key)
+
+    def query(self, customer_id=None, status=None, cursor=None, limit=20):
+        """Identifiants des commandes, des plus récentes aux plus anciennes, et curseur suivant
+
+        `cursor` : clé (created_at, id) de la dernière commande de la page précédente.
+        """
+        with self._lock:
+            if customer_id is not None:
+                keys = self._by_customer.get(customer_id, [])
+            elif status is not None:
+                keys = self._by_status.get(status, [])
+            else:
+                keys = self._all
+            # Le filtre restant (statut quand on parcourt l'index client) est vérifié à la volée
+            status_keys = self._by_status.get(status, []) if customer_id is not None and status is not None else None
+
+            end = bisect.bisect_left(keys, tuple(cursor)) if cursor is not None else len(keys)
+            page = []
+            position = end - 1
+            while position >= 0 and len(page) < limit:
+                key = keys[position]
+                if status_keys is None or _contains(status_keys, key):
+                    page.append(key)
+                position -= 1
+            next_cursor = page[-1] if len(page) == limit and position >= 0 else None
+            return [order_id for _, order_id in page], next_cursor
+
+
+def encode_cursor(key):
+    """Curseur opaque transmis aux clients pour une clé (created_at, id)"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Clé (created_at, id) d'un curseur ; ValueError s'il est invalide"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, list) or len(key) != 2 or not all(isinstance(part, str) for part in key):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _contains(sorted_list, value):
+    i = bisect.bisect_left(sorted_list, value)
+    return i < len(sorted_list) and sorted_list[i] == value
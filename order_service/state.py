@@ -0,0 +1,71 @@
+import copy
+import threading
+
+from common.storage import open_store, prometheus_lines as storage_metrics
+from idempotency import IdempotencyStore
+from orders_index import OrderIndex
+
+
+class OrderState:
+    """État du service orders : commandes, index de listing et clés d'idempotence
+
+    Partagé par tous les workers via common.stateserver : une clé d'idempotence rejouée sur
+    un autre worker retrouve la requête d'origine.
+    """
+
+    def __init__(self):
+        # Base de données simulée pour les commandes, rechargée depuis le journal au démarrage
+        self.orders_db = {}
+        self.orders_store = open_store("orders", self.orders_db)
+        self._lock = threading.Lock()
+
+        # Index secondaires (client, statut) pour le listing paginé, reconstruits depuis les commandes
+        self.orders_index = OrderIndex()
+        for order in self.orders_db.values():
+            self.orders_index.add(order)
+
+        # Clés d'idempotence de POST /orders : 10 000 clés au plus, conservées 24 h
+        self.idempotency_keys = IdempotencyStore(max_entries=10000, ttl=86400)
+
+    def add(self, order):
+        # Commande et index modifiés ensemble : set_status ne voit jamais une commande absente de l'index
+        with self._lock:
+            self.orders_store.put(order["id"], order, wait=False)
+            self.orders_index.add(order)
+        # L'écriture sur disque s'attend hors du verrou
+        self.orders_store.sync()
+
+    def get(self, order_id):
+        with self._lock:
+            order = self.orders_db.get(order_id)
+            return copy.deepcopy(order) if order is not None else None
+
+    def query(self, customer_id, status, cursor, limit):
+        """Page de commandes (copies) et curseur suivant"""
+        order_ids, next_cursor = self.orders_index.query(customer_id, status, cursor, limit)
+        with self._lock:
+            return [copy.deepcopy(self.orders_db[order_id]) for order_id in order_ids], next_cursor
+
+    def set_status(self, order_id, new_status):
+        """Change le statut ; renvoie la commande mise à jour, ou None si elle n'existe pas"""
+        with self._lock:
+            order = self.orders_db.get(order_id)
+            if order is None:
+                return None
+            self.orders_index.update_status(order_id, order["status"], new_status)
+            order["status"] = new_status
+            result = copy.deepcopy(order)
+        self.orders_store.put(order_id, order)
+        return result
+
+    def begin_request(self, key):
+        return self.idempotency_keys.begin(key)
+
+    def finish_request(self, key, result):
+        self.idempotency_keys.finish(key, result)
+
+    def wait_request(self, key, timeout):
+        return self.idempotency_keys.wait(key, timeout)
+
+    def metrics(self):
+        return storage_metrics(self.orders_store)
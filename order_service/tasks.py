@@ -0,0 +1,33 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    """Exécute hors du chemin critique des appels à retenter en cas d'échec (backoff exponentiel)"""
+
+    def __init__(self, max_workers=8, attempts=5, backoff=0.2):
+        self.attempts = attempts
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="order-task")
+        self.failed_total = 0
+
+    def submit(self, name, fn, *args, **kwargs):
+        # Le contexte de la requête suit la tâche : ses appels gardent l'identifiant et la trace de la requête
+        return self._executor.submit(contextvars.copy_context().run, self._run, name, fn, args, kwargs)
+
+    def _run(self, name, fn, args, kwargs):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                if fn(*args, **kwargs) is not False:
+                    return True
+            except Exception as e:
+                logger.warning("Tâche %s: tentative %s/%s en échec (%s)", name, attempt, self.attempts, e)
+            if attempt < self.attempts:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+        self.failed_total += 1
+        logger.error("Tâche %s abandonnée après %s tentatives", name, self.attempts)
+        return False
@@ -1,13 +1,25 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import logging
+import os
+import threading
 import uuid
 
+from common.logs import setup_logging
+from common.metrics import instrument_flask, stats_lines
+from common.storage import DATA_DIR, open_store, prometheus_lines as storage_metrics
+from common.tracing import trace_flask
+from catalog import Catalog, InvalidQuery
+from replication import ChangeLog
+
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "products", extra=lambda: stats_lines("products_replication", [({}, changelog.stats())])
+                 if changelog else storage_metrics(products_store))
+trace_flask(app, "products")
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
+setup_logging("products")
 logger = logging.getLogger(__name__)
 
 # Base de données simulée pour les produits
@@ -17,19 +29,136 @@ products_db = {
     "3": {"id": "3", "name": "Keyboard", "price": 79.99, "stock": 75, "category": "electronics"}
 }
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Répertoire partagé entre les instances (journal + instantané) ; sans lui, le catalogue reste local
+CATALOG_LOG_DIR = os.environ.get("CATALOG_LOG_DIR")
+CATALOG_SNAPSHOT_EVERY = int(os.environ.get("CATALOG_SNAPSHOT_EVERY", "1000"))
+
+# Instance seule : catalogue journalisé sous DATA_DIR. Instances répliquées : le journal
+# partagé fait déjà office de stockage durable
+products_store = open_store("products", products_db, directory=None if CATALOG_LOG_DIR else DATA_DIR)
+
+catalog = Catalog(products_db)
+
+# Paramètres qui demandent une réponse paginée ; sans eux, GET /products garde sa forme
+# historique : une liste de produits (filtrée et triée si demandé)
+PAGINATION_PARAMS = ("limit", "cursor")
+
+# Taille maximum de la liste historique : au-delà, la liste est tronquée et l'en-tête
+# X-Next-Cursor donne le curseur de la suite (à repasser en ?cursor=, réponse paginée)
+UNPAGINATED_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Liste non filtrée déjà sérialisée, avec son curseur de suite : la requête la plus fréquente ne coûte qu'une copie
+all_products = None
+all_products_lock = threading.Lock()
+
+def serialize_page(products, next_cursor):
+    return app.json.dumps({"products": products, "next_cursor": next_cursor})
+
+def unfiltered_list():
+    global all_products
+    cached = all_products
+    if cached is None:
+        with all_products_lock:
+            products, next_cursor = catalog.query(limit=UNPAGINATED_LIMIT)
+            cached = all_products = (app.json.dumps(products), next_cursor)
+    return cached
+
+def list_response(body, next_cursor):
+    """Réponse de forme historique (liste), avec le curseur de la suite si elle a été tronquée"""
+    response = app.response_class(body, mimetype="application/json")
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+def invalidate_unfiltered_list():
+    global all_products
+    with all_products_lock:
+        all_products = None
+
+def apply_change(entry):
+    """Applique une entrée du journal ; rejouer un produit déjà connu est sans effet"""
+    product = entry["product"]
+    if entry["op"] == "put" and product["id"] not in products_db:
+        catalog.add(product)
+        products_store.put(product["id"], product)
+        invalidate_unfiltered_list()
+
+def catalog_state():
+    return [{"op": "put", "product": product} for product in products_db.values()]
+
+changelog = None
+if CATALOG_LOG_DIR:
+    changelog = ChangeLog(CATALOG_LOG_DIR, apply_change, catalog_state, snapshot_every=CATALOG_SNAPSHOT_EVERY)
+    changelog.start()
+
+def refresh_on_miss():
+    """Un produit absent vient peut-être d'être créé par une autre instance : rattrape le journal"""
+    return changelog is not None and changelog.catch_up() > 0
+
+def parse_price(name):
+    value = request.args.get(name)
+    return float(value) if value else None
+
 @app.route('/products', methods=['GET'])
 def get_products():
-    logger.info(f"Récupération de tous les produits - Instance: {app.config.get('INSTANCE_ID', 'default')}")
-    return jsonify(list(products_db.values()))
+    """Catalogue filtrable par catégorie, plage de prix et préfixe du nom ; paginé avec limit ou cursor,
+    sinon liste d'au plus UNPAGINATED_LIMIT produits"""
+    logger.info("Récupération des produits - Instance: %s", app.config.get('INSTANCE_ID', 'default'))
+    if not request.args:
+        return list_response(*unfiltered_list())
+    if "ids" in request.args:
+        return get_products_by_ids(request.args["ids"])
+
+    paginated = any(name in request.args for name in PAGINATION_PARAMS)
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.args.get("limit", DEFAULT_PAGE_SIZE)))) if paginated \
+            else UNPAGINATED_LIMIT
+        min_price = parse_price("min_price")
+        max_price = parse_price("max_price")
+    except ValueError:
+        return jsonify({"error": "Invalid limit or price"}), 400
+    try:
+        products, next_cursor = catalog.query(
+            category=request.args.get("category"),
+            min_price=min_price,
+            max_price=max_price,
+            prefix=request.args.get("prefix"),
+            sort=request.args.get("sort", "id"),
+            cursor=request.args.get("cursor"),
+            limit=limit
+        )
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    if not paginated:
+        return list_response(app.json.dumps(products), next_cursor)
+    return app.response_class(serialize_page(products, next_cursor), mimetype="application/json")
 
 @app.route('/products/<product_id>', methods=['GET'])
 def get_product(product_id):
-    logger.info(f"Récupération produit {product_id}")
+    logger.info("Récupération produit %s", product_id)
     product = products_db.get(product_id)
+    if product is None and refresh_on_miss():
+        product = products_db.get(product_id)
     if product:
         return jsonify(product)
     return jsonify({"error": "Product not found"}), 404
 
+def get_products_by_ids(ids):
+    """Lecture groupée : un seul appel pour tous les produits d'un panier"""
+    product_ids = list(dict.fromkeys(product_id for product_id in ids.split(",") if product_id))
+    if len(product_ids) > MAX_PAGE_SIZE:
+        return jsonify({"error": f"At most {MAX_PAGE_SIZE} ids per request"}), 400
+    if any(product_id not in products_db for product_id in product_ids):
+        refresh_on_miss()
+    return jsonify({
+        "products": [products_db[product_id] for product_id in product_ids if product_id in products_db],
+        "missing": [product_id for product_id in product_ids if product_id not in products_db]
+    })
+
 @app.route('/products', methods=['POST'])
 def create_product():
     data = request.get_json()
@@ -41,14 +170,13 @@ def create_product():
         "stock": data.get("stock", 0),
         "category": data.get("category", "general")
     }
-    products_db[product_id] = product
-    logger.info(f"Produit créé: {product_id}")
+    if changelog is not None:
+        changelog.append({"op": "put", "product": product})
+    else:
+        apply_change({"op": "put", "product": product})
+    logger.info("Produit créé: %s", product_id)
     return jsonify(product), 201
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
-
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "service": "products"})
@@ -0,0 +1,170 @@
+import base64
+import bisect
+import itertools
+import json
+import threading
+
+SORTS = ("id", "price", "-price", "name")
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Position d'un curseur ; InvalidQuery s'il est invalide ou construit pour un autre tri"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidQuery("Invalid cursor")
+    if not _valid_position(position, sort):
+        raise InvalidQuery("Cursor does not match sort")
+    return position
+
+
+def _valid_position(position, sort):
+    if not isinstance(position, list) or not position or not _is_number(position[-1], int):
+        return False
+    if sort == "id":
+        return len(position) == 1
+    if sort in ("price", "-price"):
+        return len(position) == 2 and _is_number(position[0], (int, float))
+    return len(position) == 2 and isinstance(position[0], str)
+
+
+def _is_number(value, types):
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def _prefix_end(prefix):
+    """Plus petite chaîne supérieure à toutes celles qui commencent par `prefix` (None : aucune)"""
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return prefix[:i] + chr(ord(prefix[i]) + 1)
+    return None
+
+
+class Catalog:
+    """Index du catalogue (catégorie, prix, nom) pour des requêtes filtrées et paginées sans parcours complet
+
+    Chaque index est une liste triée de positions : (numéro d'ordre), (prix, numéro) ou
+    (nom, numéro). Une page = une recherche dichotomique sur le début de plage ou le curseur,
+    puis la lecture des éléments suivants ; les filtres non couverts par l'index parcouru
+    sont vérifiés à la volée.
+    """
+
+    def __init__(self, products_db):
+        self.products_db = products_db
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._ids = {}
+        self._all = []
+        self._by_category = {}
+        self._by_price = []
+        self._by_name = []
+        for product in products_db.values():
+            self._index(product)
+
+    def add(self, product):
+        with self._lock:
+            self.products_db[product["id"]] = product
+            self._index(product)
+
+    def _index(self, product):
+        seq = next(self._sequence)
+        self._ids[seq] = product["id"]
+        self._all.append(seq)
+        self._by_category.setdefault(product.get("category"), []).append(seq)
+        if isinstance(product.get("price"), (int, float)):
+            bisect.insort(self._by_price, (product["price"], seq))
+        bisect.insort(self._by_name, ((product.get("name") or "").lower(), seq))
+
+    def query(self, category=None, min_price=None, max_price=None, prefix=None, sort="id",
+              cursor=None, limit=50):
+        """Renvoie (produits de la page, curseur de la page suivante ou None) ; limit=None : tout"""
+        if sort not in SORTS:
+            raise InvalidQuery(f"Invalid sort, expected one of {', '.join(SORTS)}")
+        prefix = prefix.lower() if prefix else None
+        after = decode_cursor(cursor, sort) if cursor else None
+
+        with self._lock:
+            positions = self._walk(category, min_price, max_price, prefix, sort, after)
+            page = []
+            for position in positions:
+                product = self.products_db[self._ids[position[-1]]]
+                if not self._matches(product, category, min_price, max_price, prefix):
+                    continue
+                if len(page) == limit:
+                    return page, encode_cursor(last)
+                page.append(product)
+                last = position
+            return page, None
+
+    def _walk(self, category, min_price, max_price, prefix, sort, after):
+        """Positions candidates, dans l'ordre du tri, à partir du curseur"""
+        if sort == "id":
+            seqs = self._id_candidates(category, min_price, max_price, prefix)
+            start = bisect.bisect_right(seqs, after[0]) if after else 0
+            return ((seq,) for seq in itertools.islice(seqs, start, None))
+
+        if sort == "price":
+            low = (min_price, 0) if min_price is not None else (float("-inf"), 0)
+            start = bisect.bisect_right(self._by_price, tuple(after)) if after else bisect.bisect_left(self._by_price, low)
+            return itertools.takewhile(lambda p: max_price is None or p[0] <= max_price,
+                                       itertools.islice(self._by_price, start, None))
+
+        if sort == "-price":
+            high = (max_price, float("inf")) if max_price is not None else (float("inf"), 0)
+            end = bisect.bisect_left(self._by_price, tuple(after)) if after else bisect.bisect_right(self._by_price, high)
+            return itertools.takewhile(lambda p: min_price is None or p[0] >= min_price,
+                                       (self._by_price[i] for i in range(end - 1, -1, -1)))
+
+        # Tri par nom : un préfixe délimite directement une plage de l'index
+        low = (prefix or "", 0)
+        start = bisect.bisect_right(self._by_name, tuple(after)) if after else bisect.bisect_left(self._by_name, low)
+        return itertools.takewhile(lambda p: prefix is None or p[0].startswith(prefix),
+                                   itertools.islice(self._by_name, start, None))
+
+    def _id_candidates(self, category, min_price, max_price, prefix):
+        """Numéros d'ordre triés à parcourir pour le tri par id : la plus petite liste candidate
+
+        Une plage de prix ou un préfixe délimitent une plage de leur index ; quand elle est plus
+        courte que la liste de la catégorie (ou du catalogue), ses numéros sont triés pour
+        retrouver l'ordre de création, au lieu de parcourir tout le catalogue.
+        """
+        seqs = self._by_category.get(category, []) if category is not None else self._all
+        ranges = []
+        if min_price is not None or max_price is not None:
+            start = bisect.bisect_left(self._by_price, (min_price, 0)) if min_price is not None else 0
+            end = (bisect.bisect_right(self._by_price, (max_price, float("inf"))) if max_price is not None
+                   else len(self._by_price))
+            ranges.append((self._by_price, start, end))
+        if prefix:
+            start = bisect.bisect_left(self._by_name, (prefix, 0))
+            upper = _prefix_end(prefix)
+            end = bisect.bisect_left(self._by_name, (upper,)) if upper is not None else len(self._by_name)
+            ranges.append((self._by_name, start, end))
+        if not ranges:
+            return seqs
+        index, start, end = min(ranges, key=lambda r: r[2] - r[1])
+        if end - start >= len(seqs):
+            return seqs
+        return sorted(position[-1] for position in itertools.islice(index, start, max(start, end)))
+
+    @staticmethod
+    def _matches(product, category, min_price, max_price, prefix):
+        if category is not None and product.get("category") != category:
+            return False
+        if min_price is not None or max_price is not None:
+            price = product.get("price")
+            if not isinstance(price, (int, float)):
+                return False
+            if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                return False
+        if prefix is not None and not (product.get("name") or "").lower().startswith(prefix):
+            return False
+        return True
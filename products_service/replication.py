@@ -0,0 +1,218 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Segments du journal, nommés par l'offset logique de leur premier octet
+SEGMENT_NAME = re.compile(r"^changes\.(\d{20})\.jsonl$")
+
+
+class ChangeLog:
+    """Journal de modifications du catalogue partagé par toutes les instances products
+
+    Les écritures sont ajoutées au dernier segment `changes.<offset>.jsonl` (une ligne par
+    modification, sous verrou fichier exclusif) ; chaque instance relit le journal à partir de
+    son dernier offset logique et applique les entrées dans l'ordre du journal, qui est donc le
+    même partout. Les lectures restent servies par la mémoire locale. Tous les `snapshot_every`
+    entrées, l'état complet est écrit dans `snapshot.json` avec l'offset correspondant, un
+    nouveau segment est ouvert et les segments entièrement couverts par l'instantané sont
+    supprimés : le disque et le rejeu au démarrage restent bornés. Une instance en retard sur
+    un segment supprimé recharge l'instantané (rejouer un produit connu est sans effet).
+    """
+
+    def __init__(self, directory, apply, state, snapshot_every=1000, poll_interval=0.2):
+        self.directory = directory
+        self.apply = apply
+        self.state = state
+        self.snapshot_every = snapshot_every
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.offset = 0
+        self.applied_total = 0
+        self.snapshot_offset = 0
+        self.snapshot_reloads = 0
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+        # flock protège des autres processus ; entre threads d'un même processus, il faut un verrou en plus
+        self._file_mutex = threading.Lock()
+        self._lock_file = open(os.path.join(directory, "changes.lock"), "ab")
+        self._reader = None
+        self._reader_start = None
+        self._stop = threading.Event()
+        self._thread = None
+        with self._file_lock():
+            if not self._segments():
+                # Journal d'une version précédente : un seul fichier, qui devient le premier segment
+                legacy_path = os.path.join(directory, "changes.jsonl")
+                if os.path.exists(legacy_path):
+                    os.rename(legacy_path, self._segment_path(0))
+                else:
+                    open(self._segment_path(0), "ab").close()
+
+    def start(self):
+        """Charge l'instantané, rejoue la fin du journal puis le suit en tâche de fond"""
+        self._load_snapshot()
+        self.catch_up()
+        logger.info("Catalogue répliqué chargé: offset %s, instantané à %s", self.offset, self.snapshot_offset)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-tail", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.catch_up()
+            except Exception:
+                logger.exception("Lecture du journal du catalogue en échec")
+
+    @contextmanager
+    def _file_lock(self):
+        with self._file_mutex:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _segments(self):
+        """Offsets de début des segments présents, dans l'ordre"""
+        return sorted(int(match.group(1)) for match in map(SEGMENT_NAME.match, os.listdir(self.directory))
+                      if match)
+
+    def _segment_path(self, start):
+        return os.path.join(self.directory, f"changes.{start:020d}.jsonl")
+
+    def append(self, entry):
+        """Écrit une modification puis rattrape le journal : l'écrivain voit sa propre écriture"""
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self._file_lock():
+            # Sous le verrou, le dernier segment ne peut pas changer : la ligne y est écrite entière
+            with open(self._segment_path(self._segments()[-1]), "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        self.catch_up()
+
+    def catch_up(self):
+        """Applique les entrées écrites depuis le dernier offset ; renvoie leur nombre"""
+        with self._lock:
+            data = self._read_from(self.offset)
+            if data is None:
+                # Segment supprimé : l'instantané couvre tout ce qu'il contenait
+                self.snapshot_reloads += 1
+                self._apply_snapshot()
+                data = self._read_from(self.offset)
+                if data is None:
+                    raise RuntimeError(f"Journal du catalogue incomplet avant l'offset {self.offset}")
+            # Une ligne sans retour final est en cours d'écriture par une autre instance
+            end = data.rfind(b"\n") + 1
+            applied = 0
+            for line in data[:end].splitlines():
+                if line:
+                    self.apply(json.loads(line))
+                    applied += 1
+            self.offset += end
+            self.applied_total += applied
+            self._since_snapshot += applied
+            if self._since_snapshot >= self.snapshot_every:
+                self._write_snapshot()
+            return applied
+
+    def _read_from(self, offset):
+        """Octets du journal à partir de l'offset logique, ou None si son segment a été supprimé"""
+        segments = self._segments()
+        covering = [start for start in segments if start <= offset]
+        if not covering:
+            return None
+        chunks = []
+        for start in segments[segments.index(covering[-1]):]:
+            try:
+                reader = self._open_segment(start)
+            except FileNotFoundError:
+                if not chunks:
+                    return None
+                break
+            reader.seek(offset - start if not chunks else 0)
+            chunks.append(reader.read())
+        return b"".join(chunks)
+
+    def _open_segment(self, start):
+        # Le segment suivi reste ouvert : le cas courant ne coûte qu'un seek et un read
+        if self._reader_start != start:
+            reader = open(self._segment_path(start), "rb")
+            if self._reader is not None:
+                self._reader.close()
+            self._reader, self._reader_start = reader, start
+        return self._reader
+
+    def _load_snapshot(self):
+        with self._lock:
+            self._apply_snapshot()
+
+    def _apply_snapshot(self):
+        """Applique l'instantané s'il est en avance sur l'offset courant (sous self._lock)"""
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        if snapshot["offset"] <= self.offset:
+            return
+        for entry in snapshot["entries"]:
+            self.apply(entry)
+        self.offset = self.snapshot_offset = snapshot["offset"]
+
+    def _snapshot_offset_on_disk(self):
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)["offset"]
+        except FileNotFoundError:
+            return None
+
+    def _write_snapshot(self):
+        """Écrit l'état courant (cohérent avec self.offset, appelé sous self._lock), ouvre un
+        nouveau segment et supprime ceux que l'instantané couvre entièrement"""
+        self._since_snapshot = 0
+        with self._file_lock():
+            # Une instance en retard ne remplace pas un instantané plus récent que le sien
+            on_disk = self._snapshot_offset_on_disk()
+            if on_disk is None or on_disk < self.offset:
+                snapshot = {"offset": self.offset, "entries": self.state()}
+                tmp_path = f"{self.snapshot_path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(snapshot, f, separators=(",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Remplacement atomique : un lecteur voit l'ancien ou le nouvel instantané, jamais un mélange
+                os.replace(tmp_path, self.snapshot_path)
+                on_disk = self.offset
+            self.snapshot_offset = on_disk
+
+            segments = self._segments()
+            last_size = os.path.getsize(self._segment_path(segments[-1]))
+            if last_size:
+                # Les écritures suivantes vont au nouveau segment : le précédent pourra être supprimé
+                segments.append(segments[-1] + last_size)
+                open(self._segment_path(segments[-1]), "ab").close()
+            for start, following in zip(segments, segments[1:]):
+                if following <= on_disk:
+                    os.remove(self._segment_path(start))
+
+    def stats(self):
+        return {
+            "log_offset_bytes": self.offset,
+            "snapshot_offset_bytes": self.snapshot_offset,
+            "segments": len(self._segments()),
+            "applied_total": self.applied_total,
+            "snapshot_reloads_total": self.snapshot_reloads
+        }
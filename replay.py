@@ -0,0 +1,190 @@
+"""Rejeu d'une capture de trafic de la gateway (CAPTURE_DIR) contre une gateway
+
+Les requêtes sont renvoyées à leurs instants relatifs d'origine, accélérés d'un facteur
+--speed (1 = temps réel, 10 = dix fois plus vite) ; --speed 0 les envoie au plus vite, avec
+au plus --max-inflight requêtes en vol. Comme load_test.py, la latence est mesurée depuis
+l'instant prévu.
+
+Le rapport compare, par route, les latences du rejeu à celles mesurées par la gateway lors
+de la capture, ou à un rejeu précédent (--compare) : rejouer la même capture avant et après
+un changement de capacité donne un écart à charge réaliste identique.
+
+    python replay.py /data/capture --speed 2 --output replay.json
+    python replay.py /data/capture --speed 2 --compare replay.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+import uuid
+
+import aiohttp
+
+from load_test import Histogram
+
+# Segments de chemin conservés tels quels ; les autres (identifiants) sont remplacés par {id}
+ROUTE_WORDS = {"api", "v1", "products", "stock", "customers", "cart", "orders", "add", "items", "clear",
+               "status", "reserve", "release", "confirm", "holds", "changes", "login", "batch"}
+
+REPORTED_PERCENTILES = (("p50", 50), ("p99", 99))
+
+
+def load_capture(paths):
+    """Entrées de toutes les captures (fichiers ou répertoires), triées par horodatage"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "capture-*.jsonl*")))
+        else:
+            files.append(path)
+    entries = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Dernière ligne incomplète d'une capture en cours d'écriture
+                    continue
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+def route_of(entry):
+    path = entry["path"].split("?", 1)[0]
+    segments = [segment if segment in ROUTE_WORDS else "{id}" for segment in path.strip("/").split("/")]
+    return f"{entry['method']} /{'/'.join(segments)}"
+
+
+class RouteStats:
+    __slots__ = ("replayed", "captured", "status_mismatches", "errors")
+
+    def __init__(self):
+        self.replayed = Histogram()
+        self.captured = Histogram()
+        self.status_mismatches = 0
+        self.errors = 0
+
+    def to_dict(self):
+        summary = {"requests": self.replayed.total, "status_mismatches": self.status_mismatches,
+                   "errors": self.errors}
+        for key, p in REPORTED_PERCENTILES:
+            summary[f"{key}_ms"] = self.replayed.percentile(p) / 1000
+            summary[f"captured_{key}_ms"] = self.captured.percentile(p) / 1000
+        summary["histogram"] = self.replayed.to_dict()
+        return summary
+
+
+async def replay(entries, args):
+    routes = {}
+    inflight = asyncio.Semaphore(args.max_inflight)
+    run_id = uuid.uuid4().hex[:8]
+    base_headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    connector = aiohttp.TCPConnector(limit=args.max_inflight)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def fire(entry, intended):
+            stats = routes.setdefault(route_of(entry), RouteStats())
+            stats.captured.record(entry["duration_ms"] * 1000)
+            headers = dict(base_headers, **entry.get("headers", {}))
+            if "Idempotency-Key" in headers:
+                # Même déduplication qu'à la capture, sans retomber sur les résultats d'origine
+                headers["Idempotency-Key"] = f"replay-{run_id}-{headers['Idempotency-Key']}"
+            try:
+                async with session.request(entry["method"], f"{args.base_url}{entry['path']}", headers=headers,
+                                           data=entry.get("body", "").encode()) as response:
+                    await response.read()
+                    if response.status != entry["status"]:
+                        stats.status_mismatches += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                stats.errors += 1
+            finally:
+                inflight.release()
+            stats.replayed.record((time.perf_counter() - intended) * 1e6)
+
+        tasks = []
+        start = time.perf_counter()
+        first_ts = entries[0]["ts"]
+        for entry in entries:
+            if args.speed > 0:
+                intended = start + (entry["ts"] - first_ts) / args.speed
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await inflight.acquire()
+            else:
+                await inflight.acquire()
+                intended = time.perf_counter()
+            tasks.append(asyncio.ensure_future(fire(entry, intended)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "meta": {"base_url": args.base_url, "speed": args.speed, "requests": len(entries),
+                 "captured_seconds": entries[-1]["ts"] - first_ts, "elapsed_seconds": elapsed},
+        "routes": {route: stats.to_dict() for route, stats in sorted(routes.items())},
+    }
+
+
+def print_report(results, reference):
+    """Latences par route ; la référence est la capture elle-même ou un rejeu précédent"""
+    meta = results["meta"]
+    print(f"{meta['requests']} requêtes ({meta['captured_seconds']:.1f} s capturées) rejouées en "
+          f"{meta['elapsed_seconds']:.1f} s sur {meta['base_url']}")
+    label = "précédent" if reference else "capture"
+    print(f"{'route':<36} {'n':>6} {label + ' p50':>14} {'p50':>8} {'écart':>7} "
+          f"{label + ' p99':>14} {'p99':>8} {'écart':>7} {'statut≠':>8}")
+    for route, current in results["routes"].items():
+        if reference:
+            before = reference["routes"].get(route)
+            if before is None:
+                continue
+            previous = {key: before[f"{key}_ms"] for key, _ in REPORTED_PERCENTILES}
+        else:
+            previous = {key: current[f"captured_{key}_ms"] for key, _ in REPORTED_PERCENTILES}
+        columns = []
+        for key, _ in REPORTED_PERCENTILES:
+            now = current[f"{key}_ms"]
+            delta = f"{(now / previous[key] - 1) * 100:+.0f}%" if previous[key] else "-"
+            columns.append(f"{previous[key]:>14.1f} {now:>8.1f} {delta:>7}")
+        print(f"{route:<36} {current['requests']:>6} {' '.join(columns)} "
+              f"{current['status_mismatches'] + current['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="fichiers capture-*.jsonl ou répertoire CAPTURE_DIR")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--speed", type=float, default=1.0, help="facteur d'accélération (0 = au plus vite)")
+    parser.add_argument("--max-inflight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30, help="délai maximum d'une requête (s)")
+    parser.add_argument("--token", help="jeton de session envoyé en Authorization (non capturé)")
+    parser.add_argument("--routes", help="expression régulière filtrant les routes rejouées")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--compare", help="résultats JSON d'un rejeu précédent servant de référence")
+    args = parser.parse_args()
+
+    entries = load_capture(args.captures)
+    if args.routes:
+        pattern = re.compile(args.routes)
+        entries = [entry for entry in entries if pattern.search(route_of(entry))]
+    if not entries:
+        parser.error("aucune requête dans la capture")
+
+    results = asyncio.run(replay(entries, args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    reference = None
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+    print_report(results, reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,57 +2,176 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import logging
 
+from common.logs import setup_logging
+from common.metrics import instrument_flask
+from common.stateserver import shared_state
+from common.tracing import trace_flask
+from reservations import ReservationError
+
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "stock", extra=lambda: state.metrics())
+trace_flask(app, "stock")
 
-logging.basicConfig(level=logging.INFO)
+setup_logging("stock")
 logger = logging.getLogger(__name__)
 
-# Base de données simulée pour le stock
-stock_db = {
-    "1": {"product_id": "1", "quantity": 50, "reserved": 0},
-    "2": {"product_id": "2", "quantity": 100, "reserved": 0},
-    "3": {"product_id": "3", "quantity": 75, "reserved": 0}
-}
+# Stock, réservations et flux de changements : objet local, ou processus partagé par les workers gunicorn
+state = shared_state("state:StockState")
+
+def json_body():
+    """Corps JSON de la requête s'il s'agit d'un objet, sinon {}"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def valid_quantity(quantity):
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+
+def parse_items(data):
+    """Agrège une liste [{product_id, quantity}] en {product_id: quantité totale}"""
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return None
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        product_id = str(item.get("product_id"))
+        quantity = item.get("quantity", 1)
+        if not valid_quantity(quantity):
+            return None
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+def parse_quantity(data):
+    """Quantité d'une réservation ou libération unitaire (1 par défaut), None si invalide"""
+    quantity = data.get("quantity", 1)
+    return quantity if valid_quantity(quantity) else None
+
+def parse_ttl(data):
+    """(valide, ttl) : durée de vie demandée pour la réservation, None pour la durée par défaut"""
+    ttl = data.get("ttl")
+    if ttl is None:
+        return True, None
+    if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl <= 0:
+        return False, None
+    return True, ttl
+
+def parse_confirm(data):
+    """Drapeau `confirm` de la réservation groupée (faux par défaut), None si invalide"""
+    confirm = data.get("confirm", False)
+    return confirm if isinstance(confirm, bool) else None
 
 @app.route('/stock/<product_id>', methods=['GET'])
 def get_stock(product_id):
-    logger.info(f"Vérification stock pour produit {product_id}")
-    stock = stock_db.get(product_id)
+    logger.info("Vérification stock pour produit %s", product_id)
+    stock = state.get_stock(product_id)
     if stock:
         return jsonify(stock)
     return jsonify({"error": "Stock not found"}), 404
 
+@app.route('/stock/changes', methods=['GET'])
+def get_stock_changes():
+    """Disponibilités modifiées depuis la version `since` (toutes si since=0), des plus récentes aux plus anciennes"""
+    try:
+        since = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid version"}), 400
+    return jsonify(state.changes(request.args.get("epoch"), since))
+
+@app.errorhandler(ReservationError)
+def handle_reservation_error(error):
+    body = {"error": error.message}
+    if error.product_id is not None:
+        body["product_id"] = error.product_id
+    return jsonify(body), error.status
+
 @app.route('/stock/<product_id>/reserve', methods=['POST'])
 def reserve_stock(product_id):
-    data = request.get_json()
-    quantity = data.get("quantity", 1)
+    data = json_body()
+    quantity = parse_quantity(data)
+    if quantity is None:
+        return jsonify({"error": "Invalid quantity"}), 400
+    valid, ttl = parse_ttl(data)
+    if not valid:
+        return jsonify({"error": "Invalid ttl"}), 400
     
-    if product_id in stock_db:
-        stock = stock_db[product_id]
-        if stock["quantity"] - stock["reserved"] >= quantity:
-            stock["reserved"] += quantity
-            logger.info(f"Réservation de {quantity} unités pour produit {product_id}")
-            return jsonify({"success": True, "reserved": quantity})
-        else:
-            return jsonify({"error": "Insufficient stock"}), 400
-    return jsonify({"error": "Product not found"}), 404
+    hold = state.reserve({product_id: quantity}, ttl=ttl)
+    logger.info("Réservation de %s unités pour produit %s", quantity, product_id)
+    return jsonify({"success": True, "reserved": quantity, "hold_id": hold["hold_id"],
+                    "expires_in": hold["expires_in"]})
 
 @app.route('/stock/<product_id>/release', methods=['POST'])
 def release_stock(product_id):
-    data = request.get_json()
-    quantity = data.get("quantity", 1)
+    """Libère une quantité réservée ; avec hold_id, libère exactement cette réservation"""
+    data = json_body()
+    if data.get("hold_id"):
+        hold = state.release_hold(str(data["hold_id"]))
+        logger.info("Réservation libérée: %s", data["hold_id"])
+        return jsonify({"success": True, "released": hold["items"]})
+    quantity = parse_quantity(data)
+    if quantity is None:
+        return jsonify({"error": "Invalid quantity"}), 400
+    
+    state.release({product_id: quantity})
+    logger.info("Libération de %s unités pour produit %s", quantity, product_id)
+    return jsonify({"success": True, "released": quantity})
+
+@app.route('/stock/reserve', methods=['POST'])
+def reserve_stock_batch():
+    """Réserve tous les produits de la liste, ou aucun ; la réservation expire si elle n'est pas
+    confirmée, sauf si elle est demandée déjà confirmée (`confirm`). `hold_id` optionnel : id
+    choisi par l'appelant, pour pouvoir libérer la réservation sans avoir reçu la réponse"""
+    data = json_body()
+    quantities = parse_items(data)
+    if quantities is None:
+        return jsonify({"error": "Invalid items"}), 400
+    valid, ttl = parse_ttl(data)
+    if not valid:
+        return jsonify({"error": "Invalid ttl"}), 400
+    confirm = parse_confirm(data)
+    if confirm is None:
+        return jsonify({"error": "Invalid confirm"}), 400
+    
+    hold_id = data.get("hold_id")
+    if hold_id is not None and (not isinstance(hold_id, str) or not hold_id):
+        return jsonify({"error": "Invalid hold_id"}), 400
     
-    if product_id in stock_db:
-        stock = stock_db[product_id]
-        stock["reserved"] = max(0, stock["reserved"] - quantity)
-        logger.info(f"Libération de {quantity} unités pour produit {product_id}")
-        return jsonify({"success": True, "released": quantity})
-    return jsonify({"error": "Product not found"}), 404
-
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return "# Metrics placeholder\nservice_up 1\n", 200, {'Content-Type': 'text/plain'}
+    hold = state.reserve(quantities, ttl=ttl, confirm=confirm, hold_id=hold_id)
+    logger.info("Réservation groupée de %s produits: %s", len(quantities), hold['hold_id'])
+    return jsonify({"success": True, "reserved": hold.pop("items"), **hold})
+
+@app.route('/stock/release', methods=['POST'])
+def release_stock_batch():
+    """Libère les quantités réservées de tous les produits de la liste (voir ReservationEngine.release)"""
+    data = json_body()
+    if data.get("hold_id"):
+        hold = state.release_hold(str(data["hold_id"]))
+        logger.info("Réservation libérée: %s", data["hold_id"])
+        return jsonify({"success": True, "released": hold["items"]})
+    quantities = parse_items(data)
+    if quantities is None:
+        return jsonify({"error": "Invalid items"}), 400
+    
+    state.release(quantities)
+    logger.info("Libération groupée de %s produits", len(quantities))
+    return jsonify({"success": True, "released": [
+        {"product_id": product_id, "quantity": quantity} for product_id, quantity in quantities.items()
+    ]})
+
+@app.route('/stock/holds/<hold_id>/confirm', methods=['POST'])
+def confirm_hold(hold_id):
+    """Rend une réservation permanente : elle n'expirera plus"""
+    hold = state.confirm(hold_id)
+    logger.info("Réservation confirmée: %s", hold_id)
+    return jsonify({"success": True, **hold})
+
+@app.route('/stock/holds/<hold_id>/release', methods=['POST'])
+def release_hold(hold_id):
+    """Libère exactement les quantités prises par une réservation"""
+    hold = state.release_hold(hold_id)
+    logger.info("Réservation libérée: %s", hold_id)
+    return jsonify({"success": True, "released": hold["items"]})
 
 @app.route('/health', methods=['GET'])
 def health_check():
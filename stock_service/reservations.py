@@ -0,0 +1,287 @@
+import heapq
+import threading
+import time
+import uuid
+import zlib
+
+
+class ReservationError(Exception):
+    """Réservation impossible ; `status` est le code HTTP à renvoyer"""
+
+    def __init__(self, message, status, product_id=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.product_id = product_id
+
+    def __reduce__(self):
+        # Sérialisable tel quel : l'erreur remonte du processus d'état partagé vers le worker
+        return ReservationError, (self.message, self.status, self.product_id)
+
+
+class Hold:
+    """Réservation de plusieurs produits ; expires_at vaut None une fois confirmée"""
+
+    __slots__ = ("id", "items", "expires_at")
+
+    def __init__(self, items, expires_at, hold_id=None):
+        self.id = hold_id or str(uuid.uuid4())
+        self.items = items
+        self.expires_at = expires_at
+
+    def to_dict(self):
+        return {
+            "hold_id": self.id,
+            "items": [{"product_id": product_id, "quantity": quantity}
+                      for product_id, quantity in self.items.items()],
+            "expires_in": None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+        }
+
+    def to_record(self):
+        """Forme persistée : l'échéance en temps Unix reste valable après un redémarrage"""
+        expires_at = None if self.expires_at is None else time.time() + self.expires_at - time.monotonic()
+        return {"items": self.items, "expires_at": expires_at}
+
+
+class ReservationEngine:
+    """Réservations de stock thread-safe avec verrous par bande et réservations expirantes
+
+    Chaque produit est protégé par l'un des `stripes` verrous : des réservations sur des produits
+    différents s'exécutent en parallèle. Une réservation multi-produits prend ses verrous dans un
+    ordre fixe pour éviter les interblocages. Les réservations non confirmées expirent après leur
+    TTL ; un tas ordonné par échéance permet au thread de nettoyage de dormir jusqu'à la prochaine
+    expiration au lieu de parcourir toutes les réservations. Les réservations sont aussi indexées
+    par produit, pour que release() ne parcoure que celles des produits libérés.
+    """
+
+    def __init__(self, stock_db, stripes=64, default_ttl=900.0, on_change=None, on_hold_change=None,
+                 on_commit=None):
+        self.stock_db = stock_db
+        self.default_ttl = default_ttl
+        # Appelé sous le verrou du produit après chaque modification (journalisation, etc.)
+        self.on_change = on_change
+        # Appelé avec (hold_id, Hold) à la création et à la confirmation, (hold_id, None) à la libération
+        self.on_hold_change = on_hold_change
+        # Appelé hors de tout verrou à la fin de chaque opération (attente de l'écriture sur disque) :
+        # on_change et on_hold_change ne doivent pas bloquer, ils sont appelés sous les verrous
+        self.on_commit = on_commit
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._holds = {}
+        # {product_id: {hold_id}} : réservations qui portent encore une quantité de ce produit
+        self._holds_by_product = {}
+        self._holds_lock = threading.Lock()
+        self._expiry_heap = []
+        self._expiry_cond = threading.Condition()
+        self.expired_total = 0
+        self._reaper = threading.Thread(target=self._reap_expired, name="hold-reaper", daemon=True)
+        self._reaper.start()
+
+    def _stripe_ids(self, product_ids):
+        return sorted({zlib.crc32(product_id.encode()) % len(self._stripes) for product_id in product_ids})
+
+    def _locked(self, product_ids):
+        return _MultiLock([self._stripes[i] for i in self._stripe_ids(product_ids)])
+
+    def reserve(self, quantities, ttl=None, confirm=False, hold_id=None):
+        """Réserve toutes les quantités {product_id: quantité} ou aucune ; renvoie la Hold créée
+
+        Avec confirm, la réservation est créée déjà confirmée (elle n'expirera pas). Un hold_id
+        choisi par l'appelant lui permet de libérer la réservation même s'il n'a pas reçu la réponse.
+        """
+        if hold_id is not None:
+            with self._holds_lock:
+                if hold_id in self._holds:
+                    raise ReservationError("Hold already exists", 409)
+        with self._locked(quantities):
+            for product_id, quantity in quantities.items():
+                stock = self.stock_db.get(product_id)
+                if stock is None:
+                    raise ReservationError("Product not found", 404, product_id)
+                if stock["quantity"] - stock["reserved"] < quantity:
+                    raise ReservationError("Insufficient stock", 400, product_id)
+            for product_id, quantity in quantities.items():
+                self.stock_db[product_id]["reserved"] += quantity
+                self._changed(product_id)
+
+        hold = Hold(dict(quantities), None if confirm else time.monotonic() + (ttl or self.default_ttl), hold_id)
+        self._add_hold(hold)
+        self._hold_changed(hold.id, hold)
+        self._commit()
+        return hold
+
+    def restore_holds(self, records):
+        """Recharge des réservations persistées {hold_id: Hold.to_record()} (les quantités
+        réservées correspondantes sont déjà comptées dans stock_db)"""
+        now_wall, now = time.time(), time.monotonic()
+        for hold_id, record in records.items():
+            expires_at = None if record["expires_at"] is None else now + record["expires_at"] - now_wall
+            self._add_hold(Hold(dict(record["items"]), expires_at, hold_id))
+
+    def _add_hold(self, hold):
+        with self._holds_lock:
+            self._holds[hold.id] = hold
+            self._index(hold.id, hold.items)
+        if hold.expires_at is None:
+            return
+        with self._expiry_cond:
+            heapq.heappush(self._expiry_heap, (hold.expires_at, hold.id))
+            if self._expiry_heap[0][1] == hold.id:
+                self._expiry_cond.notify()
+
+    def confirm(self, hold_id):
+        """Rend une réservation permanente (commande validée) ; elle n'expirera plus"""
+        with self._holds_lock:
+            hold = self._holds.get(hold_id)
+            if hold is None:
+                raise ReservationError("Hold not found", 404)
+            hold.expires_at = None
+        self._hold_changed(hold_id, hold)
+        self._commit()
+        return hold
+
+    def release_hold(self, hold_id):
+        """Libère exactement ce qu'une réservation avait pris"""
+        with self._holds_lock:
+            hold = self._holds.pop(hold_id, None)
+            if hold is not None:
+                self._unindex(hold_id, hold.items)
+        if hold is None:
+            raise ReservationError("Hold not found", 404)
+        self._hold_changed(hold_id, None)
+        self._release(hold.items)
+        self._commit()
+        return hold
+
+    def release(self, quantities):
+        """Libère des quantités {product_id: quantité} sans connaître la réservation (API historique)
+
+        Toute quantité réservée appartient à une réservation : les quantités sont retirées des
+        réservations qui les couvrent (d'abord celles en attente, les plus récentes en premier,
+        puis les confirmées), pour que l'expiration ou la libération de ces réservations ne
+        rende pas une seconde fois le même stock. Tout ou rien : si les réservations ne couvrent
+        pas une quantité demandée, rien n'est libéré.
+        """
+        with self._holds_lock:
+            missing = [product_id for product_id in quantities if product_id not in self.stock_db]
+            if missing:
+                raise ReservationError("Product not found", 404, missing[0])
+            hold_ids = set()
+            for product_id in quantities:
+                hold_ids.update(self._holds_by_product.get(product_id, ()))
+            holds = sorted((self._holds[hold_id] for hold_id in hold_ids),
+                           key=lambda hold: (hold.expires_at is None, -(hold.expires_at or 0.0)))
+            remaining = dict(quantities)
+            updated = {}
+            for hold in holds:
+                items = None
+                for product_id, quantity in hold.items.items():
+                    taken = min(quantity, remaining.get(product_id, 0))
+                    if taken:
+                        items = items or dict(hold.items)
+                        items[product_id] -= taken
+                        remaining[product_id] -= taken
+                if items is not None:
+                    updated[hold.id] = {product_id: quantity for product_id, quantity in items.items() if quantity}
+            uncovered = [product_id for product_id, quantity in remaining.items() if quantity > 0]
+            if uncovered:
+                raise ReservationError("Quantity not reserved", 409, uncovered[0])
+            changes = []
+            for hold_id, items in updated.items():
+                hold = self._holds[hold_id]
+                self._unindex(hold_id, [product_id for product_id in hold.items if product_id not in items])
+                if items:
+                    hold.items = items
+                    changes.append((hold_id, hold))
+                else:
+                    del self._holds[hold_id]
+                    changes.append((hold_id, None))
+        for hold_id, hold in changes:
+            self._hold_changed(hold_id, hold)
+        self._release(quantities)
+        self._commit()
+
+    def _index(self, hold_id, product_ids):
+        """Sous self._holds_lock"""
+        for product_id in product_ids:
+            self._holds_by_product.setdefault(product_id, set()).add(hold_id)
+
+    def _unindex(self, hold_id, product_ids):
+        """Sous self._holds_lock"""
+        for product_id in product_ids:
+            hold_ids = self._holds_by_product.get(product_id)
+            if hold_ids is not None:
+                hold_ids.discard(hold_id)
+                if not hold_ids:
+                    del self._holds_by_product[product_id]
+
+    def _release(self, quantities):
+        """Rend au stock des quantités dont la réservation vient d'être retirée"""
+        with self._locked(quantities):
+            missing = [product_id for product_id in quantities if product_id not in self.stock_db]
+            if missing:
+                raise ReservationError("Product not found", 404, missing[0])
+            for product_id, quantity in quantities.items():
+                stock = self.stock_db[product_id]
+                stock["reserved"] = max(0, stock["reserved"] - quantity)
+                self._changed(product_id)
+
+    def _changed(self, product_id):
+        if self.on_change is not None:
+            self.on_change(product_id)
+
+    def _hold_changed(self, hold_id, hold):
+        if self.on_hold_change is not None:
+            self.on_hold_change(hold_id, hold)
+
+    def _commit(self):
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def _reap_expired(self):
+        while True:
+            with self._expiry_cond:
+                while not self._expiry_heap or self._expiry_heap[0][0] > time.monotonic():
+                    timeout = self._expiry_heap[0][0] - time.monotonic() if self._expiry_heap else None
+                    self._expiry_cond.wait(timeout)
+                expires_at, hold_id = heapq.heappop(self._expiry_heap)
+            with self._holds_lock:
+                hold = self._holds.get(hold_id)
+                # Entrée périmée : réservation déjà libérée ou confirmée entre-temps
+                if hold is None or hold.expires_at != expires_at:
+                    continue
+                del self._holds[hold_id]
+                self._unindex(hold_id, hold.items)
+            self._hold_changed(hold_id, None)
+            try:
+                self._release(hold.items)
+            except ReservationError:
+                continue
+            finally:
+                self._commit()
+            self.expired_total += 1
+
+    def stats(self):
+        with self._holds_lock:
+            pending = sum(1 for hold in self._holds.values() if hold.expires_at is not None)
+            return {
+                "holds": len(self._holds),
+                "pending_holds": pending,
+                "expired_total": self.expired_total
+            }
+
+
+class _MultiLock:
+    """Prend une liste de verrous dans l'ordre donné et les rend dans l'ordre inverse"""
+
+    __slots__ = ("locks",)
+
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
@@ -0,0 +1,102 @@
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+
+from common.metrics import stats_lines
+from common.storage import open_store, prometheus_lines as storage_metrics
+from reservations import ReservationEngine
+
+# Durée (secondes) avant libération automatique d'une réservation non confirmée
+HOLD_TTL = 900
+
+
+class StockState:
+    """État du service stock : quantités, réservations et flux de changements
+
+    Partagé par tous les workers via common.stateserver : les méthodes prennent et renvoient
+    des valeurs simples (dicts JSON), les erreurs métier sont des ReservationError.
+    """
+
+    def __init__(self):
+        # Base de données simulée pour le stock
+        self.stock_db = {
+            "1": {"product_id": "1", "quantity": 50, "reserved": 0},
+            "2": {"product_id": "2", "quantity": 100, "reserved": 0},
+            "3": {"product_id": "3", "quantity": 75, "reserved": 0}
+        }
+
+        # Stock et réservations en cours survivent aux redémarrages (journal sous DATA_DIR)
+        self.stock_store = open_store("stock", self.stock_db)
+        self.holds_db = {}
+        self.holds_store = open_store("holds", self.holds_db)
+
+        # Flux de changements pour les vues locales des autres services (disponibilités du panier) :
+        # produits ordonnés du moins au plus récemment modifié, avec le numéro de version de leur dernier changement
+        # L'époque change à chaque démarrage : une vue construite sur une époque précédente est renvoyée en entier
+        self.epoch = uuid.uuid4().hex
+        self._versions = itertools.count(1)
+        self._changed = OrderedDict((product_id, 0) for product_id in self.stock_db)
+        self._changes_lock = threading.Lock()
+        self.version = 0
+
+        self.reservations = ReservationEngine(self.stock_db, default_ttl=HOLD_TTL, on_change=self._record_change,
+                                              on_hold_change=self._record_hold_change, on_commit=self._commit)
+        self.reservations.restore_holds(self.holds_db)
+
+    def _record_change(self, product_id):
+        # Appelé sous le verrou du produit : journalisé sans attendre le disque (voir _commit)
+        self.stock_store.put(product_id, self.stock_db[product_id], wait=False)
+        with self._changes_lock:
+            self.version = next(self._versions)
+            self._changed[product_id] = self.version
+            self._changed.move_to_end(product_id)
+
+    def _record_hold_change(self, hold_id, hold):
+        if hold is None:
+            self.holds_store.delete(hold_id, wait=False)
+        else:
+            self.holds_store.put(hold_id, hold.to_record(), wait=False)
+
+    def _commit(self):
+        # Une attente par journal et par opération, hors des verrous : les opérations concurrentes partagent le fsync
+        self.stock_store.sync()
+        self.holds_store.sync()
+
+    def get_stock(self, product_id):
+        stock = self.stock_db.get(product_id)
+        return dict(stock) if stock is not None else None
+
+    def changes(self, epoch, since):
+        """Disponibilités modifiées depuis la version `since` (toutes si since=0 ou autre époque)"""
+        if epoch != self.epoch:
+            since = 0
+        with self._changes_lock:
+            version = self.version
+            product_ids = []
+            for product_id in reversed(self._changed):
+                if since and self._changed[product_id] <= since:
+                    break
+                product_ids.append(product_id)
+        # Lecture sans verrou de bande : une valeur en retard sera corrigée au prochain changement
+        return {"epoch": self.epoch, "version": version, "full": since == 0, "items": [
+            {"product_id": product_id,
+             "available": self.stock_db[product_id]["quantity"] - self.stock_db[product_id]["reserved"]}
+            for product_id in product_ids
+        ]}
+
+    def reserve(self, quantities, ttl=None, confirm=False, hold_id=None):
+        return self.reservations.reserve(quantities, ttl=ttl, confirm=confirm, hold_id=hold_id).to_dict()
+
+    def release(self, quantities):
+        self.reservations.release(quantities)
+
+    def confirm(self, hold_id):
+        return self.reservations.confirm(hold_id).to_dict()
+
+    def release_hold(self, hold_id):
+        return self.reservations.release_hold(hold_id).to_dict()
+
+    def metrics(self):
+        return stats_lines("stock", [({}, self.reservations.stats())]) + \
+            storage_metrics(self.stock_store, self.holds_store)
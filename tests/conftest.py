@@ -0,0 +1,72 @@
+"""Outils communs aux tests : chargement d'un service et serveur HTTP local
+
+Les services importent leurs modules par nom court (`from state import OrderState`) : chaque
+chargement retire ces noms de sys.modules, pour que deux services (et deux chargements du
+même service) ne partagent pas leur état.
+"""
+import importlib
+import os
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seuls les warnings et erreurs des services s'affichent pendant les tests
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Secret propre aux tests : les services d'authentification refusent de démarrer sans secret
+os.environ.setdefault("AUTH_TOKEN_SECRET", "tests-only-secret")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SERVICE_DIRS = ["gateway", "cart_service", "customers_service", "order_service", "products_service",
+                "stock_service"]
+LOCAL_MODULES = {name[:-3] for directory in SERVICE_DIRS
+                 for name in os.listdir(os.path.join(ROOT, directory)) if name.endswith(".py")}
+
+
+def _forget_local_modules():
+    for name in LOCAL_MODULES:
+        sys.modules.pop(name, None)
+
+
+def load_service(directory, module="app"):
+    """Importe `module` du répertoire d'un service, avec ses propres modules locaux"""
+    path = os.path.join(ROOT, directory)
+    _forget_local_modules()
+    sys.path.insert(0, path)
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(path)
+        _forget_local_modules()
+
+
+class LiveServer:
+    """Application WSGI servie sur un port libre de 127.0.0.1, dans un thread"""
+
+    def __init__(self, app):
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join(timeout=5)
+
+
+@pytest.fixture
+def serve():
+    """serve(app) démarre un serveur et renvoie son URL ; arrêtés à la fin du test"""
+    servers = []
+
+    def start(app):
+        server = LiveServer(app)
+        servers.append(server)
+        return server.url
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import load_service
+
+admission = load_service("gateway", "admission")
+
+
+def controller(max_in_flight=4, client_rate=0, service_rates=None):
+    return admission.AdmissionController(
+        priorities=[("POST", r"^/api/v1/orders$", "low")], shares={"high": 1.0, "normal": 0.8, "low": 0.5},
+        client_rate=client_rate, client_burst=client_rate, service_rates=service_rates or {},
+        concurrency_limits={}, min_limit=1, max_in_flight=max_in_flight)
+
+
+def test_gateway_limit_keeps_room_for_higher_priorities():
+    admit = controller(max_in_flight=4)
+    assert admit.priority_for("POST", "/api/v1/orders") == "low"
+    assert [admit.acquire("orders", "low") for _ in range(3)] == [True, True, False]
+    assert admit.acquire("products", "high")
+    admit.release("products", 0.01, True)
+    admit.release("orders", 0.01, True)
+    assert admit.acquire("orders", "low")
+
+
+def test_client_rate_limit_announces_retry_delay():
+    admit = controller(client_rate=2)
+    assert admit.check_rate("client", "products") == 0
+    assert admit.check_rate("client", "products") == 0
+    assert admit.check_rate("client", "products") > 0
+    assert admit.check_rate("other", "products") == 0
+
+
+def test_adaptive_limit_backs_off_on_errors():
+    limit = admission.AdaptiveLimit(initial=10, min_limit=2, max_limit=100)
+    for _ in range(20):
+        assert limit.try_acquire()
+        limit.release(0.01, success=False)
+    assert limit.limit == 2
+
+
+@pytest.mark.parametrize("env, expected", [
+    ({}, 64),
+    ({"SERVER_THREADS": "8"}, 8),
+    ({"SERVER_THREADS": "8", "ADMISSION_MAX_INFLIGHT": "32"}, 32),
+])
+def test_max_in_flight_default_depends_on_the_server(monkeypatch, env, expected):
+    for name in ("SERVER_THREADS", "ADMISSION_MAX_INFLIGHT"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    config = load_service("gateway", "config")
+    assert config.ADMISSION_MAX_INFLIGHT == expected
+    assert config.DEV_SERVER_MAX_INFLIGHT == 64
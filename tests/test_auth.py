@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from flask import Flask, jsonify, request
+
+from common import tokens
+from conftest import load_service
+
+auth = load_service("gateway", "auth")
+
+
+def test_token_round_trip_and_rejections():
+    token = tokens.issue_token("c1", ttl=60)
+    assert tokens.verify_token(token)["sub"] == "c1"
+    assert tokens.verify_token(tokens.issue_token("c1", ttl=-1)) is None
+    assert tokens.verify_token(tokens.issue_token("c1", ttl=60, secret=b"other")) is None
+    assert tokens.verify_token("garbage") is None
+    payload, signature = token.split(".")
+    assert tokens.verify_token(f"{payload[:-2]}xx.{signature}") is None
+
+
+def test_missing_secret_refuses_to_start(monkeypatch):
+    monkeypatch.delenv("AUTH_TOKEN_SECRET")
+    with pytest.raises(RuntimeError):
+        tokens._load_secret()
+    monkeypatch.setenv("AUTH_TOKEN_SECRET", "s3cret")
+    assert tokens._load_secret() == b"s3cret"
+
+
+def test_verifier_caches_valid_tokens_only():
+    verifier = auth.TokenVerifier(max_entries=2)
+    token = tokens.issue_token("c1", ttl=60)
+    assert verifier.customer_id(token) == "c1"
+    assert verifier.customer_id(token) == "c1"
+    assert verifier.customer_id("garbage") is None
+    assert verifier.stats() == {"cached_tokens": 1, "cache_hits_total": 1, "cache_misses_total": 2,
+                                "rejected_total": 1}
+
+
+def test_bearer_token_parsing():
+    assert auth.bearer_token("Bearer abc") == "abc"
+    assert auth.bearer_token("bearer abc") == "abc"
+    assert auth.bearer_token("Basic abc") is None
+    assert auth.bearer_token(None) is None
+
+
+def test_gateway_forwards_verified_identity_only(serve, monkeypatch):
+    cart = Flask("cart")
+
+    @cart.route("/cart/<customer_id>")
+    def get_cart(customer_id):
+        return jsonify({"customer": request.headers.get(auth.CUSTOMER_ID_HEADER)})
+
+    monkeypatch.setenv("GATEWAY_SERVICES", json.dumps({"cart": [serve(cart)]}))
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    client = load_service("gateway").app.test_client()
+
+    token = tokens.issue_token("c1", ttl=60)
+    response = client.get("/api/v1/cart/c1", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json() == {"customer": "c1"}
+    assert client.get("/api/v1/cart/c1", headers={"Authorization": "Bearer forged"}).status_code == 401
+    # Un en-tête d'identité envoyé par le client n'est jamais relayé tel quel
+    response = client.get("/api/v1/cart/c1", headers={auth.CUSTOMER_ID_HEADER: "c2"})
+    assert response.get_json() == {"customer": None}
@@ -0,0 +1,43 @@
+from conftest import load_service
+
+balancer = load_service("gateway", "balancer")
+
+SERVICES = {"products": ["http://a", "http://b"]}
+
+
+def test_least_outstanding_picks_the_idle_instance():
+    lb = balancer.LoadBalancer(SERVICES, {"products": "least_outstanding"})
+    first = lb.acquire("products")
+    second = lb.acquire("products")
+    assert {first, second} == {"http://a", "http://b"}
+    lb.release(first, 0.01, True)
+    assert lb.acquire("products") == first
+
+
+def test_p2c_ewma_prefers_the_faster_instance():
+    lb = balancer.LoadBalancer(SERVICES, {"products": "p2c_ewma"})
+    for url, latency in (("http://a", 0.5), ("http://b", 0.01)):
+        assert lb.acquire("products", exclude=[u for u in SERVICES["products"] if u != url]) == url
+        lb.release(url, latency, True)
+    picks = []
+    for _ in range(20):
+        url = lb.acquire("products")
+        picks.append(url)
+        lb.cancel(url)
+    assert set(picks) == {"http://b"}
+
+
+def test_failing_instance_is_ejected_then_used_as_last_resort():
+    lb = balancer.LoadBalancer(SERVICES, {"products": "round_robin"})
+    for _ in range(balancer.EJECT_AFTER):
+        lb.release(lb.acquire("products", exclude=["http://b"]), 0.01, False)
+    assert {lb.acquire("products") for _ in range(4)} == {"http://b"}
+    # Seule instance restante : tentée malgré l'éjection
+    assert lb.acquire("products", exclude=["http://b"]) == "http://a"
+
+
+def test_unhealthy_instance_is_skipped():
+    lb = balancer.LoadBalancer(SERVICES, {"products": "round_robin"})
+    lb.set_healthy("http://a", False)
+    assert {lb.acquire("products") for _ in range(4)} == {"http://b"}
+    assert lb.acquire("products", exclude=["http://a", "http://b"]) is None
@@ -0,0 +1,77 @@
+import json
+import time
+
+from flask import Flask, jsonify
+
+from conftest import load_service
+
+cache = load_service("gateway", "cache")
+
+HEADERS = [("Content-Type", "application/json")]
+
+
+def test_entries_expire_after_their_ttl():
+    responses = cache.ResponseCache([(r"^/api/v1/products/[^/]+$", 30.0)], 1024)
+    assert responses.ttl_for("/api/v1/products/1") == 30.0
+    assert responses.ttl_for("/api/v1/orders") is None
+
+    responses.put("/api/v1/products/1?", b"{}", 200, HEADERS, 0.05)
+    assert responses.get("/api/v1/products/1?").body == b"{}"
+    time.sleep(0.06)
+    assert responses.get("/api/v1/products/1?") is None
+
+
+def test_least_recently_used_entry_is_evicted_when_full():
+    responses = cache.ResponseCache([], 200)
+    for key in ("a", "b"):
+        responses.put(key, b"x" * 60, 200, HEADERS, 30)
+    responses.get("a")
+    responses.put("c", b"x" * 60, 200, HEADERS, 30)
+    assert responses.get("b") is None
+    assert responses.get("a") is not None and responses.get("c") is not None
+    assert responses.current_bytes <= 200
+
+
+def test_writes_invalidate_the_resource_prefix():
+    responses = cache.ResponseCache([], 1024)
+    responses.put("/api/v1/products?", b"[]", 200, HEADERS, 30)
+    responses.put("/api/v1/products/1?", b"{}", 200, HEADERS, 30)
+    responses.put("/api/v1/stock/1?", b"{}", 200, HEADERS, 30)
+    responses.invalidate_prefix("/api/v1/products")
+    assert responses.get("/api/v1/products?") is None and responses.get("/api/v1/products/1?") is None
+    assert responses.get("/api/v1/stock/1?") is not None
+
+
+def test_etag_matching():
+    entry = cache.CacheEntry(b"{}", 200, HEADERS, 30)
+    assert cache.etag_matches(entry.etag, entry.etag)
+    assert cache.etag_matches(f'"other", W/{entry.etag}', entry.etag)
+    assert cache.etag_matches("*", entry.etag)
+    assert not cache.etag_matches('"other"', entry.etag)
+    assert not cache.etag_matches(None, entry.etag)
+
+
+def test_gateway_serves_catalog_reads_from_cache_until_a_write(serve, monkeypatch):
+    calls = []
+    products = Flask("products")
+
+    @products.route("/products/<product_id>", methods=["GET"])
+    def get_product(product_id):
+        calls.append(product_id)
+        return jsonify({"id": product_id})
+
+    @products.route("/products", methods=["POST"])
+    def create_product():
+        return jsonify({"id": "2"}), 201
+
+    monkeypatch.setenv("GATEWAY_SERVICES", json.dumps({"products": [serve(products)]}))
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    client = load_service("gateway").app.test_client()
+
+    first = client.get("/api/v1/products/1")
+    second = client.get("/api/v1/products/1")
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert client.get("/api/v1/products/1", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.post("/api/v1/products", json={"name": "x"}).status_code == 201
+    assert client.get("/api/v1/products/1").headers["X-Cache"] == "MISS"
+    assert calls == ["1", "1"]
@@ -0,0 +1,60 @@
+import json
+import time
+
+from conftest import load_service
+
+import replay
+
+capture = load_service("gateway", "capture")
+
+
+def record(traffic, body=b"", headers=None, path="/api/v1/customers", query=""):
+    traffic.record("customers", "POST", path, query, headers or {}, body, 201, 0.0123)
+    return traffic._queue.get_nowait()
+
+
+def test_redact_masks_passwords_on_each_ndjson_line():
+    body = '{"email": "a@x.io", "password": "secret"}\nnot json "password"\n{"email": "b@x.io"}'
+    lines = capture.redact(body).split("\n")
+    assert json.loads(lines[0]) == {"email": "a@x.io", "password": "<redacted>"}
+    assert lines[1] == "<redacted>"
+    assert json.loads(lines[2]) == {"email": "b@x.io"}
+
+
+def test_record_keeps_replay_headers_and_never_the_token(tmp_path):
+    traffic = capture.TrafficCapture(str(tmp_path))
+    entry = record(traffic, b'{"password": "secret"}', query="page=2",
+                   headers={"Authorization": "Bearer abc", "Content-Type": "application/json",
+                            "Idempotency-Key": "k1"})
+    assert entry["path"] == "/api/v1/customers?page=2"
+    assert entry["headers"] == {"Content-Type": "application/json", "Idempotency-Key": "k1"}
+    assert json.loads(entry["body"]) == {"password": "<redacted>"}
+    assert entry["duration_ms"] == 12.3
+
+
+def test_large_body_is_replaced_by_its_size(tmp_path):
+    traffic = capture.TrafficCapture(str(tmp_path), max_body=4)
+    entry = record(traffic, b"12345")
+    assert "body" not in entry and entry["body_truncated"] == 5
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    traffic = capture.TrafficCapture(str(tmp_path), queue_size=1)
+    for _ in range(3):
+        traffic.record("stock", "GET", "/api/v1/stock/1", "", {}, b"", 200, 0.001)
+    assert traffic.stats()["recorded"] == 1 and traffic.stats()["dropped"] == 2
+
+
+def test_written_capture_is_replayable(tmp_path):
+    traffic = capture.TrafficCapture(str(tmp_path))
+    traffic.start()
+    traffic.record("orders", "GET", "/api/v1/orders/42", "", {}, b"", 200, 0.002)
+    traffic.record("stock", "POST", "/api/v1/stock/7/reserve", "", {}, b"{}", 200, 0.003)
+    deadline = time.monotonic() + 5
+    entries = []
+    while len(entries) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+        entries = replay.load_capture([str(tmp_path)])
+    assert [replay.route_of(entry) for entry in entries] == [
+        "GET /api/v1/orders/{id}", "POST /api/v1/stock/{id}/reserve"
+    ]
@@ -0,0 +1,117 @@
+import functools
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from conftest import load_service
+
+
+@pytest.fixture
+def cart_state(tmp_path, monkeypatch):
+    state = load_service("cart_service", "state")
+    monkeypatch.setattr(state, "open_store", functools.partial(state.open_store, directory=str(tmp_path)))
+    monkeypatch.setattr(state, "STOCK_SERVICE_URL", "http://127.0.0.1:9")
+    carts = state.CartState()
+    carts.stock_view.stop()
+    carts.stock_view.available = {"1": 5}
+    carts.stock_view.synced_at = time.monotonic()
+    return state, carts
+
+
+def test_rejected_add_does_not_create_the_cart(cart_state):
+    state, carts = cart_state
+    cart, rejected = carts.add_items("c1", {"1": 6})
+    assert cart is None and rejected == ("1", "Insufficient stock")
+    assert "c1" not in carts.carts_db
+
+
+def test_cart_is_persisted_as_returned(cart_state):
+    state, carts = cart_state
+    carts.add_items("c1", {"1": 2})
+    cart, _ = carts.add_items("c1", {"1": 1})
+    assert cart["items"] == [{"product_id": "1", "quantity": 3}]
+
+    # Le panier renvoyé est une copie : le modifier ne change ni l'état ni le journal
+    cart["items"].clear()
+    assert carts.get("c1")["items"] == [{"product_id": "1", "quantity": 3}]
+    reloaded = state.CartState()
+    reloaded.stock_view.stop()
+    assert reloaded.get("c1")["items"] == [{"product_id": "1", "quantity": 3}]
+
+
+def test_fetch_prices_rotates_products_instances(serve, monkeypatch):
+    hits = []
+
+    def products_instance(name):
+        app = Flask(name)
+
+        @app.route("/products")
+        def products():
+            hits.append(name)
+            return jsonify({"products": [{"id": product_id, "price": 1.0}
+                                         for product_id in request.args["ids"].split(",")],
+                            "missing": []})
+        return serve(app)
+
+    app = load_service("cart_service")
+    monkeypatch.setattr(app, "PRODUCTS_SERVICE_URLS", [products_instance("a"), products_instance("b")])
+    for _ in range(4):
+        assert app.fetch_prices(["1"]) == {"1": 1.0}
+    assert sorted(hits) == ["a", "a", "b", "b"]
+
+    # Une instance en panne : l'autre répond
+    monkeypatch.setattr(app, "PRODUCTS_SERVICE_URLS", ["http://127.0.0.1:9", app.PRODUCTS_SERVICE_URLS[1]])
+    for _ in range(2):
+        assert app.fetch_prices(["1"]) == {"1": 1.0}
+
+
+class FakeChanges:
+    """Réponses successives de GET /stock/changes, et les paramètres reçus"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, epoch, since):
+        self.calls.append((epoch, since))
+        return self.responses.pop(0)
+
+
+def test_stock_view_applies_full_then_incremental_changes():
+    availability = load_service("cart_service", "availability")
+    fetch = FakeChanges(
+        {"full": True, "epoch": "e1", "version": 3, "items": [{"product_id": "1", "available": 5},
+                                                               {"product_id": "2", "available": 1}]},
+        {"full": False, "epoch": "e1", "version": 4, "items": [{"product_id": "2", "available": 0}]},
+        {"full": True, "epoch": "e2", "version": 1, "items": [{"product_id": "3", "available": 2}]},
+    )
+    view = availability.StockView(fetch)
+    view.refresh()
+    view.refresh()
+    assert view.available == {"1": 5, "2": 0}
+    assert view.check({"1": 5}) is None
+    assert view.check({"2": 1}) == ("2", "Insufficient stock")
+
+    # Nouvelle époque (stock redémarré) : la vue est remplacée, pas complétée
+    view.refresh()
+    assert fetch.calls == [(None, 0), ("e1", 3), ("e1", 4)]
+    assert view.check({"1": 1}) == ("1", "Product not available")
+
+
+def test_stale_stock_view_lets_adds_through():
+    availability = load_service("cart_service", "availability")
+    view = availability.StockView(FakeChanges(), max_staleness=10.0)
+    assert view.check({"1": 1}) is None
+
+    view.available = {}
+    view.synced_at = time.monotonic() - 11
+    assert view.check({"1": 1}) is None
+    assert view.stats()["unchecked_adds_total"] == 2
+
+
+@pytest.mark.parametrize("quantity", [True, False, 0, -1, 1.5, "2"])
+def test_invalid_quantities_are_rejected(quantity):
+    app = load_service("cart_service")
+    assert app.parse_items([{"product_id": "1", "quantity": quantity}]) is None
+    assert app.parse_items([{"product_id": "1", "quantity": 2}, {"product_id": "1"}]) == {"1": 3}
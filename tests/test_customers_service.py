@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from common import tokens
+from conftest import load_service
+
+
+@pytest.fixture
+def client():
+    return load_service("customers_service").app.test_client()
+
+
+def test_emails_are_unique_regardless_of_case(client):
+    body = {"email": "Alice@Example.com", "password": "secret"}
+    assert client.post("/customers", json=body).status_code == 201
+    response = client.post("/customers", json={"email": " alice@example.COM ", "password": "other"})
+    assert response.status_code == 409
+
+
+def test_login_finds_the_account_by_normalised_email_and_issues_a_token(client):
+    customer_id = client.post("/customers", json={"email": "bob@example.com", "password": "pw"}).get_json()["id"]
+
+    response = client.post("/customers/login", json={"email": "BOB@example.com", "password": "pw"})
+    assert response.status_code == 200
+    assert tokens.verify_token(response.get_json()["token"])["sub"] == customer_id
+    assert client.post("/customers/login", json={"email": "bob@example.com", "password": "bad"}).status_code == 401
+    assert client.post("/customers/login", json={"email": "nobody@example.com", "password": "pw"}).status_code == 401
+
+
+def test_batch_import_counts_created_duplicates_and_invalid_lines(client):
+    lines = [json.dumps({"email": f"user{i}@example.com"}) for i in range(3)]
+    lines += [json.dumps({"email": "USER0@example.com"}), "not json", json.dumps({"name": "no email"}), ""]
+    response = client.post("/customers/batch", data="\n".join(lines) + "\n",
+                           content_type="application/x-ndjson")
+    assert response.status_code == 201
+    assert response.get_json() == {"created": 3, "duplicates": 1, "invalid": 2}
+    assert client.post("/customers/login", json={"email": "user2@example.com", "password": ""}).status_code == 200
@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+import pytest
+import requests
+from aiohttp.test_utils import TestClient, TestServer
+from flask import Flask, jsonify, request
+
+from conftest import load_service
+from test_order_service import FakeUpstreams
+
+
+@pytest.fixture
+def orders_url(serve, monkeypatch):
+    """order_service servi en local, sur un panier et un stock simulés"""
+    upstreams = FakeUpstreams()
+    upstreams_url = serve(upstreams.app)
+    orders = load_service("order_service")
+    monkeypatch.setattr(orders, "CART_SERVICE_URL", upstreams_url)
+    monkeypatch.setattr(orders, "STOCK_SERVICE_URL", upstreams_url)
+    return serve(orders.app)
+
+
+def load_gateway(monkeypatch, services, module="app"):
+    monkeypatch.setenv("GATEWAY_SERVICES", json.dumps(services))
+    monkeypatch.setenv("GATEWAY_CACHE", "0")
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    return load_service("gateway", module)
+
+
+def test_idempotency_key_reaches_order_service(orders_url, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"orders": [orders_url]})
+    client = gateway.app.test_client()
+    headers = {"Idempotency-Key": "checkout-1"}
+
+    first = client.post("/api/v1/orders", json={"customer_id": "c1"}, headers=headers)
+    second = client.post("/api/v1/orders", json={"customer_id": "c1"}, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert second.get_json()["id"] == first.get_json()["id"]
+    assert len(client.get("/api/v1/orders?customer_id=c1").get_json()["orders"]) == 1
+
+
+def test_async_gateway_forwards_idempotency_key(orders_url, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"orders": [orders_url]}, "async_app")
+
+    async def scenario():
+        async with TestClient(TestServer(gateway.create_app())) as client:
+            ids = []
+            for _ in range(2):
+                response = await client.post("/api/v1/orders", json={"customer_id": "c1"},
+                                             headers={"Idempotency-Key": "checkout-1"})
+                assert response.status == 201
+                ids.append((await response.json())["id"])
+            response = await client.get("/api/v1/orders", params={"customer_id": "c1"})
+            return ids, (await response.json())["orders"]
+
+    ids, orders = asyncio.run(scenario())
+    assert ids[0] == ids[1]
+    assert len(orders) == 1
+
+
+@pytest.fixture
+def customers_url(serve):
+    """Service customers simulé : compte les lignes reçues et renvoie l'échéance transmise"""
+    app = Flask("customers")
+
+    @app.route("/customers/batch", methods=["POST"])
+    def batch():
+        lines = sum(1 for line in request.stream if line.strip())
+        return jsonify({"lines": lines, "chunked": request.headers.get("Transfer-Encoding") == "chunked",
+                        "deadline_ms": int(request.headers["X-Request-Deadline-Ms"])})
+
+    return serve(app)
+
+
+def ndjson(count):
+    for i in range(count):
+        yield json.dumps({"email": f"user{i}@example.com"}).encode() + b"\n"
+
+
+def test_batch_import_is_streamed_with_its_own_deadline(customers_url, serve, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"customers": [customers_url]})
+    url = serve(gateway.app)
+
+    response = requests.post(f"{url}/api/v1/customers/batch", data=ndjson(5000),
+                             headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["lines"] == 5000
+    assert body["chunked"]
+    assert body["deadline_ms"] > gateway.ROUTE_DEADLINES["customers"] * 1000
+
+
+def test_async_gateway_streams_batch_import(customers_url, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"customers": [customers_url]}, "async_app")
+
+    async def scenario():
+        async with TestClient(TestServer(gateway.create_app())) as client:
+            # Au-delà de la taille maximum d'un corps lu en entier par aiohttp (1 Mo)
+            response = await client.post("/api/v1/customers/batch", data=b"".join(ndjson(40000)),
+                                         headers={"Content-Type": "application/x-ndjson"})
+            return response.status, await response.json()
+
+    status, body = asyncio.run(scenario())
+    assert status == 200
+    assert body["lines"] == 40000
+    assert body["deadline_ms"] > gateway.ROUTE_DEADLINES["customers"] * 1000
+
+
+@pytest.fixture
+def stock_url(serve):
+    """Service stock simulé : réponse non JSON, statut et en-tête propres à l'upstream"""
+    app = Flask("stock")
+
+    @app.route("/stock/<product_id>/note", methods=["PUT"])
+    def note(product_id):
+        return (f"{product_id}:{request.get_data(as_text=True)}", 202,
+                {"Content-Type": "text/plain; charset=utf-8", "X-Stock-Note": "kept"})
+
+    return serve(app)
+
+
+def test_gateway_passes_responses_through_on_kept_alive_connections(stock_url, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"stock": [stock_url]})
+    client = gateway.app.test_client()
+    for i in range(5):
+        response = client.put("/api/v1/stock/1/note", data=f"n{i}")
+        assert response.status_code == 202
+        assert response.get_data(as_text=True) == f"1:n{i}"
+        assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+        assert response.headers["X-Stock-Note"] == "kept"
+    assert gateway.upstream_pools.get(stock_url).stats()["connections_opened"] == 1
+
+
+def test_hop_by_hop_headers_are_not_relayed():
+    pools = load_service("gateway", "pools")
+    headers = {"Connection": "keep-alive", "Transfer-Encoding": "chunked", "Content-Length": "3",
+               "ETag": '"v1"', "Content-Type": "application/json"}
+    assert pools.filter_headers(headers) == [("ETag", '"v1"'), ("Content-Type", "application/json")]
+
+
+def test_async_gateway_passes_responses_through(stock_url, monkeypatch):
+    gateway = load_gateway(monkeypatch, {"stock": [stock_url]}, "async_app")
+
+    async def scenario():
+        async with TestClient(TestServer(gateway.create_app())) as client:
+            response = await client.put("/api/v1/stock/1/note", data="n0")
+            return response.status, dict(response.headers), await response.text()
+
+    status, headers, text = asyncio.run(scenario())
+    assert status == 202 and text == "1:n0"
+    assert headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert headers["X-Stock-Note"] == "kept"
+
+
+def test_unreachable_upstream_answers_json_503(monkeypatch):
+    gateway = load_gateway(monkeypatch, {"products": ["http://127.0.0.1:1"], "orders": ["http://127.0.0.1:1"]})
+    client = gateway.app.test_client()
+    for response in (client.get("/api/v1/products"), client.post("/api/v1/orders", json={"customer_id": "c1"})):
+        assert response.status_code == 503
+        assert response.get_json() == {"error": "Service temporarily unavailable"}
+
+
+def test_background_threads_start_with_the_flask_entrypoint_only(monkeypatch, tmp_path):
+    monkeypatch.setenv("CAPTURE_DIR", str(tmp_path))
+    gateway = load_gateway(monkeypatch, {"products": ["http://127.0.0.1:1"]})
+    # Import seul (mode async, ou chargement par un outil) : ni sonde ni écriture de capture
+    assert gateway.health_prober._thread is None
+    assert gateway.traffic_capture.path is None
+
+    assert gateway.create_app() is gateway.app
+    assert gateway.health_prober._thread.is_alive()
+    assert gateway.traffic_capture.path.startswith(str(tmp_path))
+    gateway.health_prober.stop()
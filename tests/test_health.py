@@ -0,0 +1,27 @@
+from flask import Flask, jsonify
+
+from conftest import load_service
+
+health = load_service("gateway", "health")
+
+
+def test_prober_reports_each_instance_and_notifies_changes(serve):
+    app = Flask("service")
+
+    @app.route("/health")
+    def health_check():
+        return jsonify({"status": "healthy"})
+
+    changes = []
+    up, down = serve(app), "http://127.0.0.1:9"
+    prober = health.HealthProber({"stock": [up, down]}, interval=60, timeout=0.5,
+                                 on_change=lambda url, healthy: changes.append((url, healthy)))
+    assert prober.snapshot()["services"]["stock"] == ["unknown", "unknown"]
+
+    prober.probe_all()
+    assert prober.snapshot()["services"]["stock"] == ["healthy", "unreachable"]
+    assert sorted(changes) == sorted([(up, True), (down, False)])
+
+    # État inchangé : pas de nouvelle notification
+    prober.probe_all()
+    assert len(changes) == 2
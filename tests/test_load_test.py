@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+import load_test
+
+
+def summary(p50=10.0, throughput=50.0, error_rate=0.0):
+    values = {"target_rate": 50, "throughput": throughput, "error_rate": error_rate}
+    values.update({f"{key}_ms": p50 for key in load_test.GATED_PERCENTILES})
+    return values
+
+
+def compare(results, baseline):
+    return load_test.compare({"scenarios": results}, {"scenarios": baseline}, 0.25, 0.10, 0.01, 2.0)
+
+
+def test_missing_baseline_fails_before_the_run(tmp_path):
+    with pytest.raises(SystemExit) as exit_info:
+        load_test.load_baseline(str(tmp_path / "baseline.json"))
+    assert "--save-baseline" in str(exit_info.value.code)
+
+
+def test_unreadable_baseline_fails(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text("{")
+    with pytest.raises(SystemExit):
+        load_test.load_baseline(str(path))
+
+
+def test_saved_results_load_as_baseline(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"meta": {}, "scenarios": {"catalog": summary()}}))
+    assert load_test.load_baseline(str(path))["scenarios"]["catalog"]["throughput"] == 50.0
+
+
+def test_baseline_without_any_played_scenario_fails():
+    assert compare({"catalog": summary()}, {"orders": summary()})
+
+
+def test_latency_regression_fails_and_noise_passes():
+    assert compare({"catalog": summary(p50=10.5)}, {"catalog": summary()}) == []
+    assert compare({"catalog": summary(p50=20.0)}, {"catalog": summary()})
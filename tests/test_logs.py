@@ -0,0 +1,36 @@
+import io
+import logging
+
+from common.logs import BufferedHandler, JsonFormatter, LogWriter
+
+
+def record(msg, *args):
+    return logging.LogRecord("test", logging.WARNING, __file__, 1, msg, args, None)
+
+
+def test_bad_record_is_reported_and_later_lines_are_written(capsys):
+    handler = BufferedHandler()
+    stream = io.StringIO()
+    writer = LogWriter(handler, JsonFormatter("test"), stream)
+
+    handler.handle(record("Quantité %d", "beaucoup"))
+    handler.handle(record("Après l'erreur"))
+    writer.flush()
+    handler.handle(record("Lot suivant"))
+    writer.flush()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert "Après l'erreur" in lines[0] and "Lot suivant" in lines[1]
+    assert "Logging error" in capsys.readouterr().err
+
+
+def test_writer_thread_survives_a_bad_record():
+    handler = BufferedHandler()
+    stream = io.StringIO()
+    writer = LogWriter(handler, JsonFormatter("test"), stream, interval=0.01)
+    writer.start()
+    handler.handle(record("%s %s", "un seul argument"))
+    handler.handle(record("Écrit"))
+    writer.stop()
+    assert "Écrit" in stream.getvalue()
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+import requests
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+
+from common import metrics
+from conftest import load_service
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    metrics.instrument_flask(app, "metrics-test", extra=lambda: "metrics_test_extra 1\n")
+
+    @app.route("/items/<item_id>")
+    def get_item(item_id):
+        return jsonify({"id": item_id})
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    return app.test_client()
+
+
+def test_requests_are_counted_per_route_template(client):
+    labels = {"service": "metrics-test", "method": "GET", "route": "/items/<item_id>", "status": "200"}
+    before = sample("http_requests_total", **labels)
+    client.get("/items/1")
+    client.get("/items/2")
+    assert sample("http_requests_total", **labels) == before + 2
+    assert sample("http_requests_in_flight", service="metrics-test") == 0
+
+
+def test_unhandled_exception_is_counted_once_as_500(client):
+    labels = {"service": "metrics-test", "method": "GET", "route": "/boom", "status": "500"}
+    before = sample("http_requests_total", **labels)
+    assert client.get("/boom").status_code == 500
+    assert sample("http_requests_total", **labels) == before + 1
+    assert sample("http_requests_in_flight", service="metrics-test") == 0
+
+
+def test_metrics_endpoint_appends_service_lines(client):
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "http_requests_total" in body
+    assert body.endswith("metrics_test_extra 1\n")
+
+
+def test_failed_upstream_call_is_recorded_as_error():
+    labels = {"service": "metrics-test", "target": "stock", "instance": "http://127.0.0.1:9", "outcome": "error"}
+    before = sample("upstream_request_duration_seconds_count", **labels)
+    with pytest.raises(requests.ConnectionError):
+        metrics.upstream_request("metrics-test", "stock", "GET", "http://127.0.0.1:9/stock/1", timeout=1)
+    assert sample("upstream_request_duration_seconds_count", **labels) == before + 1
+
+
+def test_stats_lines_are_typed_and_labelled_per_worker(monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", "/unused")
+    text = metrics.stats_lines("demo", [({"upstream": 'a"b'}, {"in_flight": 2, "healthy": True, "errors_total": 3}),
+                                        ({"upstream": "c"}, {"in_flight": 0, "healthy": False, "errors_total": 1})])
+    families = {family.name: family for family in text_string_to_metric_families(text)}
+    assert families["demo_in_flight"].type == "gauge"
+    assert families["demo_errors"].type == "counter"
+    samples = families["demo_healthy"].samples
+    assert [(sample.labels["upstream"], sample.value) for sample in samples] == [('a"b', 1), ("c", 0)]
+    assert all(sample.labels["worker"] == str(os.getpid()) for sample in samples)
+
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR")
+    assert metrics.stats_lines("demo", [({}, {"entries": 1})]).endswith("\ndemo_entries 1\n")
+
+
+def test_gateway_metrics_page_parses(monkeypatch):
+    monkeypatch.setenv("GATEWAY_SERVICES", '{"products": ["http://127.0.0.1:1"]}')
+    monkeypatch.setenv("GATEWAY_CACHE", "0")
+    gateway = load_service("gateway")
+    text = gateway.app.test_client().get("/metrics").get_data(as_text=True)
+    families = {family.name: family.type for family in text_string_to_metric_families(text)}
+    assert families["gateway_lb_in_flight"] == "gauge"
+    assert families["gateway_admission_overloaded"] == "counter"
@@ -0,0 +1,128 @@
+import functools
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from conftest import load_service
+
+
+class FakeUpstreams:
+    """Panier et stock simulés ; `reserve_delay` retarde la réservation, `release_status` force la libération"""
+
+    def __init__(self):
+        self.reserve_delay = 0
+        self.release_status = 200
+        self.reserved = 0
+        self.calls = []
+        self.app = Flask("upstreams")
+        app = self.app
+
+        @app.route("/cart/<customer_id>", methods=["GET"])
+        def get_cart(customer_id):
+            return jsonify({"items": [{"product_id": "1", "quantity": 2, "price": 10.0}], "total": 20.0})
+
+        @app.route("/cart/<customer_id>/clear", methods=["DELETE"])
+        def clear_cart(customer_id):
+            return jsonify({"success": True})
+
+        @app.route("/stock/reserve", methods=["POST"])
+        def reserve():
+            data = request.get_json()
+            self.calls.append(("reserve", data["hold_id"], data["confirm"]))
+            time.sleep(self.reserve_delay)
+            self.reserved += 2
+            return jsonify({"success": True, "hold_id": data["hold_id"], "expires_in": None})
+
+        @app.route("/stock/holds/<hold_id>/release", methods=["POST"])
+        def release(hold_id):
+            self.calls.append(("release", hold_id))
+            if self.release_status == 200:
+                self.reserved -= 2
+            return jsonify({}), self.release_status
+
+
+@pytest.fixture
+def orders(serve, monkeypatch):
+    upstreams = FakeUpstreams()
+    url = serve(upstreams.app)
+    module = load_service("order_service")
+    monkeypatch.setattr(module, "CART_SERVICE_URL", url)
+    monkeypatch.setattr(module, "STOCK_SERVICE_URL", url)
+    return module, module.app.test_client(), upstreams
+
+
+def test_stock_is_reserved_confirmed_in_a_single_call(orders):
+    module, client, upstreams = orders
+    response = client.post("/orders", json={"customer_id": "c1"})
+    assert response.status_code == 201
+    order = response.get_json()
+    assert upstreams.calls == [("reserve", order["id"], True)]
+    assert order["hold_id"] == order["id"]
+
+
+def test_reserve_without_answer_releases_the_hold_and_creates_no_order(orders):
+    module, client, upstreams = orders
+    upstreams.reserve_delay = 0.5
+
+    response = client.post("/orders", json={"customer_id": "c1"}, headers={"X-Request-Deadline-Ms": "200"})
+    assert response.status_code == 503
+    hold_id = upstreams.calls[0][1]
+    assert ("release", hold_id) in upstreams.calls
+    assert client.get("/orders?customer_id=c1").get_json()["orders"] == []
+
+
+def test_cancel_keeps_status_when_stock_release_fails(orders):
+    module, client, upstreams = orders
+    order_id = client.post("/orders", json={"customer_id": "c1"}).get_json()["id"]
+
+    upstreams.release_status = 503
+    response = client.put(f"/orders/{order_id}/status", json={"status": "cancelled"})
+    assert response.status_code == 503
+    assert client.get(f"/orders/{order_id}").get_json()["status"] == "pending"
+
+    # Nouvel essai une fois le stock disponible
+    upstreams.release_status = 200
+    response = client.put(f"/orders/{order_id}/status", json={"status": "cancelled"})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "cancelled"
+    assert upstreams.reserved == 0
+
+
+def test_orders_are_paginated_newest_first(orders):
+    module, client, upstreams = orders
+    created = [client.post("/orders", json={"customer_id": "c1"}).get_json()["id"] for _ in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/orders", query_string={"customer_id": "c1", "limit": 2,
+                                                   **({"cursor": cursor} if cursor else {})}).get_json()
+        seen += [order["id"] for order in page["orders"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == created[::-1]
+
+
+@pytest.mark.parametrize("cursor", ["12", "not base64!", "WzFd"])
+def test_invalid_cursor_is_rejected(orders, cursor):
+    module, client, upstreams = orders
+    assert client.get("/orders", query_string={"cursor": cursor}).status_code == 400
+
+
+def test_cursor_survives_a_restart(tmp_path, monkeypatch):
+    state = load_service("order_service", "state")
+    monkeypatch.setattr(state, "open_store", functools.partial(state.open_store, directory=str(tmp_path)))
+    index = load_service("order_service", "orders_index")
+
+    before = state.OrderState()
+    for i in range(5):
+        before.add({"id": f"order-{i}", "customer_id": "c1", "status": "pending", "items": [], "total": 0,
+                    "created_at": f"2026-01-01T00:00:0{i}.000000Z"})
+    first_page, cursor = before.query("c1", None, None, 2)
+    cursor = index.encode_cursor(cursor)
+
+    after = state.OrderState()
+    orders, _ = after.query("c1", None, index.decode_cursor(cursor), 2)
+    assert [order["id"] for order in first_page] == ["order-4", "order-3"]
+    assert [order["id"] for order in orders] == ["order-2", "order-1"]
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import load_service
+
+catalog_module = load_service("products_service", "catalog")
+
+
+def new_catalog(count=100):
+    products = {str(i): {"id": str(i), "name": f"Item {i:03d}", "price": float(i), "category": "c"}
+                for i in range(1, count + 1)}
+    return catalog_module.Catalog(products)
+
+
+def walk(catalog, **query):
+    ids, cursor = [], None
+    while True:
+        page, cursor = catalog.query(cursor=cursor, limit=7, **query)
+        ids += [product["id"] for product in page]
+        if cursor is None:
+            return ids
+
+
+def test_price_filter_with_default_sort_pages_in_id_order():
+    catalog = new_catalog()
+    assert walk(catalog, min_price=40, max_price=59) == [str(i) for i in range(40, 60)]
+
+
+def test_price_filter_with_default_sort_uses_the_price_index():
+    catalog = new_catalog(1000)
+    assert catalog._id_candidates(None, 10, 19, None) == list(range(10, 20))
+    assert catalog._id_candidates(None, None, None, "item 05") == list(range(50, 60))
+
+
+def test_prefix_with_default_sort_pages_in_id_order():
+    catalog = new_catalog()
+    assert walk(catalog, prefix="item 05") == [str(i) for i in range(50, 60)]
+
+
+def test_cursor_from_another_sort_is_rejected():
+    catalog = new_catalog()
+    _, cursor = catalog.query(sort="price", limit=5)
+    with pytest.raises(catalog_module.InvalidQuery):
+        catalog.query(sort="id", cursor=cursor)
+    with pytest.raises(catalog_module.InvalidQuery):
+        catalog.query(sort="name", cursor=cursor)
+
+
+@pytest.fixture
+def client():
+    return load_service("products_service").app.test_client()
+
+
+def test_products_without_pagination_parameters_keep_the_list_shape(client):
+    body = client.get("/products").get_json()
+    assert isinstance(body, list) and len(body) == 3
+    body = client.get("/products?category=electronics&sort=price").get_json()
+    assert [product["id"] for product in body] == ["2", "3", "1"]
+
+
+def test_list_shape_is_capped_with_a_cursor_to_the_rest(monkeypatch):
+    app = load_service("products_service")
+    monkeypatch.setattr(app, "UNPAGINATED_LIMIT", 2)
+    client = app.app.test_client()
+    for query in ({}, {"category": "electronics"}):
+        response = client.get("/products", query_string=query)
+        assert [product["id"] for product in response.get_json()] == ["1", "2"]
+        rest = client.get("/products", query_string=dict(query, cursor=response.headers["X-Next-Cursor"]))
+        assert [product["id"] for product in rest.get_json()["products"]] == ["3"]
+    assert "X-Next-Cursor" not in client.get("/products?category=electronics&prefix=Lap").headers
+
+
+def test_products_with_limit_are_paginated(client):
+    body = client.get("/products?limit=2").get_json()
+    assert [product["id"] for product in body["products"]] == ["1", "2"]
+    body = client.get(f"/products?cursor={body['next_cursor']}").get_json()
+    assert [product["id"] for product in body["products"]] == ["3"]
+    assert body["next_cursor"] is None
+
+
+def test_mismatched_cursor_returns_400(client):
+    cursor = client.get("/products?limit=1&sort=price").get_json()["next_cursor"]
+    response = client.get(f"/products?limit=1&cursor={cursor}")
+    assert response.status_code == 400
@@ -0,0 +1,91 @@
+from conftest import load_service
+
+replication = load_service("products_service", "replication")
+
+
+class Replica:
+    """Catalogue minimal d'une instance products : {id: produit}"""
+
+    def __init__(self, directory, snapshot_every=1000):
+        self.products = {}
+        self.log = replication.ChangeLog(str(directory), self.apply, self.state, snapshot_every=snapshot_every)
+        self.log.start()
+        self.log.stop()
+
+    def apply(self, entry):
+        self.products[entry["product"]["id"]] = entry["product"]
+
+    def state(self):
+        return [{"op": "put", "product": product} for product in self.products.values()]
+
+
+def put(replica, product_id):
+    replica.log.append({"op": "put", "product": {"id": product_id}})
+
+
+def segment_files(directory):
+    return sorted(path.name for path in directory.glob("changes.*.jsonl"))
+
+
+def test_instances_apply_each_other_writes_in_log_order(tmp_path):
+    first, second = Replica(tmp_path), Replica(tmp_path)
+    put(first, "a")
+    assert first.products == {"a": {"id": "a"}}
+    put(second, "b")
+    assert first.log.catch_up() == 1
+    assert list(first.products) == list(second.products) == ["a", "b"]
+
+
+def test_new_instance_loads_the_snapshot_then_the_tail(tmp_path):
+    writer = Replica(tmp_path, snapshot_every=2)
+    for product_id in "abc":
+        put(writer, product_id)
+    assert 0 < writer.log.snapshot_offset < writer.log.offset
+
+    replica = Replica(tmp_path)
+    assert list(replica.products) == ["a", "b", "c"]
+    assert replica.log.offset == writer.log.offset
+
+
+def test_partial_line_waits_for_its_end(tmp_path):
+    replica = Replica(tmp_path)
+    segment = tmp_path / segment_files(tmp_path)[-1]
+    with open(segment, "ab") as f:
+        f.write(b'{"op":"put","product":{"id":"x"}')
+    assert replica.log.catch_up() == 0
+    with open(segment, "ab") as f:
+        f.write(b"}\n")
+    assert replica.log.catch_up() == 1
+
+
+def test_segments_covered_by_the_snapshot_are_removed(tmp_path):
+    writer = Replica(tmp_path, snapshot_every=2)
+    for product_id in "abcdefg":
+        put(writer, product_id)
+    # Seul le segment ouvert au dernier instantané reste, avec l'entrée écrite depuis
+    assert len(segment_files(tmp_path)) == 1
+    assert writer.log.stats()["segments"] == 1
+
+    replica = Replica(tmp_path)
+    assert list(replica.products) == list("abcdefg")
+    assert replica.log.offset == writer.log.offset
+
+
+def test_lagging_instance_reloads_the_snapshot_when_its_segment_is_gone(tmp_path):
+    lagging = Replica(tmp_path)
+    writer = Replica(tmp_path, snapshot_every=2)
+    for product_id in "abcde":
+        put(writer, product_id)
+    assert "changes.00000000000000000000.jsonl" not in segment_files(tmp_path)
+
+    assert lagging.log.catch_up() == 1
+    assert list(lagging.products) == list("abcde")
+    assert lagging.log.offset == writer.log.offset
+    assert lagging.log.stats()["snapshot_reloads_total"] == 1
+
+
+def test_single_file_log_becomes_the_first_segment(tmp_path):
+    (tmp_path / "changes.jsonl").write_bytes(b'{"op":"put","product":{"id":"a"}}\n')
+    replica = Replica(tmp_path)
+    assert list(replica.products) == ["a"]
+    assert segment_files(tmp_path) == ["changes.00000000000000000000.jsonl"]
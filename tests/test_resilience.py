@@ -0,0 +1,62 @@
+import json
+import time
+
+from flask import Flask, jsonify, request
+
+from conftest import load_service
+
+resilience = load_service("gateway", "resilience")
+
+
+def test_breaker_opens_then_lets_a_single_trial_through():
+    breaker = resilience.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == breaker.CLOSED and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record(False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN and not breaker.allow()
+
+
+def test_retry_budget_is_a_fraction_of_traffic():
+    budget = resilience.RetryBudget(ratio=0.5, min_per_second=0.0, max_tokens=1.0)
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw()
+
+
+def test_gateway_retries_gets_on_another_instance_and_forwards_deadline(serve, monkeypatch):
+    def instance(status):
+        app = Flask(f"stock-{status}")
+
+        @app.route("/stock/<product_id>")
+        def get_stock(product_id):
+            return jsonify({"deadline_ms": int(request.headers[resilience.DEADLINE_HEADER])}), status
+        return serve(app)
+
+    urls = [instance(500), instance(200)]
+    monkeypatch.setenv("GATEWAY_SERVICES", json.dumps({"stock": urls}))
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    gateway = load_service("gateway")
+    # Toujours la première instance disponible : l'instance en échec est essayée d'abord
+    monkeypatch.setattr(gateway.load_balancer, "strategies", {"stock": lambda instances, state: instances[0]})
+    client = gateway.app.test_client()
+
+    response = client.get("/api/v1/stock/1")
+    assert response.status_code == 200
+    assert 0 < response.get_json()["deadline_ms"] <= gateway.ROUTE_DEADLINES["stock"] * 1000
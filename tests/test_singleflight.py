@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from conftest import load_service
+
+singleflight = load_service("gateway", "singleflight")
+
+
+def test_identical_concurrent_calls_share_one_execution():
+    flight = singleflight.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while flight.stats()["upstream_calls_saved_total"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    # Appel terminé : le suivant repart vers l'upstream
+    assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+def test_failed_call_is_not_remembered():
+    flight = singleflight.SingleFlight()
+
+    def fail():
+        raise RuntimeError("upstream")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("key", lambda: "retry") == "retry"
+
+
+def test_async_variant_shares_one_execution():
+    flight = singleflight.AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
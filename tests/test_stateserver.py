@@ -0,0 +1,48 @@
+import os
+import secrets
+import sys
+
+import pytest
+
+from common import stateserver
+from conftest import ROOT, LOCAL_MODULES
+
+
+@pytest.fixture
+def stock_factory(monkeypatch):
+    # Le processus d'état importe « state » depuis le répertoire du service, comme sous gunicorn
+    monkeypatch.syspath_prepend(os.path.join(ROOT, "stock_service"))
+    for name in LOCAL_MODULES:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return "state:StockState"
+
+
+def test_local_state_without_socket(stock_factory, monkeypatch):
+    monkeypatch.delenv("STATE_SOCKET", raising=False)
+    state = stateserver.shared_state(stock_factory)
+    assert state.reserve({"1": 2})["items"] == [{"product_id": "1", "quantity": 2}]
+    assert state.get_stock("1")["reserved"] == 2
+
+
+def test_workers_share_one_state_process(stock_factory, monkeypatch, tmp_path):
+    authkey = secrets.token_bytes(16)
+    address = str(tmp_path / "state.sock")
+    manager = stateserver.start_state_server(stock_factory, address, authkey)
+    try:
+        monkeypatch.setenv("STATE_SOCKET", address)
+        monkeypatch.setenv("STATE_AUTHKEY", authkey.hex())
+        first, second = stateserver.shared_state(stock_factory), stateserver.shared_state(stock_factory)
+
+        hold = first.reserve({"1": 30})
+        assert second.get_stock("1")["reserved"] == 30
+
+        # L'invariant tient pour l'autre worker, et l'erreur métier traverse le socket telle quelle
+        import reservations
+        with pytest.raises(reservations.ReservationError) as error:
+            second.reserve({"1": 30})
+        assert error.value.status == 400 and error.value.product_id == "1"
+
+        second.release_hold(hold["hold_id"])
+        assert first.get_stock("1")["reserved"] == 0
+    finally:
+        manager.shutdown()
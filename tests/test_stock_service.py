@@ -0,0 +1,162 @@
+import functools
+import time
+
+import pytest
+
+from conftest import load_service
+
+reservations = load_service("stock_service", "reservations")
+ReservationEngine, ReservationError = reservations.ReservationEngine, reservations.ReservationError
+
+
+def new_engine(quantity=10):
+    return ReservationEngine({"1": {"product_id": "1", "quantity": quantity, "reserved": 0}})
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais remplie"
+        time.sleep(0.01)
+
+
+def test_release_by_quantity_removes_the_hold_so_expiry_does_not_release_again():
+    engine = new_engine()
+    engine.reserve({"1": 4}, ttl=0.05)
+    other = engine.reserve({"1": 3})
+    engine.confirm(other.id)
+
+    engine.release({"1": 4})
+    assert engine.stock_db["1"]["reserved"] == 3
+
+    # Rien à rendre à l'expiration : les 3 unités de la réservation confirmée restent réservées
+    time.sleep(0.2)
+    assert engine.stock_db["1"]["reserved"] == 3
+    engine.release_hold(other.id)
+    assert engine.stock_db["1"]["reserved"] == 0
+
+
+def test_partial_release_shrinks_the_hold():
+    engine = new_engine()
+    hold = engine.reserve({"1": 5}, ttl=0.1)
+    engine.release({"1": 2})
+    assert hold.items == {"1": 3}
+
+    wait_until(lambda: engine.expired_total == 1)
+    assert engine.stock_db["1"]["reserved"] == 0
+
+
+def test_release_beyond_reserved_quantity_is_refused():
+    engine = new_engine()
+    engine.reserve({"1": 2})
+    with pytest.raises(ReservationError) as error:
+        engine.release({"1": 3})
+    assert error.value.status == 409
+    assert engine.stock_db["1"]["reserved"] == 2
+
+
+def test_hold_released_twice_returns_stock_once():
+    engine = new_engine()
+    hold = engine.reserve({"1": 2})
+    engine.reserve({"1": 1})
+    engine.release_hold(hold.id)
+    with pytest.raises(ReservationError):
+        engine.release_hold(hold.id)
+    assert engine.stock_db["1"]["reserved"] == 1
+
+
+@pytest.fixture
+def client():
+    app = load_service("stock_service")
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("body", [{"quantity": "2"}, {"quantity": 0}, {"quantity": True},
+                                  {"quantity": 1, "ttl": "soon"}, {"quantity": 1, "ttl": -1}])
+def test_reserve_rejects_invalid_input(client, body):
+    response = client.post("/stock/1/reserve", json=body)
+    assert response.status_code == 400
+
+
+def test_release_with_hold_id_releases_that_hold(client):
+    hold_id = client.post("/stock/1/reserve", json={"quantity": 2}).get_json()["hold_id"]
+
+    response = client.post("/stock/1/release", json={"hold_id": hold_id})
+    assert response.status_code == 200
+    assert client.get("/stock/1").get_json()["reserved"] == 0
+    assert client.post("/stock/1/release", json={"hold_id": hold_id}).status_code == 404
+
+
+def test_batch_reserve_is_all_or_nothing(client):
+    response = client.post("/stock/reserve", json={"items": [{"product_id": "1", "quantity": 2},
+                                                             {"product_id": "2", "quantity": 1000}]})
+    assert response.status_code == 400
+    assert response.get_json()["product_id"] == "2"
+    assert client.get("/stock/1").get_json()["reserved"] == 0
+
+    response = client.post("/stock/reserve", json={"items": [{"product_id": "1", "quantity": 2},
+                                                             {"product_id": "1", "quantity": 1},
+                                                             {"product_id": "2", "quantity": 4}]})
+    assert response.status_code == 200
+    hold_id = response.get_json()["hold_id"]
+    assert client.get("/stock/1").get_json()["reserved"] == 3
+
+    assert client.post("/stock/release", json={"hold_id": hold_id}).status_code == 200
+    assert client.get("/stock/1").get_json()["reserved"] == 0
+    assert client.get("/stock/2").get_json()["reserved"] == 0
+
+
+def test_changes_feed_sends_only_products_modified_since_the_version(client):
+    client.post("/stock/1/reserve", json={"quantity": 1})
+    full = client.get("/stock/changes").get_json()
+    assert full["full"] and {item["product_id"] for item in full["items"]} == {"1", "2", "3"}
+
+    client.post("/stock/2/reserve", json={"quantity": 5})
+    changes = client.get("/stock/changes", query_string={"epoch": full["epoch"],
+                                                         "since": full["version"]}).get_json()
+    assert not changes["full"] and changes["version"] > full["version"]
+    assert changes["items"] == [{"product_id": "2", "available": 95}]
+
+    # Époque inconnue (stock redémarré) : tout est renvoyé
+    assert client.get("/stock/changes", query_string={"epoch": "old", "since": changes["version"]}).get_json()["full"]
+    assert client.get("/stock/changes?since=x").status_code == 400
+
+
+def test_batch_reserve_can_be_confirmed_with_a_caller_chosen_id(client):
+    body = {"items": [{"product_id": "1", "quantity": 2}], "confirm": True, "hold_id": "order-1"}
+    response = client.post("/stock/reserve", json=body)
+    assert response.status_code == 200
+    assert response.get_json()["hold_id"] == "order-1"
+    assert response.get_json()["expires_in"] is None
+
+    assert client.post("/stock/reserve", json=body).status_code == 409
+    assert client.post("/stock/reserve", json=dict(body, hold_id="order-2", confirm="yes")).status_code == 400
+    assert client.post("/stock/holds/order-1/release").status_code == 200
+    assert client.get("/stock/1").get_json()["reserved"] == 0
+
+
+def test_multi_product_reservation_shares_one_fsync(tmp_path, monkeypatch):
+    state = load_service("stock_service", "state")
+    monkeypatch.setattr(state, "open_store", functools.partial(state.open_store, directory=str(tmp_path)))
+    stock = state.StockState()
+    before = stock.stock_store.stats()["fsyncs_total"]
+
+    hold = stock.reserve({"1": 1, "2": 2, "3": 3})
+    assert stock.stock_store.stats()["fsyncs_total"] == before + 1
+
+    # Écritures différées, mais durables au retour : un redémarrage retrouve la réservation
+    restarted = state.StockState()
+    assert restarted.get_stock("3")["reserved"] == 3
+    assert restarted.release_hold(hold["hold_id"])["items"][2] == {"product_id": "3", "quantity": 3}
+
+
+def test_release_only_visits_holds_of_the_released_products():
+    engine = ReservationEngine({str(i): {"product_id": str(i), "quantity": 10, "reserved": 0} for i in range(3)})
+    first = engine.reserve({"0": 1, "1": 1})
+    second = engine.reserve({"2": 1})
+    assert engine._holds_by_product == {"0": {first.id}, "1": {first.id}, "2": {second.id}}
+
+    engine.release({"0": 1})
+    assert set(engine._holds_by_product) == {"1", "2"}
+    engine.release({"1": 1, "2": 1})
+    assert engine._holds_by_product == {} and engine._holds == {}
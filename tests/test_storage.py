@@ -0,0 +1,66 @@
+import os
+import threading
+
+from common.storage import Store
+
+
+def test_writes_survive_a_restart(tmp_path):
+    store = Store(str(tmp_path), "orders")
+    store.put("a", {"status": "pending"})
+    store.put("b", {"status": "pending"})
+    store.put("a", {"status": "cancelled"})
+    store.delete("b")
+
+    assert Store(str(tmp_path), "orders").data == {"a": {"status": "cancelled"}}
+
+
+def test_incomplete_last_record_is_ignored_and_truncated(tmp_path):
+    store = Store(str(tmp_path), "carts")
+    store.put("a", 1)
+    path = store._segment_path(store._segment)
+    with open(path, "ab") as f:
+        f.write(b'0000abcd {"k":"b","v"')
+
+    recovered = Store(str(tmp_path), "carts")
+    assert recovered.data == {"a": 1}
+    recovered.put("c", 3)
+    assert Store(str(tmp_path), "carts").data == {"a": 1, "c": 3}
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    store = Store(str(tmp_path), "stock")
+    threads = [threading.Thread(target=lambda i=i: [store.put(f"{i}-{n}", n) for n in range(50)])
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.records_total == 400
+    assert len(Store(str(tmp_path), "stock").data) == 400
+
+
+def test_unsynced_writes_are_flushed_by_a_single_fsync(tmp_path):
+    store = Store(str(tmp_path), "customers")
+    for n in range(100):
+        store.put(f"c{n}", n, wait=False)
+    store.sync()
+    assert (store.records_total, store.fsyncs_total) == (100, 1)
+
+
+def test_snapshot_replaces_older_segments(tmp_path):
+    store = Store(str(tmp_path), "customers", segment_bytes=200)
+    for n in range(30):
+        store.put(f"k{n % 5}", n)
+    store.snapshot()
+
+    files = sorted(os.listdir(tmp_path))
+    assert any(".snapshot." in name for name in files)
+    assert Store(str(tmp_path), "customers").data == {f"k{i}": 25 + i for i in range(5)}
+
+
+def test_without_directory_the_store_stays_in_memory():
+    data = {}
+    store = Store(None, "orders", data)
+    store.put("a", 1)
+    store.sync()
+    assert data == {"a": 1}
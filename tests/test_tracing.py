@@ -0,0 +1,56 @@
+from flask import Flask, jsonify
+
+from common import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e736a01"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def new_client():
+    app = Flask(__name__)
+    tracing.trace_flask(app, "tracing-test")
+
+    @app.route("/work")
+    def work():
+        with tracing.span("state.get", key="1"):
+            outgoing = tracing.outgoing_headers()
+        return jsonify(outgoing)
+
+    return app.test_client()
+
+
+def test_parse_traceparent():
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{'0' * 16}-00") == (TRACE_ID, None, False)
+    for value in (None, "", "00-abc-def-01", f"00-{TRACE_ID}-{PARENT_ID}-zz"):
+        assert tracing.parse_traceparent(value) is None
+
+
+def test_sampled_caller_is_traced_and_propagated():
+    client = new_client()
+    response = client.get("/work", headers={"X-Request-Id": "req-1",
+                                            "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.headers["X-Request-Id"] == "req-1"
+
+    # L'appel sortant fait depuis le span enfant le désigne comme parent
+    outgoing = response.get_json()
+    assert outgoing["X-Request-Id"] == "req-1"
+    _, _, parent_id, flags = outgoing["traceparent"].split("-")
+    assert flags == "01"
+
+    traces = client.get("/debug/traces", query_string={"trace_id": TRACE_ID}).get_json()["traces"]
+    assert len(traces) == 1
+    root, child = traces[0]["spans"]
+    assert root["parent_id"] == PARENT_ID and root["attrs"]["status"] == 200
+    assert child["name"] == "state.get" and child["parent_id"] == root["span_id"]
+    assert child["span_id"] == parent_id
+
+
+def test_unsampled_request_keeps_ids_but_records_nothing():
+    client = new_client()
+    trace_id = "1" * 32
+    response = client.get("/work", headers={"traceparent": f"00-{trace_id}-{PARENT_ID}-00"})
+    # Sans X-Request-Id entrant, l'identifiant de requête est le trace_id
+    assert response.headers["X-Request-Id"] == trace_id
+    assert response.get_json()["traceparent"] == f"00-{trace_id}-{'0' * 16}-00"
+    assert client.get("/debug/traces", query_string={"trace_id": trace_id}).get_json()["traces"] == []